@@ -0,0 +1,41 @@
+"""Add item owner_id, id index
+
+Revision ID: 5b3e2d7c1f04
+Revises: 1a31ce608336
+Create Date: 2026-10-18 10:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5b3e2d7c1f04'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently so writes to item are not blocked on large tables,
+    # which has to happen outside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_item_owner_id_id',
+            'item',
+            ['owner_id', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_item_owner_id_id',
+            table_name='item',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -1,17 +1,21 @@
-from collections.abc import Generator
-from typing import Annotated
+from collections.abc import AsyncGenerator, Generator
+from typing import Annotated, Any
 
-import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app import crud
+from app.api.read_your_writes import reads_from_primary
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import RoutingSession, async_engine, engine, replica_router
+from app.core.revocation import revocation_filter
+from app.models import TokenPayload, User, UserPublic
+from app.observability import REVOCATION_METRICS
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -23,33 +27,77 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # GET and HEAD requests read from a replica when any are configured,
+    # unless the client wrote recently. Everything else runs on the primary
+    # and opens a read-your-writes window for the client on commit.
+    info: dict[str, Any] = {}
+    if request.method in ("GET", "HEAD"):
+        read_engine = replica_router.engine_for_read(reads_from_primary(request))
+        if read_engine is not async_engine:
+            info["replica"] = read_engine.sync_engine
+    else:
+        info["request_state"] = request.scope.setdefault("state", {})
+    # Keep attributes loaded after commit, an expired attribute would need
+    # implicit IO when the response model reads it
+    async with AsyncSession(
+        async_engine,
+        expire_on_commit=False,
+        sync_session_class=RoutingSession,
+        info=info,
+    ) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> UserPublic:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
+        payload = security.decode_access_token(token)
         token_data = TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    if token_data.jti and revocation_filter.might_be_revoked(token_data.jti):
+        # The filter has false positives, only the database can tell
+        revoked = await crud.is_token_revoked(session=session, jti=token_data.jti)
+        result = "revoked" if revoked else "false_positive"
+        REVOCATION_METRICS.filter_hits.labels(result=result).inc()
+        if revoked:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+    # Only the public fields are cached, routes that change the user load
+    # the row themselves. The row is read on the primary even for GET
+    # requests, a lagging replica would otherwise keep a deactivated or
+    # demoted user cached for the whole TTL.
+    user = crud.user_cache.get(str(token_data.sub))
+    if user is None:
+        generation = crud.user_cache.generation
+        statement = select(User).where(User.id == token_data.sub)
+        db_user = (
+            await session.exec(
+                statement, bind_arguments={"bind": async_engine.sync_engine}
+            )
+        ).first()
+        if not db_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = crud.user_cache.set(db_user, generation)
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
 
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[UserPublic, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+async def get_current_active_superuser(current_user: CurrentUser) -> UserPublic:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
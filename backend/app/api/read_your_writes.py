@@ -0,0 +1,76 @@
+import hashlib
+import hmac
+import math
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.db import replica_router
+
+# After a write, a client reads from the primary for a few seconds so it
+# sees its own changes despite replication lag. The deadline travels with
+# the client, in a cookie signed with SECRET_KEY, so that whichever worker
+# or server serves its next request honors it.
+
+COOKIE_NAME = "read_your_writes"
+
+
+def _sign(deadline: str) -> str:
+    key = settings.SECRET_KEY.encode()
+    return hmac.new(key, deadline.encode(), hashlib.sha256).hexdigest()
+
+
+def reads_from_primary(conn: HTTPConnection) -> bool:
+    """Whether the client wrote recently enough to skip the replicas."""
+    deadline, _, signature = conn.cookies.get(COOKIE_NAME, "").rpartition(".")
+    if not hmac.compare_digest(signature, _sign(deadline)):
+        return False
+    try:
+        return float(deadline) > time.time()
+    except ValueError:
+        return False
+
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware handing the client its read-your-writes cookie.
+
+    ``deps.get_async_db`` shares the request state with its session, a
+    commit flags ``committed_write`` there. The cookie is added to the
+    response on its way out, whatever the route returned, as long as read
+    replicas are configured.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message) -> None:
+            if (
+                message["type"] == "http.response.start"
+                and state.get("committed_write")
+                and replica_router.replicas
+            ):
+                MutableHeaders(scope=message).append(
+                    "set-cookie", self._cookie(secure=scope["scheme"] == "https")
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _cookie(secure: bool) -> str:
+        seconds = settings.POSTGRES_READ_YOUR_WRITES_SECONDS
+        deadline = f"{time.time() + seconds:.3f}"
+        cookie = (
+            f"{COOKIE_NAME}={deadline}.{_sign(deadline)}; Max-Age={math.ceil(seconds)}"
+            "; Path=/; HttpOnly; SameSite=lax"
+        )
+        return f"{cookie}; Secure" if secure else cookie
@@ -1,52 +1,204 @@
+import csv
+import io
 import uuid
-from typing import Any
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from typing import Any, Literal
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import ARRAY, ColumnElement, Row, Uuid, any_, bindparam
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import col
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+from app import crud
+from app.api.deps import AsyncSessionDep, CurrentUser, get_async_db
+from app.api.routing import ModelResponseRoute
+from app.core.config import settings
+from app.crud import MAX_PAGE_SIZE, CountMode
+from app.models import (
+    BulkError,
+    Item,
+    ItemCreate,
+    ItemPublic,
+    ItemsAffected,
+    ItemsBulkUpdate,
+    ItemsCreated,
+    ItemsFilter,
+    ItemsPublic,
+    ItemUpdate,
+    Message,
+    UserPublic,
+)
+from app.utils import decode_cursor, encode_cursor
 
-router = APIRouter(prefix="/items", tags=["items"])
+router = APIRouter(prefix="/items", tags=["items"], route_class=ModelResponseRoute)
+
+ExportFormat = Literal["ndjson", "csv"]
+MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+EXPORT_FIELDS = ("id", "title", "description", "owner_id")
+
+
+def _encode_ndjson(rows: Sequence[Row[Any]]) -> bytes:
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+
+def _encode_csv(rows: Sequence[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
 
 
 @router.get("/", response_model=ItemsPublic)
-def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_items(
+    session: AsyncSessionDep,
+    current_user: CurrentUser,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    count: CountMode = "exact",
 ) -> Any:
     """
     Retrieve items.
-    """
 
+    Pass the `next_cursor` of a page as `cursor` to get the following page,
+    `skip` is ignored then. Unlike `skip`, a cursor costs the same at any depth.
+
+    `count` picks how the total is computed: `exact` (cached for a few
+    seconds), `estimated` from planner statistics, or `none` to skip it.
+    """
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
+        filters, scope = [], None
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        items = session.exec(statement).all()
-
-    return ItemsPublic(data=items, count=count)
+        filters, scope = [col(Item.owner_id) == current_user.id], current_user.id
+
+    items, total = await crud.read_page(
+        session=session,
+        model=Item,
+        filters=filters,
+        scope=scope,
+        skip=skip,
+        limit=limit,
+        after=after,
+        count=count,
+    )
+    next_cursor = encode_cursor(items[limit - 1].id) if len(items) > limit else None
+
+    return ItemsPublic(data=items[:limit], count=total, next_cursor=next_cursor)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {MEDIA_TYPES["ndjson"]: {}, MEDIA_TYPES["csv"]: {}},
+            "description": "Every item, one per line",
+        }
+    },
+)
+async def export_items(
+    request: Request, current_user: CurrentUser, format: ExportFormat = "ndjson"
+) -> StreamingResponse:
+    """
+    Export items as NDJSON, one JSON object per line, or CSV with a header.
+
+    Items are streamed in id order while they are read, from a server-side
+    cursor, however many there are.
+    """
+    filters = (
+        [] if current_user.is_superuser else [col(Item.owner_id) == current_user.id]
+    )
+
+    async def content() -> AsyncIterator[bytes]:
+        # The session of the request is closed once this handler returns,
+        # the export holds one of its own for as long as it streams
+        async with asynccontextmanager(get_async_db)(request) as session:
+            if format == "csv":
+                yield _encode_csv([EXPORT_FIELDS])
+            async for rows in crud.stream_items(session=session, filters=filters):
+                yield _encode_csv(rows) if format == "csv" else _encode_ndjson(rows)
+
+    return StreamingResponse(
+        content(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="items.{format}"'},
+    )
+
+
+def _bulk_filters(
+    items_filter: ItemsFilter, current_user: UserPublic
+) -> list[ColumnElement[bool]]:
+    filters = []
+    if items_filter.ids is not None:
+        # One array parameter however many ids are listed
+        ids = bindparam("ids", items_filter.ids, type_=ARRAY(Uuid))
+        filters.append(col(Item.id) == any_(ids))
+    if items_filter.title is not None:
+        filters.append(col(Item.title) == items_filter.title)
+    if items_filter.owner_id is not None:
+        filters.append(col(Item.owner_id) == items_filter.owner_id)
+    if not filters:
+        raise HTTPException(status_code=400, detail="Select items by ids or a filter")
+    if not current_user.is_superuser:
+        filters.append(col(Item.owner_id) == current_user.id)
+    return filters
+
+
+# Declared before the /{id} routes, which would take "bulk" for an id
+@router.patch("/bulk", response_model=ItemsAffected)
+async def update_items_bulk(
+    session: AsyncSessionDep, current_user: CurrentUser, items_in: ItemsBulkUpdate
+) -> Any:
+    """
+    Update the items matching `filter`, by `ids` or by field, in one statement.
+
+    Items of other users are left out unless the caller is a superuser.
+    """
+    values = items_in.update.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    count = await crud.update_items(
+        session=session,
+        filters=_bulk_filters(items_in.filter, current_user),
+        values=values,
+    )
+    return ItemsAffected(count=count)
+
+
+@router.delete("/bulk", response_model=ItemsAffected)
+async def delete_items_bulk(
+    session: AsyncSessionDep, current_user: CurrentUser, items_filter: ItemsFilter
+) -> Any:
+    """
+    Delete the items matching the filter, by `ids` or by field, in one statement.
+
+    Items of other users are left out unless the caller is a superuser.
+    """
+    count = await crud.delete_items(
+        session=session, filters=_bulk_filters(items_filter, current_user)
+    )
+    return ItemsAffected(count=count)
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_item(
+    session: AsyncSessionDep, current_user: CurrentUser, id: uuid.UUID
+) -> Any:
     """
     Get item by ID.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
@@ -55,23 +207,122 @@ def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) ->
 
 
 @router.post("/", response_model=ItemPublic)
-def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+async def create_item(
+    *, session: AsyncSessionDep, current_user: CurrentUser, item_in: ItemCreate
 ) -> Any:
     """
     Create new item.
     """
     item = Item.model_validate(item_in, update={"owner_id": current_user.id})
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await session.commit()
+    await session.refresh(item)
     return item
 
 
+async def _read_bulk(request: Request) -> AsyncIterator[Any]:
+    """The items of a bulk request, NDJSON lines still undecoded."""
+    if request.headers.get("content-type", "").startswith(MEDIA_TYPES["ndjson"]):
+        pending = b""
+        async for data in request.stream():
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if pending.strip():
+            yield pending
+        return
+    try:
+        items = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of items")
+    for item in items:
+        yield item
+
+
+def _validate_bulk(item: Any) -> ItemCreate:
+    if isinstance(item, bytes):
+        return ItemCreate.model_validate_json(item)
+    return ItemCreate.model_validate(item)
+
+
+@router.post(
+    "/bulk",
+    response_model=ItemsCreated,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/ItemCreate"},
+                    }
+                },
+                MEDIA_TYPES["ndjson"]: {
+                    "schema": {"$ref": "#/components/schemas/ItemCreate"}
+                },
+            },
+        }
+    },
+)
+async def create_items_bulk(
+    request: Request, session: AsyncSessionDep, current_user: CurrentUser
+) -> Any:
+    """
+    Create items from a JSON array, or from NDJSON, one item per line, sent
+    with Content-Type `application/x-ndjson`.
+
+    Items are validated and inserted as they are read, in chunks of a
+    transaction each. `ids` follows the order of the request, with null for
+    the items listed in `errors`.
+    """
+    ids: list[uuid.UUID | None] = []
+    errors: list[BulkError] = []
+    chunk: list[tuple[int, ItemCreate]] = []
+
+    async def insert_chunk() -> None:
+        try:
+            created = await crud.create_items(
+                session=session,
+                items=[item for _, item in chunk],
+                owner_id=current_user.id,
+            )
+        except DBAPIError as e:
+            await session.rollback()
+            error = {"type": "insert_failed", "loc": [], "msg": str(e.orig)}
+            errors.extend(BulkError(index=i, errors=[error]) for i, _ in chunk)
+        else:
+            for (index, _), id in zip(chunk, created, strict=True):
+                ids[index] = id
+        chunk.clear()
+
+    async for raw_item in _read_bulk(request):
+        index = len(ids)
+        ids.append(None)
+        try:
+            chunk.append((index, _validate_bulk(raw_item)))
+        except ValidationError as e:
+            errors.append(
+                BulkError(
+                    index=index, errors=e.errors(include_url=False, include_input=False)
+                )
+            )
+        if len(chunk) == settings.ITEMS_BULK_CHUNK_SIZE:
+            await insert_chunk()
+    if chunk:
+        await insert_chunk()
+
+    errors.sort(key=lambda error: error.index)
+    return ItemsCreated(ids=ids, count=len(ids) - len(errors), errors=errors)
+
+
 @router.put("/{id}", response_model=ItemPublic)
-def update_item(
+async def update_item(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: CurrentUser,
     id: uuid.UUID,
     item_in: ItemUpdate,
@@ -79,7 +330,7 @@ def update_item(
     """
     Update an item.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
@@ -87,23 +338,23 @@ def update_item(
     update_dict = item_in.model_dump(exclude_unset=True)
     item.sqlmodel_update(update_dict)
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await session.commit()
+    await session.refresh(item)
     return item
 
 
 @router.delete("/{id}")
-def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_item(
+    session: AsyncSessionDep, current_user: CurrentUser, id: uuid.UUID
 ) -> Message:
     """
     Delete an item.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
-    session.commit()
+    await session.delete(item)
+    await session.commit()
     return Message(message="Item deleted successfully")
@@ -1,34 +1,49 @@
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.api.deps import (
+    AsyncSessionDep,
+    CurrentUser,
+    TokenDep,
+    get_current_active_superuser,
+)
+from app.api.routing import ModelResponseRoute
 from app.core import security
 from app.core.config import settings
-from app.core.security import get_password_hash
-from app.models import Message, NewPassword, Token, UserPublic
+from app.core.hashing import get_password_hash_async
+from app.core.revocation import revocation_filter
+from app.models import (
+    JWKSet,
+    Message,
+    NewPassword,
+    Token,
+    TokenPayload,
+    TokenRefresh,
+    User,
+    UserPublic,
+)
 from app.utils import (
     generate_password_reset_token,
     generate_reset_password_email,
-    send_email,
     verify_password_reset_token,
 )
 
-router = APIRouter(tags=["login"])
+router = APIRouter(tags=["login"], route_class=ModelResponseRoute)
 
 
 @router.post("/login/access-token")
-def login_access_token(
-    session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+async def login_access_token(
+    session: AsyncSessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.authenticate(
+    user = await crud.authenticate(
         session=session, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -39,51 +54,112 @@ def login_access_token(
     return Token(
         access_token=security.create_access_token(
             user.id, expires_delta=access_token_expires
-        )
+        ),
+        refresh_token=await crud.create_refresh_token(session=session, user_id=user.id),
+    )
+
+
+@router.post("/login/refresh")
+async def refresh_access_token(session: AsyncSessionDep, body: TokenRefresh) -> Token:
+    """
+    Exchange a refresh token for a new access token and refresh token
+    """
+    rotated = await crud.rotate_refresh_token(session=session, token=body.refresh_token)
+    if not rotated:
+        raise HTTPException(status_code=400, detail="Invalid refresh token")
+    user_id, refresh_token = rotated
+    user = await session.get(User, user_id)
+    if not user or not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return Token(
+        access_token=security.create_access_token(
+            user.id, expires_delta=access_token_expires
+        ),
+        refresh_token=refresh_token,
     )
 
 
 @router.post("/login/test-token", response_model=UserPublic)
-def test_token(current_user: CurrentUser) -> Any:
+async def test_token(current_user: CurrentUser) -> Any:
     """
     Test access token
     """
     return current_user
 
 
+@router.post("/login/logout", response_model=Message)
+async def logout(
+    session: AsyncSessionDep,
+    token: TokenDep,
+    current_user: CurrentUser,
+    body: TokenRefresh | None = None,
+) -> Message:
+    """
+    Revoke the access token of the request, and the refresh token if given
+    """
+    if body:
+        await crud.revoke_refresh_token(session=session, token=body.refresh_token)
+    token_data = TokenPayload(**security.decode_access_token(token))
+    if not token_data.jti or not token_data.exp:
+        raise HTTPException(status_code=400, detail="This token cannot be revoked")
+    await crud.revoke_token(
+        session=session,
+        jti=token_data.jti,
+        user_id=current_user.id,
+        expires_at=datetime.fromtimestamp(token_data.exp, timezone.utc),
+    )
+    revocation_filter.add(token_data.jti)
+    return Message(message="Token revoked")
+
+
+@router.get("/.well-known/jwks.json", response_model=JWKSet)
+def read_jwks(response: Response) -> Any:
+    """
+    Public keys that verify access tokens, empty when they are signed with HS256
+    """
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return JWKSet(keys=security.key_set.jwks)
+
+
 @router.post("/password-recovery/{email}")
-def recover_password(email: str, session: SessionDep) -> Message:
+async def recover_password(email: str, session: AsyncSessionDep) -> Message:
     """
     Password Recovery
     """
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email(session=session, email=email)
 
     if not user:
         raise HTTPException(
             status_code=404,
             detail="The user with this email does not exist in the system.",
         )
+    if not settings.emails_enabled:
+        # It would never be sent nor purged, with a live reset link in it
+        raise HTTPException(status_code=503, detail="Emails are not configured")
     password_reset_token = generate_password_reset_token(email=email)
     email_data = generate_reset_password_email(
         email_to=user.email, email=email, token=password_reset_token
     )
-    send_email(
+    crud.enqueue_email(
+        session=session,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
+    await session.commit()
     return Message(message="Password recovery email sent")
 
 
 @router.post("/reset-password/")
-def reset_password(session: SessionDep, body: NewPassword) -> Message:
+async def reset_password(session: AsyncSessionDep, body: NewPassword) -> Message:
     """
     Reset password
     """
     email = verify_password_reset_token(token=body.token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email(session=session, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -91,10 +167,11 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
         )
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(password=body.new_password)
+    hashed_password = await get_password_hash_async(body.new_password)
     user.hashed_password = hashed_password
     session.add(user)
-    session.commit()
+    await crud.delete_refresh_tokens(session=session, user_id=user.id)
+    await session.commit()
     return Message(message="Password updated successfully")
 
 
@@ -103,11 +180,11 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
     dependencies=[Depends(get_current_active_superuser)],
     response_class=HTMLResponse,
 )
-def recover_password_html_content(email: str, session: SessionDep) -> Any:
+async def recover_password_html_content(email: str, session: AsyncSessionDep) -> Any:
     """
     HTML Content for Password Recovery
     """
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email(session=session, email=email)
 
     if not user:
         raise HTTPException(
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic.networks import EmailStr
 
-from app.api.deps import get_current_active_superuser
+from app import crud
+from app.api.deps import AsyncSessionDep, get_current_active_superuser
+from app.api.routing import ModelResponseRoute
+from app.core.config import settings
 from app.models import Message
-from app.utils import generate_test_email, send_email
+from app.utils import generate_test_email
 
-router = APIRouter(prefix="/utils", tags=["utils"])
+router = APIRouter(prefix="/utils", tags=["utils"], route_class=ModelResponseRoute)
 
 
 @router.post(
@@ -13,16 +16,20 @@ router = APIRouter(prefix="/utils", tags=["utils"])
     dependencies=[Depends(get_current_active_superuser)],
     status_code=201,
 )
-def test_email(email_to: EmailStr) -> Message:
+async def test_email(session: AsyncSessionDep, email_to: EmailStr) -> Message:
     """
     Test emails.
     """
+    if not settings.emails_enabled:
+        raise HTTPException(status_code=503, detail="Emails are not configured")
     email_data = generate_test_email(email_to=email_to)
-    send_email(
+    crud.enqueue_email(
+        session=session,
         email_to=email_to,
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
+    await session.commit()
     return Message(message="Test email sent")
 
 
@@ -0,0 +1,81 @@
+import asyncio
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.dependencies.models import Dependant
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.routing import request_response
+
+
+def _dependants(dependant: Dependant) -> Iterator[Dependant]:
+    yield dependant
+    for sub_dependant in dependant.dependencies:
+        yield from _dependants(sub_dependant)
+
+
+class ModelResponseRoute(APIRoute):
+    """Route sending an instance of its ``response_model`` as it is.
+
+    FastAPI dumps what an endpoint returns to a dict, validates the dict
+    against ``response_model`` again and encodes the result. A model the
+    endpoint built was validated then already, so an instance of exactly
+    ``response_model`` is serialized to JSON by pydantic-core in one pass
+    instead. Anything else, an ORM object for instance, takes FastAPI's path.
+
+    Routes filtering the model with the ``response_model_*`` options, or
+    whose endpoint or dependencies take the ``Response`` to set headers or
+    a status code, are left to FastAPI.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, endpoint, **kwargs)
+        if self._sends_model_as_is():
+            self.dependant.call = self._respond_with_model(endpoint)
+            self.app = request_response(self.get_route_handler())
+
+    def _sends_model_as_is(self) -> bool:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        return (
+            isinstance(self.response_model, type)
+            and issubclass(self.response_model, BaseModel)
+            and issubclass(response_class, JSONResponse)
+            and self.response_model_include is None
+            and self.response_model_exclude is None
+            and self.response_model_by_alias
+            and not self.response_model_exclude_unset
+            and not self.response_model_exclude_defaults
+            and not self.response_model_exclude_none
+            and all(d.response_param_name is None for d in _dependants(self.dependant))
+        )
+
+    def _respond_with_model(self, endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        model, status_code = self.response_model, self.status_code or 200
+
+        def respond(content: Any) -> Any:
+            if type(content) is not model:
+                return content
+            return Response(
+                to_json(content, by_alias=True),
+                status_code=status_code,
+                media_type="application/json",
+            )
+
+        # FastAPI runs plain functions in its threadpool, keep them plain
+        if asyncio.iscoroutinefunction(endpoint):
+
+            async def call_async(**values: Any) -> Any:
+                return respond(await endpoint(**values))
+
+            return call_async
+
+        def call(**values: Any) -> Any:
+            return respond(endpoint(**values))
+
+        return call
@@ -32,8 +32,45 @@ class Settings(BaseSettings):
     )
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = secrets.token_urlsafe(32)
+    # Access tokens are renewed at /login/refresh without checking the
+    # password again, for as long as the refresh token lives.
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     # 60 minutes * 24 hours * 8 days = 8 days
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # HS256 signs access tokens with SECRET_KEY. RS256 and EdDSA sign with
+    # the PEM encoded JWT_PRIVATE_KEY and publish its public key, with any
+    # retired JWT_PUBLIC_KEYS still accepted, at /.well-known/jwks.json.
+    JWT_ALGORITHM: Literal["HS256", "RS256", "EdDSA"] = "HS256"
+    JWT_PRIVATE_KEY: str | None = None
+    JWT_PUBLIC_KEYS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    # Verified access tokens kept per worker process, each until it expires.
+    ACCESS_TOKEN_CACHE_SIZE: int = 10_000
+    # Each worker probes a Bloom filter of the revoked token ids, sized for
+    # this many revocations at this false positive rate, and reads the new
+    # ones every TOKEN_REVOCATION_REFRESH_SECONDS. Only possible hits query
+    # the database.
+    TOKEN_REVOCATION_FILTER_CAPACITY: int = 100_000
+    TOKEN_REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    TOKEN_REVOCATION_REFRESH_SECONDS: float = 5
+    # bcrypt runs in a pool of this many processes per server worker. Jobs
+    # beyond PASSWORD_HASH_MAX_PENDING (queued or running) get a 503 instead
+    # of waiting behind the others.
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    # New hashes get the highest bcrypt cost that takes at most
+    # PASSWORD_HASH_TARGET_SECONDS, measured at startup within the rounds
+    # bounds, unless PASSWORD_HASH_ROUNDS pins it. Stored hashes follow on
+    # the next login.
+    PASSWORD_HASH_ROUNDS: int | None = None
+    PASSWORD_HASH_TARGET_SECONDS: float = 0.25
+    PASSWORD_HASH_MIN_ROUNDS: int = 10
+    PASSWORD_HASH_MAX_ROUNDS: int = 15
+    # Authenticated users are cached per worker process for this long.
+    # "postgres" spreads invalidations to the other workers over
+    # LISTEN/NOTIFY, with "local" only the TTL bounds their staleness.
+    USER_CACHE_SECONDS: float = 60
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_INVALIDATION: Literal["local", "postgres"] = "local"
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production", "test"] = "local"
 
@@ -68,12 +105,64 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Connection pool of the async engine (and of each replica engine), per
+    # worker process. The sync engine, left to the private routes and the
+    # scripts, has a small pool of its own. Size them so that workers *
+    # (POOL_SIZE + MAX_OVERFLOW + SYNC_POOL_SIZE + SYNC_MAX_OVERFLOW) stays
+    # below Postgres max_connections: 4 * (5 + 10 + 2 + 3) = 80 of 100.
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_SYNC_POOL_SIZE: int = 2
+    POSTGRES_SYNC_MAX_OVERFLOW: int = 3
+    # Seconds a checkout may wait for a free connection before failing.
+    POSTGRES_POOL_TIMEOUT: float = 30
+    # Seconds after which a connection is replaced on checkout; -1 disables.
+    POSTGRES_POOL_RECYCLE: int = 1800
+    # Test connections with a round trip on checkout, for networks where
+    # idle connections may be dropped (proxies, failovers).
+    POSTGRES_POOL_PRE_PING: bool = False
+    # Optional read replicas (comma separated DSNs) serving the GET requests
+    # of deps.AsyncSessionDep, picked round robin or by fewest checked out
+    # connections.
+    POSTGRES_REPLICA_URIS: Annotated[
+        list[PostgresDsn] | str, BeforeValidator(parse_cors)
+    ] = []
+    POSTGRES_REPLICA_SELECTION: Literal["round_robin", "least_connections"] = (
+        "round_robin"
+    )
+    # After a write, GET requests of the same client read from the primary
+    # for this many seconds to hide replication lag. The window travels in a
+    # signed cookie, any worker honors it.
+    POSTGRES_READ_YOUR_WRITES_SECONDS: float = 5
+    # How long listings reuse an exact count. Commits in the same worker
+    # process drop the counts of the tables they wrote to.
+    EXACT_COUNT_CACHE_SECONDS: float = 10
+    # POST /items/bulk validates and inserts ITEMS_BULK_CHUNK_SIZE items per
+    # transaction, chunks of at least ITEMS_BULK_COPY_MIN_ROWS valid items
+    # are loaded with COPY instead of a multi-row INSERT.
+    ITEMS_BULK_CHUNK_SIZE: int = 5000
+    ITEMS_BULK_COPY_MIN_ROWS: int = 1000
+    # POST /users/bulk creates and commits users USERS_BULK_BATCH_SIZE at a
+    # time, updating the progress of its job after each batch. Passwords are
+    # hashed in a pool of USERS_BULK_HASH_WORKERS processes of its own, one
+    # per CPU available unless set. A job whose progress has not moved for
+    # USERS_BULK_STALE_SECONDS, its worker gone, is marked failed at startup.
+    USERS_BULK_BATCH_SIZE: int = 500
+    USERS_BULK_HASH_WORKERS: int | None = None
+    USERS_BULK_STALE_SECONDS: int = 600
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
     SMTP_HOST: str | None = None
     SMTP_USER: str | None = None
     SMTP_PASSWORD: str | None = None
+    SMTP_TIMEOUT: float = 10
+    # SMTP sessions are kept open between emails, per process, and closed
+    # after idling this long or sending this many messages
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_IDLE_SECONDS: float = 30
+    SMTP_POOL_MAX_MESSAGES: int = 100
     # TODO: update type to EmailStr when sqlmodel supports it
     EMAILS_FROM_EMAIL: str | None = None
     EMAILS_FROM_NAME: str | None = None
@@ -85,6 +174,24 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # Compiled email templates are cached on disk, in the system temporary
+    # directory unless set. Auto reload picks up rebuilt templates without a
+    # restart, for local development.
+    EMAIL_TEMPLATES_CACHE_DIR: str | None = None
+    EMAIL_TEMPLATES_AUTO_RELOAD: bool = False
+    # Emails go through an outbox table, app/email_dispatcher.py claims up
+    # to EMAIL_OUTBOX_BATCH_SIZE due ones at a time for LEASE_SECONDS and
+    # retries failures with exponential backoff until MAX_ATTEMPTS.
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_SECONDS: float = 1
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    EMAIL_OUTBOX_RETRY_SECONDS: int = 30
+    EMAIL_OUTBOX_RETRY_MAX_SECONDS: int = 3600
+    # The content of an email, which can hold a reset link, is cleared once
+    # it is sent or given up on, the row itself is purged RETENTION_HOURS
+    # after it was queued.
+    EMAIL_OUTBOX_RETENTION_HOURS: int = 168
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -104,6 +211,9 @@ class Settings(BaseSettings):
     OTLP_ENDPOINT: str = "http://tempo:4317"
     SERVICE_NAME: str = "backend"
     LOKI_HOST: str = "http://loki:3100"
+    # Shared directory for per-worker metric files when running several
+    # workers; /metrics then aggregates all of them. Unset for a single process.
+    PROMETHEUS_MULTIPROC_DIR: str | None = None
 
     @model_validator(mode='after')
     def parse_enable_tracing(self) -> 'Settings':
@@ -122,6 +232,14 @@ class Settings(BaseSettings):
             else:
                 raise ValueError(message)
 
+    @model_validator(mode="after")
+    def _require_jwt_private_key(self) -> Self:
+        if self.JWT_ALGORITHM != "HS256" and not self.JWT_PRIVATE_KEY:
+            raise ValueError(
+                f"JWT_ALGORITHM {self.JWT_ALGORITHM} needs JWT_PRIVATE_KEY"
+            )
+        return self
+
     @model_validator(mode="after")
     def _enforce_non_default_secrets(self) -> Self:
         self._check_default_secret("SECRET_KEY", self.SECRET_KEY)
@@ -1,10 +1,132 @@
+import itertools
+from typing import Any, cast
+
+from sqlalchemy import Connection, Delete, Engine, Insert, Update, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
+from app.observability import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    instrument_engine,
+)
+
+pool_options = {
+    "pool_size": settings.POSTGRES_POOL_SIZE,
+    "max_overflow": settings.POSTGRES_MAX_OVERFLOW,
+    "pool_timeout": settings.POSTGRES_POOL_TIMEOUT,
+    "pool_recycle": settings.POSTGRES_POOL_RECYCLE,
+    "pool_pre_ping": settings.POSTGRES_POOL_PRE_PING,
+}
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    pool_logging_name="sync",
+    **{
+        **pool_options,
+        "pool_size": settings.POSTGRES_SYNC_POOL_SIZE,
+        "max_overflow": settings.POSTGRES_SYNC_MAX_OVERFLOW,
+    },
+)
+# psycopg 3 speaks asyncio natively, so the same DSN drives both engines.
+# Routes opt in to the async engine through deps.AsyncSessionDep.
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    pool_logging_name="async",
+    **pool_options,
+)
+replica_engines = [
+    create_async_engine(
+        str(uri),
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_logging_name=f"replica-{i}",
+        **pool_options,
+    )
+    for i, uri in enumerate(settings.POSTGRES_REPLICA_URIS)
+]
+instrument_engine(engine)
+for _async_engine in (async_engine, *replica_engines):
+    instrument_engine(_async_engine.sync_engine)
+
+
+class ReplicaRouter:
+    """Chooses the engine serving a read-only request.
+
+    Replicas are picked round robin, or by the fewest checked out
+    connections. A client that wrote recently reads from the primary so it
+    sees its own writes despite replication lag, the caller tells which
+    through ``primary``.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: list[AsyncEngine],
+        selection: str = "round_robin",
+    ) -> None:
+        self.primary = primary
+        self.replicas = replicas
+        self.selection = selection
+        self._next = itertools.count()
+
+    def engine_for_read(self, primary: bool = False) -> AsyncEngine:
+        if not self.replicas or primary:
+            return self.primary
+        if self.selection == "least_connections":
+            return min(
+                self.replicas, key=lambda e: cast(QueuePool, e.pool).checkedout()
+            )
+        return self.replicas[next(self._next) % len(self.replicas)]
+
+
+replica_router = ReplicaRouter(
+    async_engine, replica_engines, selection=settings.POSTGRES_REPLICA_SELECTION
+)
+
+
+class RoutingSession(Session):
+    """Session reading from ``info["replica"]`` when set, writing to the primary.
+
+    Flushes and DML statements always go to the primary, so a handler that
+    unexpectedly writes on a replica session stays correct, as do statements
+    given ``bind_arguments={"bind": ...}``. Committing a session flags
+    ``committed_write`` in ``info["request_state"]``, the state of the
+    request it serves, if any.
+    """
+
+    def get_bind(
+        self,
+        mapper: Any = None,
+        clause: Any = None,
+        bind: Engine | Connection | None = None,
+        **kw: Any,
+    ) -> Engine | Connection:
+        if bind is not None:
+            return bind
+        replica = self.info.get("replica")
+        if (
+            replica is None
+            or self._flushing
+            or isinstance(clause, Insert | Update | Delete)
+        ):
+            return async_engine.sync_engine
+        return cast(Engine, replica)
+
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+@event.listens_for(RoutingSession, "after_commit")
+def _start_read_your_writes(session: Session) -> None:
+    # api.read_your_writes answers with a cookie keeping the client's reads
+    # on the primary for a while
+    request_state = session.info.get("request_state")
+    if request_state is not None:
+        request_state["committed_write"] = True
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -12,7 +134,7 @@ engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 # for more details: https://github.com/fastapi/full-stack-fastapi-template/issues/28
 
 
-def init_db(session: Session) -> None:
+async def init_db(session: AsyncSession) -> None:
     # Tables should be created with Alembic migrations
     # But if you don't want to use migrations, create
     # the tables un-commenting the next lines
@@ -21,8 +143,8 @@ def init_db(session: Session) -> None:
     # This works because the models are already imported and registered from app.models
     # SQLModel.metadata.create_all(engine)
 
-    user = session.exec(
-        select(User).where(User.email == settings.FIRST_SUPERUSER)
+    user = (
+        await session.exec(select(User).where(User.email == settings.FIRST_SUPERUSER))
     ).first()
     if not user:
         user_in = UserCreate(
@@ -30,4 +152,4 @@ def init_db(session: Session) -> None:
             password=settings.FIRST_SUPERUSER_PASSWORD,
             is_superuser=True,
         )
-        user = crud.create_user(session=session, user_create=user_in)
+        user = await crud.create_user(session=session, user_create=user_in)
@@ -0,0 +1,169 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, TypeVar
+
+from app.core import passwords
+from app.core.config import settings
+from app.observability import HASHING_METRICS
+
+# bcrypt is CPU bound by design. Running it in threads holds the GIL for most
+# of its time and a burst of logins starves every other request, so hashing
+# goes to a process pool instead. The pool is created on first use, after
+# the server has forked its workers, and its processes are spawned so they
+# do not inherit the server's threads. They only import app.core.passwords.
+
+T = TypeVar("T")
+
+_executor: ProcessPoolExecutor | None = None
+_pending = 0
+_calibrated_rounds: int | None = None
+
+
+class PasswordHashingBusy(Exception):
+    """More hashing jobs are pending than PASSWORD_HASH_MAX_PENDING allows."""
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _discard(executor: ProcessPoolExecutor) -> None:
+    # Unless a concurrent call already replaced it
+    if _executor is executor:
+        shutdown()
+
+
+async def _run(operation: str, fn: Callable[..., T], *args: Any) -> T:
+    # Only touched from the event loop thread, a plain counter is enough
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        HASHING_METRICS.rejected.labels(operation).inc()
+        raise PasswordHashingBusy
+    _pending += 1
+    HASHING_METRICS.queue_depth.inc()
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # One of its processes died, killed for memory or crashed, and the
+            # pool fails every job from then on. Try once more on a new one.
+            _discard(executor)
+            executor = _get_executor()
+            try:
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                _discard(executor)
+                raise
+    finally:
+        _pending -= 1
+        HASHING_METRICS.queue_depth.dec()
+        HASHING_METRICS.duration.labels(operation).observe(time.perf_counter() - start)
+
+
+def rounds() -> int:
+    """The bcrypt cost new hashes get."""
+    return (
+        settings.PASSWORD_HASH_ROUNDS or _calibrated_rounds or passwords.DEFAULT_ROUNDS
+    )
+
+
+async def calibrate() -> int:
+    """Measure the cost that fits PASSWORD_HASH_TARGET_SECONDS in the pool.
+
+    Skipped when PASSWORD_HASH_ROUNDS pins the cost. Workers calibrate
+    separately, pin the cost when they run on different hardware.
+    """
+    global _calibrated_rounds
+    if not settings.PASSWORD_HASH_ROUNDS:
+        _calibrated_rounds = await _run(
+            "calibrate",
+            passwords.calibrate,
+            settings.PASSWORD_HASH_TARGET_SECONDS,
+            settings.PASSWORD_HASH_MIN_ROUNDS,
+            settings.PASSWORD_HASH_MAX_ROUNDS,
+        )
+    HASHING_METRICS.rounds.set(rounds())
+    return rounds()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(
+        "verify", passwords.verify_password, plain_password, hashed_password
+    )
+
+
+async def verify_and_update_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Whether the password matches, and its rehash at the current cost when
+    the stored hash has drifted from it."""
+    valid, new_hash, elapsed = await _run(
+        "verify",
+        passwords.verify_and_update,
+        plain_password,
+        hashed_password,
+        rounds(),
+    )
+    cost = hashed_password.split("$")[2] if hashed_password.count("$") >= 3 else ""
+    HASHING_METRICS.verify_duration.labels(cost).observe(elapsed)
+    return valid, new_hash
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run("hash", passwords.get_password_hash, password, rounds())
+
+
+def available_cpus() -> int:
+    # Those this process may run on, fewer than the machine has when the
+    # container is pinned to some of them
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def create_bulk_executor() -> ProcessPoolExecutor:
+    """A pool for one bulk job, apart from the one logins go through.
+
+    It has USERS_BULK_HASH_WORKERS processes, or one per CPU available.
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.USERS_BULK_HASH_WORKERS or available_cpus(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+async def get_password_hashes_async(
+    plain_passwords: Sequence[str], executor: ProcessPoolExecutor
+) -> list[str]:
+    """Hash ``plain_passwords`` in parallel across ``executor``."""
+    loop = asyncio.get_running_loop()
+    cost = rounds()
+    return list(
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, passwords.get_password_hash, p, cost)
+                for p in plain_passwords
+            )
+        )
+    )
@@ -0,0 +1,64 @@
+import time
+from functools import lru_cache
+
+from passlib.context import CryptContext
+
+# Kept free of app imports: the password hashing processes import this
+# module and nothing else, see app.core.hashing.
+
+# passlib's own default, used until app.core.hashing has calibrated the cost
+DEFAULT_ROUNDS = 12
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache
+def context_for(rounds: int) -> CryptContext:
+    # Hashes one round above the target are left alone, so that workers
+    # calibrated either side of a boundary do not keep rehashing each
+    # other's hashes
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds + 1,
+    )
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    return context_for(rounds).hash(password)
+
+
+def verify_and_update(
+    plain_password: str, hashed_password: str, rounds: int
+) -> tuple[bool, str | None, float]:
+    """Whether the password matches, its rehash when the cost is off target,
+    and the seconds the verification took.
+    """
+    start = time.perf_counter()
+    valid = context_for(rounds).verify(plain_password, hashed_password)
+    elapsed = time.perf_counter() - start
+    if valid and context_for(rounds).needs_update(hashed_password):
+        return valid, context_for(rounds).hash(plain_password), elapsed
+    return valid, None, elapsed
+
+
+def calibrate(target_seconds: float, min_rounds: int, max_rounds: int) -> int:
+    """The highest cost whose hash takes at most ``target_seconds``.
+
+    Each round doubles the work, so one hash at ``min_rounds`` is enough to
+    extrapolate from. Never below ``min_rounds``, whatever the hardware.
+    """
+    start = time.perf_counter()
+    context_for(min_rounds).hash("calibration")
+    elapsed = time.perf_counter() - start
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_seconds:
+        rounds += 1
+        elapsed *= 2
+    return rounds
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import col, delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import RefreshToken, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Revocations committed this long before the last one seen are read again on
+# the next refresh, in case their transaction committed late
+REFRESH_OVERLAP = timedelta(seconds=60)
+# A Bloom filter cannot forget, expired revocations only leave it on a rebuild
+REBUILD_SECONDS = 600
+
+
+class BloomFilter:
+    """Set membership in ``m`` bits, with false positives but no false negatives.
+
+    Sized for ``capacity`` keys at ``error_rate`` false positives, the ``k``
+    bit positions of a key come from two halves of its BLAKE2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(capacity, 1)
+        self.m = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, key: bytes) -> list[int]:
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, key: bytes) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevocationFilter:
+    """Per process snapshot of the revoked, unexpired token ids.
+
+    ``might_be_revoked`` is the memory probe on the request path, a hit is
+    confirmed against the database by ``crud.is_token_revoked``. Revocations
+    made in this process are added at once, those of other processes once
+    ``refresh`` has read them.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.watermark: datetime | None = None
+        self.rebuilt_at = 0.0
+
+    def add(self, jti: uuid.UUID) -> None:
+        self.bloom.add(jti.bytes)
+
+    def might_be_revoked(self, jti: uuid.UUID) -> bool:
+        return jti.bytes in self.bloom
+
+    async def refresh(self, session: AsyncSession) -> None:
+        """Read new revocations, or all unexpired ones when due for a rebuild."""
+        now = datetime.now(timezone.utc)
+        rebuild = (
+            self.watermark is None
+            or time.monotonic() - self.rebuilt_at >= REBUILD_SECONDS
+        )
+        statement = select(RevokedToken.jti, RevokedToken.revoked_at).where(
+            col(RevokedToken.expires_at) > now
+        )
+        if not rebuild and self.watermark is not None:
+            since = self.watermark - REFRESH_OVERLAP
+            statement = statement.where(col(RevokedToken.revoked_at) > since)
+        rows = (await session.exec(statement)).all()
+
+        if rebuild:
+            bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+            self.rebuilt_at = time.monotonic()
+        else:
+            bloom = self.bloom
+        for jti, revoked_at in rows:
+            bloom.add(jti.bytes)
+            if self.watermark is None or revoked_at > self.watermark:
+                self.watermark = revoked_at
+        self.watermark = self.watermark or now
+        # Swapped in whole, requests never probe a half built filter
+        self.bloom = bloom
+
+
+revocation_filter = RevocationFilter(
+    settings.TOKEN_REVOCATION_FILTER_CAPACITY,
+    settings.TOKEN_REVOCATION_FILTER_ERROR_RATE,
+)
+
+
+async def purge_expired() -> None:
+    """Delete the revocations and refresh tokens of expired tokens."""
+    now = datetime.now(timezone.utc)
+    async with AsyncSession(async_engine) as session:
+        for model in (RevokedToken, RefreshToken):
+            statement = delete(model).where(col(model.expires_at) <= now)
+            await session.exec(statement)  # type: ignore[call-overload]
+        await session.commit()
+
+
+async def refresh() -> None:
+    async with AsyncSession(async_engine) as session:
+        await revocation_filter.refresh(session)
+
+
+async def keep_fresh() -> None:
+    """Refresh the filter every TOKEN_REVOCATION_REFRESH_SECONDS, forever."""
+    last_purge = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+        try:
+            await refresh()
+            if time.monotonic() - last_purge >= REBUILD_SECONDS:
+                await purge_expired()
+                last_purge = time.monotonic()
+        except SQLAlchemyError:
+            logger.exception("Refreshing the token revocation filter failed")
@@ -1,27 +1,177 @@
+import base64
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 import jwt
-from passlib.context import CryptContext
+from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+    Ed25519PrivateKey,
+    Ed25519PublicKey,
+)
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key,
+    load_pem_public_key,
+)
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
 
 from app.core.config import settings
+from app.core.passwords import get_password_hash as get_password_hash
+from app.core.passwords import pwd_context as pwd_context
+from app.core.passwords import verify_password as verify_password
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password reset tokens, and access tokens unless JWT_ALGORITHM says otherwise
+ALGORITHM = "HS256"
 
+# Members of each key type that make up its RFC 7638 thumbprint
+THUMBPRINT_MEMBERS = {"RSA": ("e", "kty", "n"), "OKP": ("crv", "kty", "x")}
 
-ALGORITHM = "HS256"
 
+@dataclass(frozen=True)
+class VerificationKey:
+    kid: str
+    algorithm: str
+    key: RSAPublicKey | Ed25519PublicKey
+    jwk: dict[str, Any]
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
-    expire = datetime.now(timezone.utc) + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
 
+def verification_key(key: Any) -> VerificationKey:
+    if isinstance(key, RSAPublicKey):
+        algorithm, jwk = "RS256", RSAAlgorithm.to_jwk(key, as_dict=True)
+    elif isinstance(key, Ed25519PublicKey):
+        algorithm, jwk = "EdDSA", OKPAlgorithm.to_jwk(key, as_dict=True)
+    else:
+        raise ValueError("Only RSA and Ed25519 keys can sign access tokens")
+    members = {name: jwk[name] for name in THUMBPRINT_MEMBERS[jwk["kty"]]}
+    canonical = json.dumps(members, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode()).digest()
+    kid = base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+    return VerificationKey(
+        kid, algorithm, key, {**jwk, "kid": kid, "alg": algorithm, "use": "sig"}
+    )
+
+
+class KeySet:
+    """The key access tokens are signed with and the keys they are verified with.
+
+    Asymmetric tokens name their key in the ``kid`` header, the thumbprint of
+    the public key, so retired public keys keep verifying the tokens they
+    signed. Tokens without a ``kid`` are verified with ``secret``, which keeps
+    HS256 tokens issued before a switch valid until they expire.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        secret: str,
+        private_key: str | None = None,
+        public_keys: Iterable[str] = (),
+    ) -> None:
+        self.algorithm = algorithm
+        self.secret = secret
+        self.keys: dict[str, VerificationKey] = {}
+        self.private_key: RSAPrivateKey | Ed25519PrivateKey | None = None
+        self.kid: str | None = None
+        if algorithm == ALGORITHM:
+            return
+        if private_key is None:
+            raise ValueError(f"{algorithm} needs a private key")
+        loaded = load_pem_private_key(private_key.encode(), password=None)
+        if not isinstance(loaded, RSAPrivateKey | Ed25519PrivateKey):
+            raise ValueError("Only RSA and Ed25519 keys can sign access tokens")
+        signing = verification_key(loaded.public_key())
+        if signing.algorithm != algorithm:
+            raise ValueError(f"JWT_PRIVATE_KEY is not a {algorithm} key")
+        self.private_key, self.kid = loaded, signing.kid
+        self.keys[signing.kid] = signing
+        for pem in public_keys:
+            retired = verification_key(load_pem_public_key(pem.encode()))
+            self.keys.setdefault(retired.kid, retired)
+
+    @property
+    def jwks(self) -> list[dict[str, Any]]:
+        return [key.jwk for key in self.keys.values()]
+
+    def sign(self, claims: dict[str, Any]) -> str:
+        if self.private_key is None:
+            return jwt.encode(claims, self.secret, algorithm=ALGORITHM)
+        return jwt.encode(
+            claims,
+            self.private_key,
+            algorithm=self.algorithm,
+            headers={"kid": self.kid},
+        )
+
+    def verify(self, token: str) -> dict[str, Any]:
+        kid = jwt.get_unverified_header(token).get("kid")
+        claims: dict[str, Any]
+        if kid is None:
+            claims = jwt.decode(token, self.secret, algorithms=[ALGORITHM])
+            return claims
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown key id {kid}")
+        claims = jwt.decode(token, key.key, algorithms=[key.algorithm])
+        return claims
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+class VerifiedTokenCache:
+    """LRU of verified claims keyed by the SHA-256 digest of the token.
+
+    An entry is reused until the ``exp`` of its token, tokens without one are
+    not cached.
+    """
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, dict[str, Any]] = OrderedDict()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        digest = hashlib.sha256(token.encode()).digest()
+        claims = self._entries.get(digest)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return claims
+
+    def set(self, token: str, claims: dict[str, Any]) -> None:
+        if not isinstance(claims.get("exp"), int | float):
+            return
+        digest = hashlib.sha256(token.encode()).digest()
+        self._entries[digest] = claims
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+key_set = KeySet(
+    settings.JWT_ALGORITHM,
+    settings.SECRET_KEY,
+    settings.JWT_PRIVATE_KEY,
+    settings.JWT_PUBLIC_KEYS,
+)
+token_cache = VerifiedTokenCache(settings.ACCESS_TOKEN_CACHE_SIZE)
+
+
+def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+    expire = datetime.now(timezone.utc) + expires_delta
+    to_encode = {"exp": expire, "sub": str(subject), "jti": str(uuid.uuid4())}
+    return key_set.sign(to_encode)
 
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def decode_access_token(token: str) -> dict[str, Any]:
+    """Claims of a valid access token, raises ``jwt.InvalidTokenError`` otherwise."""
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = key_set.verify(token)
+        token_cache.set(token, claims)
+    return claims
@@ -0,0 +1,112 @@
+import smtplib
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+# Opening an SMTP session costs a TCP handshake, the TLS one and the AUTH
+# exchange, more than sending a message over it. Sessions are kept open and
+# handed from one email to the next instead, up to SMTP_POOL_SIZE at a time.
+
+
+@dataclass
+class _Session:
+    smtp: smtplib.SMTP
+    messages: int = 0
+    idle_since: float = 0.0
+
+
+class SMTPConnectionPool:
+    """Authenticated SMTP sessions reused across emails.
+
+    A session is closed once idle for ``idle_seconds``, servers drop quiet
+    clients on their own, or after ``max_messages`` as many servers cap what
+    they accept over one session. Thread safe, ``connection`` blocks while
+    ``size`` sessions are in use.
+    """
+
+    def __init__(self, size: int, idle_seconds: float, max_messages: int) -> None:
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: list[_Session] = []
+
+    def _connect(self) -> smtplib.SMTP:
+        host, port = settings.SMTP_HOST or "", settings.SMTP_PORT
+        smtp: smtplib.SMTP
+        if settings.SMTP_SSL and not settings.SMTP_TLS:
+            smtp = smtplib.SMTP_SSL(host, port, timeout=settings.SMTP_TIMEOUT)
+        else:
+            smtp = smtplib.SMTP(host, port, timeout=settings.SMTP_TIMEOUT)
+            if settings.SMTP_TLS:
+                smtp.starttls()
+        if settings.SMTP_USER:
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+        return smtp
+
+    def _checkout(self) -> _Session:
+        now = time.monotonic()
+        expired: list[_Session] = []
+        reused: _Session | None = None
+        with self._lock:
+            # Most recently used first, the older ones are left to expire
+            while self._idle:
+                session = self._idle.pop()
+                if now - session.idle_since < self.idle_seconds:
+                    reused = session
+                    break
+                expired.append(session)
+        # QUIT waits on the server, other senders must not wait with it
+        for session in expired:
+            _quit(session.smtp)
+        return reused if reused is not None else _Session(self._connect())
+
+    def _checkin(self, session: _Session) -> None:
+        if session.messages >= self.max_messages:
+            _quit(session.smtp)
+            return
+        session.idle_since = time.monotonic()
+        with self._lock:
+            self._idle.append(session)
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """A session to send one message over, returned to the pool after."""
+        with self._slots:
+            session = self._checkout()
+            try:
+                yield session.smtp
+            except smtplib.SMTPResponseException:
+                # The server refused the message, the session itself is fine
+                session.messages += 1
+                self._checkin(session)
+                raise
+            except BaseException:
+                _quit(session.smtp)
+                raise
+            session.messages += 1
+            self._checkin(session)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            _quit(session.smtp)
+
+
+def _quit(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+smtp_pool = SMTPConnectionPool(
+    settings.SMTP_POOL_SIZE,
+    settings.SMTP_POOL_IDLE_SECONDS,
+    settings.SMTP_POOL_MAX_MESSAGES,
+)
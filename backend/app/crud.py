@@ -1,54 +1,650 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import secrets
+import time
 import uuid
-from typing import Any
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable, Hashable, Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any, Literal, TypeVar
 
-from sqlmodel import Session, select
+import psycopg
+from sqlalchemy import (
+    ARRAY,
+    ColumnElement,
+    Row,
+    String,
+    any_,
+    bindparam,
+    event,
+    insert,
+    inspect,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import ORMExecuteState
+from sqlalchemy.orm import Session as ORMSession
+from sqlmodel import Session, SQLModel, col, delete, func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.core.config import settings
+from app.core.hashing import get_password_hash_async, verify_and_update_async
+from app.models import (
+    Item,
+    ItemCreate,
+    OutboxEmail,
+    RefreshToken,
+    RevokedToken,
+    User,
+    UserCreate,
+    UserPublic,
+    UserUpdate,
+)
 
+logger = logging.getLogger(__name__)
 
-def create_user(*, session: Session, user_create: UserCreate) -> User:
+CountMode = Literal["exact", "estimated", "none"]
+# Upper bound of the limit of a listing page
+MAX_PAGE_SIZE = 1000
+ListedModel = TypeVar("ListedModel", Item, User)
+
+
+async def create_user(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await get_password_hash_async(user_create.password)
     db_obj = User.model_validate(
-        user_create, update={"hashed_password": get_password_hash(user_create.password)}
+        user_create, update={"hashed_password": hashed_password}
     )
     session.add(db_obj)
-    session.commit()
-    session.refresh(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
     return db_obj
 
 
-def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
+async def get_existing_emails(
+    *, session: AsyncSession, emails: Sequence[str]
+) -> set[str]:
+    """Those of ``emails`` some user already has, looked up in one query."""
+    statement = select(User.email).where(
+        col(User.email) == any_(bindparam("emails", list(emails), type_=ARRAY(String)))
+    )
+    return set((await session.exec(statement)).all())
+
+
+async def add_users(
+    *, session: AsyncSession, users: Sequence[tuple[UserCreate, str]]
+) -> set[str]:
+    """
+    Insert ``users``, each with its password hash, in one statement without
+    committing. Returns the emails of the users inserted, those whose email
+    was taken in the meantime are skipped.
+    """
+    if not users:
+        return set()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            **user_in.model_dump(exclude={"password"}),
+            "hashed_password": hashed_password,
+        }
+        for user_in, hashed_password in users
+    ]
+    statement = (
+        postgresql.insert(User)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[col(User.email)])
+        .returning(col(User.email))
+    )
+    result = await session.exec(statement)  # type: ignore[call-overload]
+    return set(result.scalars())
+
+
+async def update_user(
+    *, session: AsyncSession, db_user: User, user_in: UserUpdate
+) -> Any:
     user_data = user_in.model_dump(exclude_unset=True)
     extra_data = {}
     if "password" in user_data:
         password = user_data["password"]
-        hashed_password = get_password_hash(password)
+        hashed_password = await get_password_hash_async(password)
         extra_data["hashed_password"] = hashed_password
+        await delete_refresh_tokens(session=session, user_id=db_user.id)
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
     return db_user
 
 
-def get_user_by_email(*, session: Session, email: str) -> User | None:
+async def get_user_by_email(*, session: AsyncSession, email: str) -> User | None:
     statement = select(User).where(User.email == email)
-    session_user = session.exec(statement).first()
+    session_user = (await session.exec(statement)).first()
     return session_user
 
 
-def authenticate(*, session: Session, email: str, password: str) -> User | None:
-    db_user = get_user_by_email(session=session, email=email)
+async def authenticate(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    valid, new_hash = await verify_and_update_async(password, db_user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # Moves the stored hash to the current cost, no migration needed
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        await session.commit()
     return db_user
 
 
-def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -> Item:
+async def create_item(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID
+) -> Item:
     db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
     session.add(db_item)
-    session.commit()
-    session.refresh(db_item)
+    await session.commit()
+    await session.refresh(db_item)
     return db_item
+
+
+async def create_items(
+    *, session: AsyncSession, items: Sequence[ItemCreate], owner_id: uuid.UUID
+) -> list[uuid.UUID]:
+    """
+    Insert ``items`` for ``owner_id`` in one transaction and commit, returning
+    their ids in order.
+
+    From ``ITEMS_BULK_COPY_MIN_ROWS`` items on they are loaded with ``COPY``,
+    fewer go in multi-row ``INSERT ... RETURNING`` statements.
+    """
+    rows = [
+        {"id": uuid.uuid4(), "owner_id": owner_id, **item.model_dump()}
+        for item in items
+    ]
+    if len(rows) < settings.ITEMS_BULK_COPY_MIN_ROWS:
+        # render_nulls keeps the rows with and without a description in one
+        # statement, the ORM would otherwise split batches by the keys given
+        statement = insert(Item).returning(col(Item.id), sort_by_parameter_order=True)
+        ids = list(
+            await session.scalars(
+                statement, rows, execution_options={"render_nulls": True}
+            )
+        )
+        await session.commit()
+        return ids
+
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    assert isinstance(driver_connection, psycopg.AsyncConnection)
+    copy_statement = "COPY item (id, title, description, owner_id) FROM STDIN"
+    try:
+        async with (
+            driver_connection.cursor() as cursor,
+            cursor.copy(copy_statement) as copy,
+        ):
+            for row in rows:
+                await copy.write_row(
+                    (row["id"], row["title"], row["description"], row["owner_id"])
+                )
+    except psycopg.Error as e:
+        # Raised as SQLAlchemy raises the errors of the statements it runs
+        raise DBAPIError.instance(copy_statement, None, e, psycopg.Error) from e
+    # Sent past the ORM, which would otherwise collect the table written to
+    session.info.setdefault("written_tables", set()).add(Item.__tablename__)
+    await session.commit()
+    return [row["id"] for row in rows]
+
+
+async def update_items(
+    *,
+    session: AsyncSession,
+    filters: Sequence[ColumnElement[bool]],
+    values: dict[str, Any],
+) -> int:
+    """
+    Set ``values`` on the items matching ``filters`` in one ``UPDATE`` and
+    commit, returning how many there were.
+    """
+    statement = (
+        update(Item)
+        .where(*filters)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.exec(statement)  # type: ignore[call-overload]
+    await session.commit()
+    return int(result.rowcount)
+
+
+async def delete_items(
+    *, session: AsyncSession, filters: Sequence[ColumnElement[bool]]
+) -> int:
+    """
+    Delete the items matching ``filters`` in one ``DELETE`` and commit,
+    returning how many there were.
+    """
+    statement = (
+        delete(Item).where(*filters).execution_options(synchronize_session=False)
+    )
+    result = await session.exec(statement)  # type: ignore[call-overload]
+    await session.commit()
+    return int(result.rowcount)
+
+
+async def revoke_token(
+    *, session: AsyncSession, jti: uuid.UUID, user_id: uuid.UUID, expires_at: datetime
+) -> None:
+    revoked = RevokedToken(
+        jti=jti,
+        user_id=user_id,
+        expires_at=expires_at,
+        revoked_at=datetime.now(timezone.utc),
+    )
+    session.add(revoked)
+    await session.commit()
+
+
+def enqueue_email(
+    *, session: AsyncSession, email_to: str, subject: str, html_content: str
+) -> OutboxEmail:
+    """Add an email to the outbox, the dispatcher sends it once committed."""
+    now = datetime.now(timezone.utc)
+    email = OutboxEmail(
+        email_to=email_to,
+        subject=subject,
+        html_content=html_content,
+        created_at=now,
+        next_attempt_at=now,
+    )
+    session.add(email)
+    return email
+
+
+async def is_token_revoked(*, session: AsyncSession, jti: uuid.UUID) -> bool:
+    return await session.get(RevokedToken, jti) is not None
+
+
+def _hash_refresh_token(token: str) -> str:
+    # Refresh tokens are random, a fast digest is enough to keep them unusable
+    # if the table leaks
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _add_refresh_token(
+    session: AsyncSession, user_id: uuid.UUID, family_id: uuid.UUID
+) -> str:
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.now(timezone.utc) + timedelta(
+        minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES
+    )
+    session.add(
+        RefreshToken(
+            token_hash=_hash_refresh_token(token),
+            family_id=family_id,
+            user_id=user_id,
+            expires_at=expires_at,
+        )
+    )
+    return token
+
+
+async def create_refresh_token(*, session: AsyncSession, user_id: uuid.UUID) -> str:
+    token = _add_refresh_token(session, user_id, family_id=uuid.uuid4())
+    await session.commit()
+    return token
+
+
+async def rotate_refresh_token(
+    *, session: AsyncSession, token: str
+) -> tuple[uuid.UUID, str] | None:
+    """Use ``token`` up, returning its user and the next token of its family.
+
+    None when the token is unknown or expired. A token that was already used
+    ends its family, whoever refreshes next with it is logged out.
+    """
+    statement = (
+        select(RefreshToken)
+        .where(RefreshToken.token_hash == _hash_refresh_token(token))
+        .with_for_update()
+    )
+    db_token = (await session.exec(statement)).first()
+    now = datetime.now(timezone.utc)
+    if not db_token or db_token.expires_at <= now:
+        return None
+    if db_token.used_at is not None:
+        family = delete(RefreshToken).where(
+            col(RefreshToken.family_id) == db_token.family_id
+        )
+        await session.exec(family)  # type: ignore[call-overload]
+        await session.commit()
+        return None
+    db_token.used_at = now
+    session.add(db_token)
+    next_token = _add_refresh_token(session, db_token.user_id, db_token.family_id)
+    await session.commit()
+    return db_token.user_id, next_token
+
+
+async def revoke_refresh_token(*, session: AsyncSession, token: str) -> None:
+    """Ends the family of ``token``, if it is known."""
+    family = select(RefreshToken.family_id).where(
+        RefreshToken.token_hash == _hash_refresh_token(token)
+    )
+    statement = delete(RefreshToken).where(col(RefreshToken.family_id).in_(family))
+    await session.exec(statement)  # type: ignore[call-overload]
+    await session.commit()
+
+
+async def delete_refresh_tokens(*, session: AsyncSession, user_id: uuid.UUID) -> None:
+    """Ends every session of the user, once their password changed. Committed
+    with the change, access tokens already issued last until they expire."""
+    statement = delete(RefreshToken).where(col(RefreshToken.user_id) == user_id)
+    await session.exec(statement)  # type: ignore[call-overload]
+
+
+class CountCache:
+    """Exact listing counts per ``(table, scope)``, reused for ``ttl`` seconds.
+
+    Committed inserts and deletes drop every count of the tables they wrote
+    to, and of the tables referencing them, whose rows may go with them
+    through ``ON DELETE CASCADE``. Each table keeps at most ``maxsize``
+    scopes.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10_000) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._tables: dict[str, OrderedDict[Hashable, tuple[int, float]]] = {}
+
+    def get(self, table: str, scope: Hashable) -> int | None:
+        entries = self._tables.get(table)
+        if entries is None or scope not in entries:
+            return None
+        count, deadline = entries[scope]
+        if deadline <= time.monotonic():
+            del entries[scope]
+            return None
+        return count
+
+    def set(self, table: str, scope: Hashable, count: int) -> None:
+        entries = self._tables.setdefault(table, OrderedDict())
+        entries[scope] = (count, time.monotonic() + self.ttl)
+        entries.move_to_end(scope)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def invalidate(self, table: str) -> None:
+        self._tables.pop(table, None)
+        for referencing in SQLModel.metadata.tables.values():
+            if any(fk.column.table.name == table for fk in referencing.foreign_keys):
+                self._tables.pop(referencing.name, None)
+
+
+count_cache = CountCache(settings.EXACT_COUNT_CACHE_SECONDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session: Session, *_: Any) -> None:
+    # new and deleted still hold the pre-flush state here
+    tables = session.info.setdefault("written_tables", set())
+    for obj in itertools.chain(session.new, session.deleted):
+        tables.add(inspect(obj).mapper.local_table.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_tables(state: ORMExecuteState) -> None:
+    if state.is_insert or state.is_delete:
+        tables = state.session.info.setdefault("written_tables", set())
+        tables.add(state.statement.table.name)  # type: ignore[attr-defined]
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_counts(session: Session) -> None:
+    for table in session.info.pop("written_tables", ()):
+        count_cache.invalidate(table)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_tables(session: Session) -> None:
+    session.info.pop("written_tables", None)
+
+
+class UserCacheChannel:
+    """Spreads user cache invalidations to the other server processes.
+
+    ``publish`` runs while the writing session flushes, inside its
+    transaction; ``listen`` runs for the lifetime of the process and calls
+    ``invalidate`` with a user id, or None to drop everything. This base
+    class keeps invalidations local, the cache TTL then bounds how long
+    other processes may serve a stale user.
+    """
+
+    def publish(self, session: ORMSession, user_id: str | None) -> None:
+        pass
+
+    async def listen(self, invalidate: Callable[[str | None], None]) -> None:
+        pass
+
+
+class PostgresNotifyChannel(UserCacheChannel):
+    """Invalidations over Postgres ``LISTEN``/``NOTIFY``.
+
+    Notifications are delivered on commit only, and the listener drops the
+    whole cache whenever it (re)connects, as it may have missed some.
+    """
+
+    name = "user_cache"
+    max_backoff = 30.0
+
+    def publish(self, session: ORMSession, user_id: str | None) -> None:
+        session.connection().exec_driver_sql(
+            "SELECT pg_notify(%(channel)s, %(payload)s)",
+            {"channel": self.name, "payload": user_id or ""},
+        )
+
+    async def listen(self, invalidate: Callable[[str | None], None]) -> None:
+        dsn = str(settings.SQLALCHEMY_DATABASE_URI).replace("+psycopg", "")
+        delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    dsn, autocommit=True
+                ) as connection:
+                    await connection.execute(f"LISTEN {self.name}")
+                    delay = 1.0
+                    invalidate(None)
+                    async for notify in connection.notifies():
+                        invalidate(notify.payload or None)
+            except Exception:
+                # Whatever went wrong, other workers' invalidations must keep
+                # coming: reconnect, backing off while the database is away
+                logger.exception(
+                    f"User cache listener failed, reconnecting in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+
+class UserCache:
+    """LRU of the authenticated users' public fields, reused for ``ttl`` seconds.
+
+    Committed changes and deletions of users invalidate their entries, in
+    this process and, through ``channel``, in the others. A lookup that
+    started before an invalidation is not stored: ``set`` takes the
+    ``generation`` read before the database was queried.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int = 10_000,
+        channel: UserCacheChannel | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.channel = channel or UserCacheChannel()
+        self.generation = 0
+        self._entries: OrderedDict[str, tuple[UserPublic, float]] = OrderedDict()
+
+    def get(self, user_id: str) -> UserPublic | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def set(self, user: User, generation: int) -> UserPublic:
+        public = UserPublic.model_validate(user)
+        if generation == self.generation:
+            self._entries[str(user.id)] = (public, time.monotonic() + self.ttl)
+            self._entries.move_to_end(str(user.id))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return public
+
+    def invalidate(self, user_id: str | None) -> None:
+        self.generation += 1
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+
+user_cache = UserCache(
+    settings.USER_CACHE_SECONDS,
+    settings.USER_CACHE_SIZE,
+    PostgresNotifyChannel() if settings.USER_CACHE_INVALIDATION == "postgres" else None,
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_users(session: Session, *_: Any) -> None:
+    users = session.info.setdefault("written_users", set())
+    for obj in itertools.chain(session.dirty, session.deleted):
+        if isinstance(obj, User):
+            users.add(str(obj.id))
+            user_cache.channel.publish(session, str(obj.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_users(state: ORMExecuteState) -> None:
+    if (state.is_update or state.is_delete) and state.bind_mapper is inspect(User):
+        state.session.info.setdefault("written_users", set()).add(None)
+        user_cache.channel.publish(state.session, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users(session: Session) -> None:
+    for user_id in session.info.pop("written_users", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_users(session: Session) -> None:
+    session.info.pop("written_users", None)
+
+
+async def estimate_count(
+    *, session: AsyncSession, model: type[SQLModel], filters: Sequence[Any] = ()
+) -> int:
+    """Row count estimated by the planner, without scanning the table."""
+    table = str(model.__tablename__)
+    connection = await session.connection()
+    if not filters:
+        result = await connection.exec_driver_sql(
+            "SELECT reltuples FROM pg_class WHERE oid = %(table)s::regclass",
+            {"table": table},
+        )
+        reltuples = result.scalar_one()
+        # -1 until the table is first vacuumed or analyzed
+        if reltuples >= 0:
+            return int(reltuples)
+    statement = select(model).where(*filters)
+    sql = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+    )
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+    return int(result.scalar_one()[0]["Plan"]["Plan Rows"])
+
+
+async def read_page(
+    *,
+    session: AsyncSession,
+    model: type[ListedModel],
+    filters: Sequence[ColumnElement[bool]] = (),
+    scope: Hashable = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: uuid.UUID | None = None,
+    count: CountMode = "exact",
+) -> tuple[Sequence[ListedModel], int | None]:
+    """
+    Fetch a page of ``model`` ordered by id, plus the number of rows matching
+    ``filters``.
+
+    The page starts after the id ``after`` when given, else at offset
+    ``skip``; up to ``limit + 1`` rows are returned so callers can tell
+    whether another page follows. ``scope`` identifies ``filters`` in
+    ``count_cache``. An exact count missing from the cache is fetched with
+    the page, as a scalar subquery, in the same round trip.
+    """
+    count_statement = select(func.count()).select_from(model).where(*filters)
+    total: int | None = None
+    if count == "exact":
+        total = count_cache.get(str(model.__tablename__), scope)
+    with_count = count == "exact" and total is None
+
+    statement: Any = (
+        select(model, count_statement.scalar_subquery())
+        if with_count
+        else select(model)
+    )
+    statement = statement.where(*filters).order_by(col(model.id)).limit(limit + 1)
+    if after is not None:
+        statement = statement.where(col(model.id) > after)
+    else:
+        statement = statement.offset(skip)
+    result = (await session.exec(statement)).all()
+
+    if not with_count:
+        rows = result
+        if count == "estimated":
+            total = await estimate_count(session=session, model=model, filters=filters)
+        return rows, total
+    rows = [row[0] for row in result]
+    if result:
+        total = result[0][1]
+    else:
+        # Past the last page, no row carries the count
+        total = (await session.exec(count_statement)).one()
+    count_cache.set(str(model.__tablename__), scope, total)
+    return rows, total
+
+
+async def stream_items(
+    *,
+    session: AsyncSession,
+    filters: Sequence[ColumnElement[bool]] = (),
+    batch_size: int = 1000,
+) -> AsyncIterator[Sequence[Row[tuple[uuid.UUID, str, str | None, uuid.UUID]]]]:
+    """
+    Yield the items matching ``filters`` in id order, ``batch_size`` rows at a
+    time, from a server-side cursor. Only the current batch is held in memory
+    however many items match.
+    """
+    statement = (
+        select(Item.id, Item.title, Item.description, Item.owner_id)
+        .where(*filters)
+        .order_by(col(Item.id))
+        .execution_options(yield_per=batch_size)
+    )
+    result = await session.stream(statement)
+    async for rows in result.partitions():
+        yield rows
@@ -0,0 +1,129 @@
+import logging
+import random
+import time
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Engine
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.smtp import smtp_pool
+from app.models import OutboxEmail
+from app.utils import EmailData, send_emails
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def retry_delay(attempts: int) -> timedelta:
+    # Exponential, with jitter so that emails failing together do not all
+    # come back at the same moment
+    seconds = min(
+        settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS,
+        settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1),
+    )
+    return timedelta(seconds=seconds * random.uniform(0.5, 1))
+
+
+def claim(session: Session) -> Sequence[OutboxEmail]:
+    """Lease due emails to this dispatcher.
+
+    SKIP LOCKED lets several dispatchers claim side by side. The lease
+    pushes ``next_attempt_at`` back, the emails of a dispatcher that dies
+    mid batch are picked up again once it runs out.
+    """
+    now = datetime.now(timezone.utc)
+    statement = (
+        select(OutboxEmail)
+        .where(OutboxEmail.status == "pending", col(OutboxEmail.next_attempt_at) <= now)
+        .order_by(col(OutboxEmail.next_attempt_at))
+        .limit(settings.EMAIL_OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    emails = session.exec(statement).all()
+    for email in emails:
+        email.next_attempt_at = now + timedelta(
+            seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS
+        )
+        session.add(email)
+    session.commit()
+    return emails
+
+
+def record(email: OutboxEmail, error: Exception | None) -> None:
+    email.attempts += 1
+    if error is None:
+        email.status = "sent"
+        email.sent_at = datetime.now(timezone.utc)
+        # Not kept around, it can hold a password reset link
+        email.html_content = None
+        return
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = "dead"
+        email.html_content = None
+        logger.error(f"Giving up on email {email.id}: {error}")
+    else:
+        email.next_attempt_at = datetime.now(timezone.utc) + retry_delay(email.attempts)
+        logger.warning(f"Email {email.id} failed, retrying later: {error}")
+
+
+def message(email: OutboxEmail) -> tuple[str, EmailData]:
+    # Only emails done with have their content cleared
+    assert email.html_content is not None
+    return email.email_to, EmailData(email.html_content, email.subject)
+
+
+def dispatch(db_engine: Engine) -> int:
+    """Send one batch of due emails, the number of emails claimed."""
+    with Session(db_engine, expire_on_commit=False) as session:
+        emails = claim(session)
+        errors = send_emails(message(email) for email in emails)
+        for email, error in zip(emails, errors, strict=True):
+            record(email, error)
+            session.add(email)
+        # A crash before this commit sends the batch again once its lease
+        # runs out, delivery is at least once
+        session.commit()
+    return len(emails)
+
+
+def purge(db_engine: Engine) -> int:
+    """Delete the emails sent or given up on past their retention."""
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        hours=settings.EMAIL_OUTBOX_RETENTION_HOURS
+    )
+    with Session(db_engine) as session:
+        result = session.exec(
+            delete(OutboxEmail).where(  # type: ignore[call-overload]
+                col(OutboxEmail.status).in_(("sent", "dead")),
+                col(OutboxEmail.created_at) < cutoff,
+            )
+        )
+        session.commit()
+    return int(result.rowcount)
+
+
+def main() -> None:
+    if not settings.emails_enabled:
+        logger.error("SMTP_HOST and EMAILS_FROM_EMAIL must be set to send emails")
+        raise SystemExit(1)
+    logger.info("Dispatching emails")
+    purged_at = 0.0
+    try:
+        while True:
+            if time.monotonic() - purged_at > PURGE_INTERVAL_SECONDS:
+                logger.info(f"Purged {purge(engine)} emails")
+                purged_at = time.monotonic()
+            if dispatch(engine) < settings.EMAIL_OUTBOX_BATCH_SIZE:
+                time.sleep(settings.EMAIL_OUTBOX_POLL_SECONDS)
+    finally:
+        smtp_pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,29 @@
+import asyncio
 import os
-from fastapi import FastAPI
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
+from app import user_import
 from app.api.main import api_router
+from app.api.read_your_writes import ReadYourWritesMiddleware
+from app.core import hashing, revocation
 from app.core.config import settings
+from app.core.openapi import serve_openapi
+from app.crud import user_cache
+from app.utils import preload_email_templates
 import uvicorn
 
-from .observability import PrometheusMiddleware, metrics, setting_otlp
+from .observability import (
+    PrometheusMiddleware,
+    cleanup_dead_workers,
+    mark_worker_dead,
+    metrics,
+    setting_otlp,
+)
 
 APP_NAME = settings.SERVICE_NAME
 EXPOSE_PORT = settings.METRICS_PORT
@@ -15,12 +32,50 @@ OTLP_GRPC_ENDPOINT = settings.OTLP_ENDPOINT
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        cleanup_dead_workers(settings.PROMETHEUS_MULTIPROC_DIR)
+    listener = asyncio.create_task(user_cache.channel.listen(user_cache.invalidate))
+    await hashing.calibrate()
+    preload_email_templates()
+    # Revoked tokens must not pass before the first snapshot is loaded
+    await revocation.refresh()
+    refresher = asyncio.create_task(revocation.keep_fresh())
+    # Imports run in the workers, one that restarted left its own behind
+    await user_import.fail_orphaned_jobs()
+    yield
+    refresher.cancel()
+    listener.cancel()
+    # Let both unwind, closing their connections, before the worker exits
+    await asyncio.gather(refresher, listener, return_exceptions=True)
+    hashing.shutdown()
+    mark_worker_dead()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+
+@app.exception_handler(hashing.PasswordHashingBusy)
+async def password_hashing_busy_handler(
+    _request: Request, _exc: hashing.PasswordHashingBusy
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password operations in progress, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Setting metrics middleware
 # disable otlp if testing
 if os.environ.get("ENVIRONMENT") != "test":
@@ -39,6 +94,7 @@ if settings.all_cors_origins:
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+serve_openapi(app)
 
 if __name__ == "__main__":
     # update uvicorn access logger format
@@ -46,4 +102,4 @@ if __name__ == "__main__":
     log_config["formatters"]["access"][
         "fmt"
     ] = "%(asctime)s %(levelname)s [%(name)s] [%(filename)s:%(lineno)d] [trace_id=%(otelTraceID)s span_id=%(otelSpanID)s resource.service.name=%(otelServiceName)s] - %(message)s"
-    uvicorn.run(app, host="0.0.0.0", port=EXPOSE_PORT, log_config=log_config)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=EXPOSE_PORT, log_config=log_config)
@@ -1,6 +1,10 @@
 import uuid
+from datetime import datetime
+from typing import Any
 
 from pydantic import EmailStr
+from sqlalchemy import DateTime, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -53,7 +57,10 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None when requested with count=none
+    count: int | None
+    # Pass as ``cursor`` to fetch the next page, None on the last page
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -74,6 +81,10 @@ class ItemUpdate(ItemBase):
 
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    # Serves owner scoped listings in id order and the ON DELETE CASCADE
+    # lookup when a user is deleted
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     title: str = Field(max_length=255)
     owner_id: uuid.UUID = Field(
@@ -90,6 +101,40 @@ class ItemPublic(ItemBase):
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
+    # None when requested with count=none
+    count: int | None
+    # Pass as ``cursor`` to fetch the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# An entry of a bulk request that was not created
+class BulkError(SQLModel):
+    # Position of the entry in the request
+    index: int
+    errors: list[dict[str, Any]]
+
+
+class ItemsCreated(SQLModel):
+    # One per item of the request, in order, None where it was not created
+    ids: list[uuid.UUID | None]
+    count: int
+    errors: list[BulkError]
+
+
+class ItemsFilter(SQLModel):
+    # Set fields must all match, ids unset matches any id
+    ids: list[uuid.UUID] | None = None
+    title: str | None = None
+    # Only superusers reach the items of other users
+    owner_id: uuid.UUID | None = None
+
+
+class ItemsBulkUpdate(SQLModel):
+    filter: ItemsFilter
+    update: ItemUpdate
+
+
+class ItemsAffected(SQLModel):
     count: int
 
 
@@ -102,11 +147,101 @@ class Message(SQLModel):
 class Token(SQLModel):
     access_token: str
     token_type: str = "bearer"
+    # Exchanged at /login/refresh for a new pair, only valid once
+    refresh_token: str | None = None
+
+
+class TokenRefresh(SQLModel):
+    refresh_token: str
+
+
+# JSON Web Key Set of the access token verification keys
+class JWKSet(SQLModel):
+    keys: list[dict[str, Any]]
 
 
 # Contents of JWT token
 class TokenPayload(SQLModel):
     sub: str | None = None
+    jti: uuid.UUID | None = None
+    exp: int | None = None
+
+
+# Access tokens revoked before they expire, purged once they have
+class RevokedToken(SQLModel, table=True):
+    jti: uuid.UUID = Field(primary_key=True)
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True
+    )
+    expires_at: datetime = Field(sa_type=DateTime(timezone=True), index=True)  # type: ignore
+    revoked_at: datetime = Field(sa_type=DateTime(timezone=True), index=True)  # type: ignore
+
+
+# Refresh tokens are stored as their SHA-256 digest. Each refresh replaces a
+# token with the next one of its family, a token presented after it has been
+# used means it leaked and ends the whole family.
+class RefreshToken(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    token_hash: str = Field(max_length=64, unique=True)
+    family_id: uuid.UUID = Field(index=True)
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True
+    )
+    expires_at: datetime = Field(sa_type=DateTime(timezone=True), index=True)  # type: ignore
+    used_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))  # type: ignore
+
+
+# Emails are written here in the transaction of the request that sends them
+# and delivered by app/email_dispatcher.py. "pending" until sent, or "dead"
+# once EMAIL_OUTBOX_MAX_ATTEMPTS deliveries have failed, the content is
+# cleared then.
+class OutboxEmail(SQLModel, table=True):
+    # Serves the dispatcher's poll for due emails, sent ones are left out
+    __table_args__ = (
+        Index(
+            "ix_outboxemail_pending_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    email_to: str = Field(max_length=255)
+    subject: str
+    html_content: str | None
+    status: str = Field(default="pending", max_length=16)
+    attempts: int = 0
+    last_error: str | None = None
+    created_at: datetime = Field(sa_type=DateTime(timezone=True))  # type: ignore
+    next_attempt_at: datetime = Field(sa_type=DateTime(timezone=True))  # type: ignore
+    sent_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))  # type: ignore
+
+
+class UserImportJobBase(SQLModel):
+    # "running", then "done", or "failed" when the job stopped early
+    status: str = Field(default="running", max_length=16)
+    total: int
+    processed: int = 0
+    created: int = 0
+
+
+# Progress of a POST /users/bulk request, the users are created in the
+# background. updated_at moves with each batch, a running job left behind
+# by a worker that went away is told apart by it.
+class UserImportJob(UserImportJobBase, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    errors: list[dict[str, Any]] = Field(default_factory=list, sa_type=JSONB)
+    created_at: datetime = Field(sa_type=DateTime(timezone=True))  # type: ignore
+    updated_at: datetime = Field(sa_type=DateTime(timezone=True))  # type: ignore
+    finished_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))  # type: ignore
+
+
+class UserImportJobPublic(UserImportJobBase):
+    id: uuid.UUID
+    errors: list[BulkError]
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None
 
 
 class NewPassword(SQLModel):
@@ -1,5 +1,8 @@
+import glob
+import os
+import re
 import time
-import random
+from collections import OrderedDict
 from dataclasses import dataclass
 
 from opentelemetry import trace
@@ -9,53 +12,258 @@ from opentelemetry.instrumentation.logging import LoggingInstrumentor
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    values,
+)
 from prometheus_client.openmetrics.exposition import generate_latest
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
 from starlette.requests import Request
 from starlette.responses import Response
-from starlette.routing import Match
-from starlette.types import ASGIApp
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+_LIVE_GAUGE_FILE = re.compile(r"gauge_live\w+?_(\d+)\.db$")
+
+
+def setup_multiprocess(path: str) -> None:
+    """Switch prometheus_client to mmap'd per-process files under ``path``.
+
+    Must run before the first metric is constructed. Every worker writes its
+    own files, so the request path never contends with sibling processes;
+    ``metrics`` merges them at scrape time.
+    """
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    values.ValueClass = values.get_value_class()  # type: ignore[no-untyped-call]
+
+
+def cleanup_dead_workers(path: str) -> None:
+    """Drop live gauge files left behind by workers that are no longer running.
+
+    Counters and histograms of dead workers are kept so totals do not go
+    backwards; the directory itself is wiped before the server starts.
+    """
+    for file in glob.glob(os.path.join(path, "gauge_live*_*.db")):
+        found = _LIVE_GAUGE_FILE.search(os.path.basename(file))
+        if found and not _pid_alive(int(found.group(1))):
+            multiprocess.mark_process_dead(int(found.group(1)), path)  # type: ignore[no-untyped-call]
+
+
+def mark_worker_dead() -> None:
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(  # type: ignore[no-untyped-call]
+            os.getpid(), settings.PROMETHEUS_MULTIPROC_DIR
+        )
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, owned by another user
+        pass
+    return True
+
+
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    setup_multiprocess(settings.PROMETHEUS_MULTIPROC_DIR)
 
 @dataclass
 class MetricsConfig:
     """Configuration class for Prometheus metrics"""
-    app_info: Gauge = Gauge("fastapi_app_info", "FastAPI application information.", ["app_name"])
+    app_info: Gauge = Gauge("fastapi_app_info", "FastAPI application information.", ["app_name"], multiprocess_mode="max")
     requests: Counter = Counter("fastapi_requests_total", "Total count of requests by method and path.", ["method", "path", "app_name"])
     responses: Counter = Counter("fastapi_responses_total", "Total count of responses by method, path and status codes.", ["method", "path", "status_code", "app_name"])
     requests_processing_time: Histogram = Histogram("fastapi_requests_duration_seconds", "Histogram of requests processing time by path (in seconds)", ["method", "path", "app_name"])
+    requests_ttfb: Histogram = Histogram("fastapi_requests_ttfb_seconds", "Histogram of time until the response status line is sent by path (in seconds)", ["method", "path", "app_name"])
     exceptions: Counter = Counter("fastapi_exceptions_total", "Total count of exceptions raised by path and exception type", ["method", "path", "exception_type", "app_name"])
-    requests_in_progress: Gauge = Gauge("fastapi_requests_in_progress", "Gauge of requests by method and path currently being processed", ["method", "path", "app_name"])
+    requests_in_progress: Gauge = Gauge("fastapi_requests_in_progress", "Gauge of requests by method and path currently being processed", ["method", "path", "app_name"], multiprocess_mode="livesum")
+
+@dataclass
+class PoolMetricsConfig:
+    """Prometheus metrics for the SQLAlchemy connection pools, labelled by pool name"""
+    checked_out: Gauge = Gauge("sqlalchemy_pool_checked_out_connections", "Gauge of connections currently checked out of the pool", ["pool"], multiprocess_mode="livesum")
+    overflow: Gauge = Gauge("sqlalchemy_pool_overflow_connections", "Gauge of connections open beyond pool_size", ["pool"], multiprocess_mode="livesum")
+    checkout_wait: Histogram = Histogram("sqlalchemy_pool_checkout_wait_seconds", "Histogram of time spent waiting for a pooled connection (in seconds)", ["pool"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+    checkout_timeouts: Counter = Counter("sqlalchemy_pool_checkout_timeouts_total", "Total count of checkouts that gave up after pool_timeout", ["pool"])
+
+POOL_METRICS = PoolMetricsConfig()
+
+
+@dataclass
+class HashingMetricsConfig:
+    """Prometheus metrics for the password hashing process pool"""
+    queue_depth: Gauge = Gauge("password_hashing_queue_depth", "Gauge of password hashing jobs queued or running", multiprocess_mode="livesum")
+    duration: Histogram = Histogram("password_hashing_duration_seconds", "Histogram of password hashing time by operation, queueing included (in seconds)", ["operation"], buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0))
+    rejected: Counter = Counter("password_hashing_rejected_total", "Total count of password hashing jobs rejected because the queue was full", ["operation"])
+    rounds: Gauge = Gauge("password_hashing_rounds", "Gauge of the bcrypt cost factor new hashes get, as calibrated at startup", multiprocess_mode="max")
+    verify_duration: Histogram = Histogram("password_verify_duration_seconds", "Histogram of bcrypt verification time by cost factor of the stored hash, queueing excluded (in seconds)", ["cost"], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0))
+
+HASHING_METRICS = HashingMetricsConfig()
+
+
+@dataclass
+class RevocationMetricsConfig:
+    """Prometheus metrics for the access token revocation filter"""
+    filter_hits: Counter = Counter("token_revocation_filter_hits_total", "Total count of revocation filter hits checked against the database, by result (revoked or false_positive)", ["result"])
+
+REVOCATION_METRICS = RevocationMetricsConfig()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """``QueuePool`` timing how long each checkout waits for a connection.
+
+    SQLAlchemy has no event that fires before a checkout blocks, so the wait
+    is measured around ``_do_get``. The pool is labelled by its
+    ``logging_name``, which survives ``Pool.recreate``.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        name = self.logging_name or "default"
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_METRICS.checkout_timeouts.labels(name).inc()
+            raise
+        finally:
+            POOL_METRICS.checkout_wait.labels(name).observe(time.perf_counter() - start)
+            POOL_METRICS.overflow.labels(name).set(max(self.overflow(), 0))
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        POOL_METRICS.overflow.labels(self.logging_name or "default").set(max(self.overflow(), 0))
 
-class PrometheusMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: ASGIApp, app_name: str = "backend") -> None:
-        super().__init__(app)
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Track checked-out connections of ``engine`` through pool events.
+
+    Listeners are attached to the pool's dispatcher, which is handed over
+    when the pool is recreated after ``Engine.dispose``.
+    """
+    checked_out = POOL_METRICS.checked_out.labels(engine.pool.logging_name or "default")
+    event.listen(engine.pool, "checkout", lambda *_: checked_out.inc())
+    event.listen(engine.pool, "checkin", lambda *_: checked_out.dec())
+
+
+UNMATCHED_PATH = "<unmatched>"
+
+
+class RouteTemplateCache:
+    """Bounded LRU mapping ``(method, path)`` to the matching route template.
+
+    Resolving a template means asking every route whether it matches, which
+    is linear in the size of the route table. Results are memoised per
+    request line and the least recently used entries are evicted once
+    ``maxsize`` is reached, so probing random URLs cannot grow the cache
+    without limit. Paths no route matches resolve to ``UNMATCHED_PATH``.
+    The cache is cleared whenever the number of routes changes.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._route_count = -1
+
+    def resolve(self, scope: Scope) -> tuple[str, bool]:
+        routes = scope["app"].routes
+        if len(routes) != self._route_count:
+            self._entries.clear()
+            self._route_count = len(routes)
+
+        key = (scope["method"], scope["path"])
+        template = self._entries.get(key)
+        if template is not None:
+            self._entries.move_to_end(key)
+        else:
+            template = self._match(routes, scope)
+            self._entries[key] = template
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return template, template != UNMATCHED_PATH
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _match(routes: list[BaseRoute], scope: Scope) -> str:
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", UNMATCHED_PATH)
+        return UNMATCHED_PATH
+
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware recording Prometheus metrics for every HTTP request.
+
+    The response is never buffered: the status code is read from the
+    ``http.response.start`` message on its way out, which also marks the
+    time-to-first-byte. Total duration is taken once the app has sent the
+    last body chunk, so streaming responses are measured end to end.
+    """
+
+    # Minimum spacing between two exemplars on the same series. Exemplars are
+    # sampled on the monotonic clock instead of delaying the request, so two
+    # exemplars of one series never share a timestamp.
+    exemplar_interval: float = 0.01
+
+    def __init__(self, app: ASGIApp, app_name: str = "backend", route_cache_size: int = 1024) -> None:
+        self.app = app
         self.app_name = app_name
         self.metrics = MetricsConfig()
+        self.route_cache = RouteTemplateCache(maxsize=route_cache_size)
+        self._last_exemplar: dict[tuple[str, str], float] = {}
         self.metrics.app_info.labels(app_name=self.app_name).inc()
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        method = request.method
-        path, _ = self._get_path(request)  # Track metrics for all paths
-        
-        return await self._handle_request(method, path, request, call_next)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path, _ = self._get_path(scope)  # Track metrics for all paths
 
-    async def _handle_request(self, method: str, path: str, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        await self._handle_request(method, path, scope, receive, send)
+
+    async def _handle_request(self, method: str, path: str, scope: Scope, receive: Receive, send: Send) -> None:
         self._update_request_metrics(method, path)
         before_time = time.perf_counter()
         status_code = 500  # Default status for unhandled exceptions
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_started
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_started = True
+                self._record_time_to_first_byte(method, path, before_time)
+            await send(message)
 
         try:
-            response = await call_next(request)
-            status_code = response.status_code
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             self._handle_exception(method, path, e)
-            if hasattr(e, "status_code"):  # Use exception status code if available
+            if not response_started and hasattr(e, "status_code"):  # Use exception status code if available
                 status_code = e.status_code
             raise
         else:
             self._record_request_duration(method, path, before_time)
-            return response
         finally:
             self._update_response_metrics(method, path, status_code)
 
@@ -73,15 +281,29 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
         ).inc()
 
     def _record_request_duration(self, method: str, path: str, start_time: float) -> None:
-        duration = time.perf_counter() - start_time
-        trace_id = trace.format_trace_id(trace.get_current_span().get_span_context().trace_id)
-        # Add small random delay to prevent timestamp collisions
-        time.sleep(random.uniform(0.001, 0.010))  # 1-10ms jitter
+        now = time.perf_counter()
         self.metrics.requests_processing_time.labels(
             method=method,
             path=path,
             app_name=self.app_name
-        ).observe(duration, exemplar={'TraceID': trace_id})
+        ).observe(now - start_time, exemplar=self._sample_exemplar(method, path, now))
+
+    def _sample_exemplar(self, method: str, path: str, now: float) -> dict[str, str] | None:
+        span_context = trace.get_current_span().get_span_context()
+        if not span_context.is_valid:
+            return None
+        key = (method, path)
+        if now - self._last_exemplar.get(key, float("-inf")) < self.exemplar_interval:
+            return None
+        self._last_exemplar[key] = now
+        return {"TraceID": trace.format_trace_id(span_context.trace_id)}
+
+    def _record_time_to_first_byte(self, method: str, path: str, start_time: float) -> None:
+        self.metrics.requests_ttfb.labels(
+            method=method,
+            path=path,
+            app_name=self.app_name
+        ).observe(time.perf_counter() - start_time)
 
     def _update_response_metrics(self, method: str, path: str, status_code: int) -> None:
         self.metrics.responses.labels(
@@ -96,23 +318,23 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
             app_name=self.app_name
         ).dec()
 
-    @staticmethod
-    def _get_path(request: Request) -> tuple[str, bool]:
-        for route in request.app.routes:
-            match, _ = route.matches(request.scope)
-            if match == Match.FULL:
-                return route.path, True
-        return request.url.path, False
+    def _get_path(self, scope: Scope) -> tuple[str, bool]:
+        return self.route_cache.resolve(scope)
 
 def metrics(request: Request) -> Response:
+    registry = REGISTRY
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        # Aggregate the files of every worker instead of this process only
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(  # type: ignore[no-untyped-call]
+            registry, path=settings.PROMETHEUS_MULTIPROC_DIR
+        )
     return Response(
-        generate_latest(REGISTRY),
+        generate_latest(registry),
         headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
     )
 
 def setting_otlp(app: ASGIApp, app_name: str, endpoint: str, log_correlation: bool = True) -> None:
-    from app.core.config import settings
-
     if not settings.ENABLE_TRACING:
         trace.set_tracer_provider(None)
         return
@@ -1,10 +1,48 @@
+import asyncio
+import csv
+import io
+import json
+import os
 import uuid
+from collections.abc import Generator, MutableMapping
+from datetime import timedelta
+from typing import Any
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app import crud
+from app.core import security
 from app.core.config import settings
+from app.core.db import replica_router
+from app.crud import MAX_PAGE_SIZE, count_cache
+from app.main import app
+from app.observability import InstrumentedAsyncAdaptedQueuePool
 from app.tests.utils.item import create_random_item
+from app.tests.utils.user import create_random_user
+
+
+@pytest.fixture
+def replica_checkouts(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> Generator[list[object]]:
+    # The test database doubles as a replica, reached through its own engine
+    replica = create_async_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_logging_name="replica-test",
+    )
+    checkouts: list[object] = []
+    event.listen(replica.sync_engine.pool, "checkout", lambda *a: checkouts.append(a))
+    monkeypatch.setattr(replica_router, "replicas", [replica])
+    # Forget the writes of earlier tests, their cookie is in the client
+    client.cookies.clear()
+    yield checkouts
+    replica.sync_engine.dispose(close=False)
 
 
 def test_create_item(
@@ -24,10 +62,10 @@ def test_create_item(
     assert "owner_id" in content
 
 
-def test_read_item(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_read_item(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
-    item = create_random_item(db)
+    item = await create_random_item(async_db)
     response = client.get(
         f"{settings.API_V1_STR}/items/{item.id}",
         headers=superuser_token_headers,
@@ -52,10 +90,12 @@ def test_read_item_not_found(
     assert content["detail"] == "Item not found"
 
 
-def test_read_item_not_enough_permissions(
-    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+async def test_read_item_not_enough_permissions(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    async_db: AsyncSession,
 ) -> None:
-    item = create_random_item(db)
+    item = await create_random_item(async_db)
     response = client.get(
         f"{settings.API_V1_STR}/items/{item.id}",
         headers=normal_user_token_headers,
@@ -65,11 +105,11 @@ def test_read_item_not_enough_permissions(
     assert content["detail"] == "Not enough permissions"
 
 
-def test_read_items(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_read_items(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
-    create_random_item(db)
-    create_random_item(db)
+    await create_random_item(async_db)
+    await create_random_item(async_db)
     response = client.get(
         f"{settings.API_V1_STR}/items/",
         headers=superuser_token_headers,
@@ -79,10 +119,260 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
-def test_update_item(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_read_items_with_cursor(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    for i in range(5):
+        client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            json={"title": f"Page item {i}"},
+        )
+    offset_page = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"limit": 1000},
+    ).json()
+
+    seen: list[str] = []
+    params: dict[str, str | int] = {"limit": 2}
+    while True:
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            params=params,
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert page["count"] == offset_page["count"]
+        seen += [item["id"] for item in page["data"]]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert seen == [item["id"] for item in offset_page["data"]]
+    assert len(seen) == offset_page["count"] >= 5
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"cursor": "AAAA"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": -1}, {"skip": -1}])
+def test_read_items_page_out_of_bounds(
+    client: TestClient, superuser_token_headers: dict[str, str], params: dict[str, int]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=superuser_token_headers, params=params
+    )
+    assert response.status_code == 422
+
+
+def test_read_items_limit_capped(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    response = client.get(
+        url, headers=superuser_token_headers, params={"limit": MAX_PAGE_SIZE}
+    )
+    assert response.status_code == 200
+    response = client.get(
+        url, headers=superuser_token_headers, params={"limit": MAX_PAGE_SIZE + 1}
+    )
+    assert response.status_code == 422
+
+
+def test_read_items_count_modes(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        json={"title": "Counted"},
+    )
+    pages = {
+        mode: client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            params={"count": mode},
+        ).json()
+        for mode in ("exact", "estimated", "none")
+    }
+    assert pages["exact"]["count"] == len(pages["exact"]["data"])
+    assert pages["estimated"]["count"] >= 0
+    assert pages["none"]["count"] is None
+    assert pages["none"]["data"] == pages["exact"]["data"]
+
+
+def test_read_items_count_invalidated_by_create(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    before = client.get(url, headers=normal_user_token_headers).json()["count"]
+    client.post(url, headers=normal_user_token_headers, json={"title": "Fresh"})
+    after = client.get(url, headers=normal_user_token_headers).json()["count"]
+    assert after == before + 1
+
+
+async def test_read_items_from_replica(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    async_db: AsyncSession,
+    replica_checkouts: list[object],
+) -> None:
+    item = await create_random_item(async_db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{item.id}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert len(replica_checkouts) == 1
+
+
+async def test_current_user_cached_from_primary(
+    client: TestClient,
+    async_db: AsyncSession,
+    replica_checkouts: list[object],
+) -> None:
+    user = await create_random_user(async_db)
+    token = security.create_access_token(user.id, timedelta(minutes=5))
+    replica_statements: list[str] = []
+    event.listen(
+        replica_router.replicas[0].sync_engine,
+        "before_cursor_execute",
+        lambda _conn, _cursor, statement, *_: replica_statements.append(statement),
+    )
+    crud.user_cache.invalidate(str(user.id))
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == 200
+    # The items come from the replica, the user filling the cache does not
+    assert replica_checkouts
+    assert not [s for s in replica_statements if 'FROM "user"' in s]
+    assert crud.user_cache.get(str(user.id)) is not None
+
+
+def test_read_your_writes_after_create(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    replica_checkouts: list[object],
+) -> None:
+    data = {"title": "Sticky", "description": "Read from the primary"}
+    response = client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    created = response.json()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{created['id']}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 200
+    assert replica_checkouts == []
+
+    # The window lives in the client's cookie, not in this worker
+    client.cookies.clear()
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{created['id']}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 200
+    assert len(replica_checkouts) == 1
+
+
+def test_create_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
-    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/"
+    before = client.get(url, headers=normal_user_token_headers).json()["count"]
+    items = [{"title": "First"}, {"title": ""}, {"title": "Third", "description": "3"}]
+
+    response = client.post(f"{url}bulk", headers=normal_user_token_headers, json=items)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 2
+    assert [error["index"] for error in content["errors"]] == [1]
+    assert content["errors"][0]["errors"][0]["loc"] == ["title"]
+    first, missing, third = content["ids"]
+    assert missing is None
+
+    response = client.get(f"{url}{third}", headers=normal_user_token_headers)
+    assert response.json()["title"] == "Third"
+    assert response.json()["description"] == "3"
+    after = client.get(url, headers=normal_user_token_headers).json()["count"]
+    assert after == before + 2
+
+
+def test_create_items_bulk_ndjson_in_chunks(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "ITEMS_BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "ITEMS_BULK_COPY_MIN_ROWS", 2)
+    lines = [
+        b'{"title": "copied"}',
+        b'{"title": "copied"}',
+        b"not json",
+        b"",
+        b'{"title": "rolled back"}',
+        # Postgres refuses NUL in text, failing this chunk only
+        b'{"title": "\\u0000"}',
+        b'{"title": "inserted"}',
+    ]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers={**normal_user_token_headers, "Content-Type": "application/x-ndjson"},
+        content=b"\n".join(lines),
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 3
+    assert [error["index"] for error in content["errors"]] == [2, 3, 4]
+    assert content["errors"][0]["errors"][0]["type"] == "json_invalid"
+    assert content["errors"][1]["errors"][0]["type"] == "insert_failed"
+    created = [id for id in content["ids"] if id is not None]
+    titles = [
+        client.get(
+            f"{settings.API_V1_STR}/items/{id}", headers=normal_user_token_headers
+        ).json()["title"]
+        for id in created
+    ]
+    assert titles == ["copied", "copied", "inserted"]
+
+
+def test_create_items_bulk_invalid_body(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/bulk"
+    response = client.post(url, headers=normal_user_token_headers, content=b"[")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid JSON body"}
+    response = client.post(url, headers=normal_user_token_headers, json={"title": "x"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Expected a JSON array of items"}
+
+
+async def test_update_item(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
+) -> None:
+    item = await create_random_item(async_db)
     data = {"title": "Updated title", "description": "Updated description"}
     response = client.put(
         f"{settings.API_V1_STR}/items/{item.id}",
@@ -111,10 +401,12 @@ def test_update_item_not_found(
     assert content["detail"] == "Item not found"
 
 
-def test_update_item_not_enough_permissions(
-    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+async def test_update_item_not_enough_permissions(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    async_db: AsyncSession,
 ) -> None:
-    item = create_random_item(db)
+    item = await create_random_item(async_db)
     data = {"title": "Updated title", "description": "Updated description"}
     response = client.put(
         f"{settings.API_V1_STR}/items/{item.id}",
@@ -126,10 +418,10 @@ def test_update_item_not_enough_permissions(
     assert content["detail"] == "Not enough permissions"
 
 
-def test_delete_item(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_delete_item(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
-    item = create_random_item(db)
+    item = await create_random_item(async_db)
     response = client.delete(
         f"{settings.API_V1_STR}/items/{item.id}",
         headers=superuser_token_headers,
@@ -151,10 +443,12 @@ def test_delete_item_not_found(
     assert content["detail"] == "Item not found"
 
 
-def test_delete_item_not_enough_permissions(
-    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+async def test_delete_item_not_enough_permissions(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    async_db: AsyncSession,
 ) -> None:
-    item = create_random_item(db)
+    item = await create_random_item(async_db)
     response = client.delete(
         f"{settings.API_V1_STR}/items/{item.id}",
         headers=normal_user_token_headers,
@@ -162,3 +456,197 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+async def test_update_items_bulk(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    async_db: AsyncSession,
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    ids = client.post(
+        f"{url}bulk",
+        headers=normal_user_token_headers,
+        json=[{"title": "Bulk"}, {"title": "Bulk"}, {"title": "Other"}],
+    ).json()["ids"]
+    foreign = await create_random_item(async_db)
+
+    response = client.patch(
+        f"{url}bulk",
+        headers=normal_user_token_headers,
+        json={
+            "filter": {"ids": [ids[0], ids[2], str(foreign.id)]},
+            "update": {"description": "Patched"},
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2}
+    descriptions = [
+        client.get(f"{url}{id}", headers=normal_user_token_headers).json()[
+            "description"
+        ]
+        for id in ids
+    ]
+    assert descriptions == ["Patched", None, "Patched"]
+    await async_db.refresh(foreign)
+    assert foreign.description != "Patched"
+
+    response = client.patch(
+        f"{url}bulk",
+        headers=normal_user_token_headers,
+        json={"filter": {"ids": ids, "title": "Bulk"}, "update": {"title": "Renamed"}},
+    )
+    assert response.json() == {"count": 2}
+
+
+async def test_delete_items_bulk(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    superuser_token_headers: dict[str, str],
+    async_db: AsyncSession,
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    ids = client.post(
+        f"{url}bulk",
+        headers=normal_user_token_headers,
+        json=[{"title": "Doomed"}, {"title": "Doomed"}, {"title": "Kept"}],
+    ).json()["ids"]
+    foreign = await create_random_item(async_db)
+    before = client.get(url, headers=normal_user_token_headers).json()["count"]
+
+    response = client.request(
+        "DELETE",
+        f"{url}bulk",
+        headers=normal_user_token_headers,
+        json={"ids": [*ids[:2], str(foreign.id)]},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2}
+    after = client.get(url, headers=normal_user_token_headers).json()["count"]
+    assert after == before - 2
+    response = client.get(f"{url}{ids[2]}", headers=normal_user_token_headers)
+    assert response.status_code == 200
+
+    # Superusers reach every owner, owner_id narrows it down
+    response = client.request(
+        "DELETE",
+        f"{url}bulk",
+        headers=superuser_token_headers,
+        json={"owner_id": str(foreign.owner_id)},
+    )
+    assert response.json() == {"count": 1}
+
+
+def test_bulk_changes_need_a_selection(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/bulk"
+    response = client.request("DELETE", url, headers=normal_user_token_headers, json={})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Select items by ids or a filter"}
+    response = client.patch(
+        url,
+        headers=normal_user_token_headers,
+        json={"filter": {"ids": []}, "update": {}},
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "No fields to update"}
+
+
+async def test_export_items(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
+) -> None:
+    item = await create_random_item(async_db)
+    owner_headers = {
+        "Authorization": "Bearer "
+        + security.create_access_token(item.owner_id, timedelta(minutes=5))
+    }
+    url = f"{settings.API_V1_STR}/items/export"
+
+    r = client.get(url, headers=owner_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in r.text.splitlines()] == [
+        {
+            "id": str(item.id),
+            "title": item.title,
+            "description": item.description,
+            "owner_id": str(item.owner_id),
+        }
+    ]
+
+    r = client.get(url, headers=owner_headers, params={"format": "csv"})
+    assert r.headers["content-type"] == "text/csv; charset=utf-8"
+    assert list(csv.reader(io.StringIO(r.text))) == [
+        ["id", "title", "description", "owner_id"],
+        [str(item.id), item.title, item.description, str(item.owner_id)],
+    ]
+
+    r = client.get(url, headers=superuser_token_headers)
+    exported = {json.loads(line)["id"] for line in r.text.splitlines()}
+    assert str(item.id) in exported and len(exported) > 1
+
+
+def _rss() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+async def test_export_million_items_in_flat_memory(
+    db: Session, async_db: AsyncSession
+) -> None:
+    user = await create_random_user(async_db)
+    db.connection().execute(
+        text(
+            "INSERT INTO item (id, title, description, owner_id) "
+            "SELECT gen_random_uuid(), 'item ' || i, NULL, :owner_id "
+            "FROM generate_series(1, 1000000) AS i"
+        ),
+        {"owner_id": user.id},
+    )
+    db.commit()
+    token = security.create_access_token(user.id, timedelta(minutes=5))
+
+    # Driven over ASGI directly, the test client would buffer the whole body
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+        "root_path": "",
+        "path": f"{settings.API_V1_STR}/items/export",
+        "raw_path": f"{settings.API_V1_STR}/items/export".encode(),
+        "query_string": b"format=csv",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    }
+    lines, baseline, peak = 0, _rss(), 0
+
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive() -> dict[str, Any]:
+        if requests:
+            return requests.pop()
+        # The client stays connected until the response ends
+        await asyncio.Event().wait()
+        raise AssertionError
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        nonlocal lines, peak
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200
+        elif message["type"] == "http.response.body":
+            lines += message.get("body", b"").count(b"\n")
+            peak = max(peak, _rss())
+
+    try:
+        await app(scope, receive, send)
+        assert lines == 1_000_000 + 1
+        assert peak - baseline < 64 * 1024 * 1024
+    finally:
+        db.connection().execute(
+            text("DELETE FROM item WHERE owner_id = :owner_id"), {"owner_id": user.id}
+        )
+        db.commit()
+        count_cache.invalidate("item")
@@ -1,11 +1,21 @@
+import uuid
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app import crud
+from app.core import revocation, security
 from app.core.config import settings
+from app.core.revocation import BloomFilter
 from app.core.security import verify_password
-from app.models import User
+from app.models import OutboxEmail, User, UserCreate
+from app.tests.utils.user import create_random_user, user_authentication_headers
+from app.tests.utils.utils import random_email, random_lower_string
 from app.utils import generate_password_reset_token
 
 
@@ -21,6 +31,54 @@ def test_get_access_token(client: TestClient) -> None:
     assert tokens["access_token"]
 
 
+def test_refresh_access_token(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    tokens = client.post(
+        f"{settings.API_V1_STR}/login/access-token", data=login_data
+    ).json()
+    with patch("app.crud.verify_and_update_async") as verify:
+        r = client.post(
+            f"{settings.API_V1_STR}/login/refresh",
+            json={"refresh_token": tokens["refresh_token"]},
+        )
+    assert r.status_code == 200
+    verify.assert_not_called()
+    refreshed = r.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {refreshed['access_token']}"}
+    r = client.post(f"{settings.API_V1_STR}/login/test-token", headers=headers)
+    assert r.json()["email"] == settings.FIRST_SUPERUSER
+
+
+def test_refresh_token_reuse_ends_family(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    first = client.post(
+        f"{settings.API_V1_STR}/login/access-token", data=login_data
+    ).json()["refresh_token"]
+    url = f"{settings.API_V1_STR}/login/refresh"
+    second = client.post(url, json={"refresh_token": first}).json()["refresh_token"]
+
+    # The first token was stolen and is replayed: nobody may refresh any more
+    r = client.post(url, json={"refresh_token": first})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid refresh token"
+    r = client.post(url, json={"refresh_token": second})
+    assert r.status_code == 400
+
+
+def test_refresh_token_unknown(client: TestClient) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh", json={"refresh_token": "unknown"}
+    )
+    assert r.status_code == 400
+
+
 def test_get_access_token_incorrect_password(client: TestClient) -> None:
     login_data = {
         "username": settings.FIRST_SUPERUSER,
@@ -30,6 +88,17 @@ def test_get_access_token_incorrect_password(client: TestClient) -> None:
     assert r.status_code == 400
 
 
+def test_get_access_token_hashing_queue_full(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    with patch.object(settings, "PASSWORD_HASH_MAX_PENDING", 0):
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
 def test_use_access_token(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -42,6 +111,85 @@ def test_use_access_token(
     assert "email" in result
 
 
+async def test_logout_revokes_only_that_token(
+    client: TestClient, async_db: AsyncSession
+) -> None:
+    email, password = random_email(), random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    await crud.create_user(session=async_db, user_create=user_in)
+    headers, other_headers = (
+        user_authentication_headers(client=client, email=email, password=password)
+        for _ in range(2)
+    )
+
+    refresh_token = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    ).json()["refresh_token"]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/logout",
+        headers=headers,
+        json={"refresh_token": refresh_token},
+    )
+    assert r.status_code == 200
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh", json={"refresh_token": refresh_token}
+    )
+    assert r.status_code == 400
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 403
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=other_headers)
+    assert r.status_code == 200
+
+
+async def test_revocation_from_another_worker(
+    client: TestClient, async_db: AsyncSession
+) -> None:
+    user = await create_random_user(async_db)
+    token = security.create_access_token(user.id, timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=headers).is_success
+
+    claims = security.decode_access_token(token)
+    await crud.revoke_token(
+        session=async_db,
+        jti=uuid.UUID(claims["jti"]),
+        user_id=user.id,
+        expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc),
+    )
+    # Not in this worker's filter until the next refresh
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=headers).is_success
+    await revocation.refresh()
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 403
+
+
+def test_revocation_filter_false_positive(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # A filter with every bit set reports every token as possibly revoked
+    saturated = BloomFilter(capacity=1, error_rate=0.5)
+    saturated.bits[:] = b"\xff" * len(saturated.bits)
+    monkeypatch.setattr(revocation.revocation_filter, "bloom", saturated)
+    name, labels = "token_revocation_filter_hits_total", {"result": "false_positive"}
+    before = REGISTRY.get_sample_value(name, labels) or 0.0
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert r.status_code == 200
+    assert REGISTRY.get_sample_value(name, labels) == before + 1
+
+
+def test_read_jwks(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/.well-known/jwks.json")
+    assert r.status_code == 200
+    # Tokens are signed with SECRET_KEY, there is no public key to publish
+    assert r.json() == {"keys": []}
+    assert r.headers["Cache-Control"] == "public, max-age=300"
+
+
 def test_recovery_password(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
@@ -69,6 +217,22 @@ def test_recovery_password_user_not_exits(
     assert r.status_code == 404
 
 
+def test_recovery_password_without_emails(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    email = settings.EMAIL_TEST_USER
+    queued = select(OutboxEmail).where(OutboxEmail.email_to == email)
+    before = len(db.exec(queued).all())
+    with patch("app.core.config.settings.SMTP_HOST", None):
+        r = client.post(
+            f"{settings.API_V1_STR}/password-recovery/{email}",
+            headers=normal_user_token_headers,
+        )
+    assert r.status_code == 503
+    db.expire_all()
+    assert len(db.exec(queued).all()) == before
+
+
 def test_reset_password(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -88,6 +252,32 @@ def test_reset_password(
     assert verify_password(data["new_password"], user.hashed_password)
 
 
+async def test_reset_password_ends_refresh_tokens(
+    client: TestClient, async_db: AsyncSession
+) -> None:
+    password = random_lower_string()
+    user = await crud.create_user(
+        session=async_db,
+        user_create=UserCreate(email=random_email(), password=password),
+    )
+    login_data = {"username": user.email, "password": password}
+    refresh_token = client.post(
+        f"{settings.API_V1_STR}/login/access-token", data=login_data
+    ).json()["refresh_token"]
+
+    token = generate_password_reset_token(email=user.email)
+    r = client.post(
+        f"{settings.API_V1_STR}/reset-password/",
+        json={"new_password": random_lower_string(), "token": token},
+    )
+    assert r.status_code == 200
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh", json={"refresh_token": refresh_token}
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid refresh token"
+
+
 def test_reset_password_invalid_token(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
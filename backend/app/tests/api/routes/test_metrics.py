@@ -1,34 +1,40 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
 from fastapi.testclient import TestClient
 import pytest
 from app.main import app, APP_NAME
 from fastapi import Request, Response
-from app.observability import PrometheusMiddleware
+from app.observability import UNMATCHED_PATH, PrometheusMiddleware, RouteTemplateCache
+from opentelemetry import trace
+from starlette.types import Message, Scope
 
 # Add test endpoints for error simulation
 @app.get("/trigger-500", tags=["test-endpoints"])
-async def trigger_500():
+async def trigger_500() -> None:
     from fastapi import HTTPException
     raise HTTPException(status_code=500, detail="Internal server error simulation")
 
 @app.get("/trigger-403", tags=["test-endpoints"])
-async def trigger_403():
+async def trigger_403() -> Response:
     return Response(status_code=403)
 
 client = TestClient(app)
 
-def test_metrics_endpoint():
+def test_metrics_endpoint() -> None:
     """Test if metrics endpoint returns 200 and correct content type"""
     response = client.get("/metrics")
     assert response.status_code == 200
     assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
 
-def test_app_info_metric():
+def test_app_info_metric() -> None:
     """Test if app_info metric is present"""
     response = client.get("/metrics")
     assert f'fastapi_app_info{{app_name="{APP_NAME}"}}' in response.text
 
 @pytest.mark.asyncio
-async def test_request_counter():
+async def test_request_counter() -> None:
     """Test if requests are counted correctly"""
     # Make a request to trigger the counter
     response = client.get("/api/v1/docs")
@@ -41,7 +47,7 @@ async def test_request_counter():
     assert 'method="GET"' in metrics_response.text
 
 @pytest.mark.asyncio
-async def test_request_in_progress():
+async def test_request_in_progress() -> None:
     """Test if requests in progress are tracked correctly"""
     # Make a request to check in-progress metrics
     response = client.get("/api/v1/docs")
@@ -53,7 +59,7 @@ async def test_request_in_progress():
     assert 'fastapi_requests_in_progress{' in metrics_response.text
 
 @pytest.mark.asyncio
-async def test_request_processing_time():
+async def test_request_processing_time() -> None:
     """Test if request processing time is being measured"""
     # Make a request to measure processing time
     response = client.get("/api/v1/docs")
@@ -65,7 +71,7 @@ async def test_request_processing_time():
     assert 'fastapi_requests_duration_seconds_bucket{' in metrics_response.text
 
 @pytest.mark.asyncio
-async def test_response_status_counter():
+async def test_response_status_counter() -> None:
     """Test if response status codes are counted correctly"""
     # Make a request
     response = client.get("/api/v1/docs")
@@ -78,7 +84,7 @@ async def test_response_status_counter():
     assert f'status_code="{response.status_code}"' in metrics_response.text
 
 @pytest.mark.asyncio
-async def test_exception_counter():
+async def test_exception_counter() -> None:
     """Test if exceptions are counted correctly"""
     # Make a request to a non-existent endpoint to trigger 404
     response = client.get("/non-existent-path")
@@ -91,7 +97,7 @@ async def test_exception_counter():
     assert 'status_code="404"' in metrics_response.text
 
 @ pytest.mark.asyncio
-async def test_exception_counter_500():
+async def test_exception_counter_500() -> None:
     """Test if 500 exceptions are counted correctly"""
     # Trigger a 500 error using a dedicated endpoint
     response = client.get("/trigger-500")
@@ -105,7 +111,7 @@ async def test_exception_counter_500():
 
 
 @ pytest.mark.asyncio
-async def test_exception_counter_403():
+async def test_exception_counter_403() -> None:
     """Test if 403 exceptions are counted correctly"""
     # Trigger a 403 error using a dedicated endpoint
     response = client.get("/trigger-403")
@@ -117,7 +123,7 @@ async def test_exception_counter_403():
     assert 'fastapi_responses_total{' in metrics_response.text
     assert 'status_code="403"' in metrics_response.text
 
-def test_prometheus_middleware_path_matching():
+def test_prometheus_middleware_path_matching() -> None:
     """Test the path matching functionality of PrometheusMiddleware"""
     middleware = PrometheusMiddleware(app)
     client = TestClient(app)
@@ -129,3 +135,268 @@ def test_prometheus_middleware_path_matching():
     # Test with non-existent endpoint
     response = client.get("/non-existent")
     assert response.status_code == 404
+
+
+def test_time_to_first_byte_metric() -> None:
+    """Test if time-to-first-byte is measured separately from total duration"""
+    client.get("/api/v1/utils/health-check/")
+
+    metrics_response = client.get("/metrics")
+
+    assert 'fastapi_requests_ttfb_seconds_bucket{' in metrics_response.text
+    assert 'path="/api/v1/utils/health-check/"' in metrics_response.text
+
+
+def test_prometheus_middleware_streaming_response() -> None:
+    """Test that streamed bodies pass through the middleware unbuffered"""
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    streaming_app = FastAPI()
+    streaming_app.add_middleware(PrometheusMiddleware, app_name="streaming-test")
+
+    @streaming_app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def chunks() -> AsyncIterator[str]:
+            for i in range(3):
+                yield f"chunk-{i}\n"
+
+        return StreamingResponse(chunks(), status_code=206, media_type="text/plain")
+
+    with TestClient(streaming_app) as streaming_client:
+        response = streaming_client.get("/stream")
+    assert response.status_code == 206
+    assert response.text == "chunk-0\nchunk-1\nchunk-2\n"
+
+    metrics_response = client.get("/metrics")
+    assert (
+        'fastapi_responses_total{app_name="streaming-test",method="GET",path="/stream",status_code="206"} 1.0'
+        in metrics_response.text
+    )
+
+
+async def test_prometheus_middleware_does_not_block_event_loop(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that recording metrics never sleeps on the event loop thread"""
+    import asyncio
+    import time
+    from unittest.mock import AsyncMock, Mock
+
+    from fastapi import FastAPI
+
+    # Recorded rather than raising, an error inside the middleware could be
+    # swallowed on its way to the response
+    sleep, async_sleep = Mock(), AsyncMock()
+    monkeypatch.setattr(time, "sleep", sleep)
+    monkeypatch.setattr(asyncio, "sleep", async_sleep)
+
+    blocking_app = FastAPI()
+    blocking_app.add_middleware(PrometheusMiddleware, app_name="blocking-test")
+
+    @blocking_app.get("/ping")
+    async def ping() -> bool:
+        return True
+
+    scope: Scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    statuses = []
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    for path in ("/ping", "/ping", "/missing"):
+        await blocking_app({**scope, "path": path}, receive, send)
+
+    assert statuses == [200, 200, 404]
+    sleep.assert_not_called()
+    async_sleep.assert_not_called()
+
+
+def test_prometheus_middleware_exemplar_sampling() -> None:
+    """Test that exemplars are rate limited per series on the monotonic clock"""
+    from unittest.mock import patch
+
+    middleware = PrometheusMiddleware(app, app_name="exemplar-test")
+    span_context = trace.SpanContext(
+        trace_id=0x1234, span_id=0x5678, is_remote=False
+    )
+    span = trace.NonRecordingSpan(span_context)
+
+    with patch.object(trace, "get_current_span", return_value=span):
+        first = middleware._sample_exemplar("GET", "/items", 100.0)
+        too_soon = middleware._sample_exemplar("GET", "/items", 100.001)
+        other_series = middleware._sample_exemplar("GET", "/users", 100.001)
+        later = middleware._sample_exemplar("GET", "/items", 100.02)
+
+    assert first == {"TraceID": trace.format_trace_id(0x1234)}
+    assert too_soon is None
+    assert other_series == first
+    assert later == first
+    assert middleware._sample_exemplar("GET", "/items", 200.0) is None  # no span
+
+
+def test_unmatched_paths_share_one_label() -> None:
+    """Test that unknown URLs collapse into a single path label"""
+    client.get("/probe/a1b2c3")
+    client.get("/probe/d4e5f6")
+
+    metrics_response = client.get("/metrics")
+
+    assert 'path="<unmatched>"' in metrics_response.text
+    assert "/probe/" not in metrics_response.text
+
+
+def test_route_template_cache_is_bounded() -> None:
+    """Test that the route resolution cache evicts least recently used paths"""
+    cache = RouteTemplateCache(maxsize=2)
+    scope = {"type": "http", "app": app, "method": "GET"}
+
+    for path in ("/a", "/b", "/metrics", "/c"):
+        cache.resolve({**scope, "path": path})
+
+    assert len(cache) == 2
+    assert cache.resolve({**scope, "path": "/metrics"}) == ("/metrics", True)
+    assert cache.resolve({**scope, "path": "/c"}) == (UNMATCHED_PATH, False)
+
+
+def test_route_template_cache_skips_route_scan_on_hit() -> None:
+    """Test that a cached path does not walk the route table again"""
+    from unittest.mock import patch
+
+    cache = RouteTemplateCache()
+    scope = {"type": "http", "app": app, "method": "GET", "path": "/metrics"}
+    assert cache.resolve(scope) == ("/metrics", True)
+
+    with patch.object(RouteTemplateCache, "_match") as match:
+        assert cache.resolve(scope) == ("/metrics", True)
+    match.assert_not_called()
+
+
+def test_metrics_endpoint_aggregates_workers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that /metrics merges the metric files of every worker process"""
+    from prometheus_client import Counter, Gauge, values
+
+    from app.core.config import settings
+
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    for pid, amount in ((101, 1), (102, 2)):
+        monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda pid=pid: pid))  # type: ignore[no-untyped-call]
+        Counter("worker_test_total", "Per worker counter", registry=None).inc(amount)
+        Gauge("worker_test_in_progress", "Per worker gauge", registry=None, multiprocess_mode="livesum").inc()
+
+    metrics_response = client.get("/metrics")
+
+    assert "worker_test_total 3.0" in metrics_response.text
+    assert "worker_test_in_progress 2.0" in metrics_response.text
+
+
+def test_cleanup_dead_workers(tmp_path: Path) -> None:
+    """Test that live gauge files of exited workers are removed"""
+    import os
+
+    from app.observability import cleanup_dead_workers
+
+    dead_pid = 2**22 + 1  # above the default pid_max, never a running process
+    for name in (
+        f"gauge_livesum_{dead_pid}.db",
+        f"gauge_livesum_{os.getpid()}.db",
+        f"counter_{dead_pid}.db",
+    ):
+        (tmp_path / name).touch()
+
+    cleanup_dead_workers(str(tmp_path))
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [f"counter_{dead_pid}.db", f"gauge_livesum_{os.getpid()}.db"]
+    )
+
+
+def _pool_sample(name: str, pool: str) -> float:
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0.0
+
+
+def test_pool_metrics_track_checkouts_and_overflow() -> None:
+    """Test that pool events feed the checked-out and overflow gauges"""
+    from sqlmodel import create_engine
+
+    from app.core.config import settings
+    from app.observability import InstrumentedQueuePool, instrument_engine
+
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name="test-checkouts",
+        pool_size=1,
+        max_overflow=1,
+    )
+    instrument_engine(engine)
+    waits = _pool_sample("sqlalchemy_pool_checkout_wait_seconds_count", "test-checkouts")
+
+    first, second = engine.connect(), engine.connect()
+    assert _pool_sample("sqlalchemy_pool_checked_out_connections", "test-checkouts") == 2
+    assert _pool_sample("sqlalchemy_pool_overflow_connections", "test-checkouts") == 1
+    assert _pool_sample("sqlalchemy_pool_checkout_wait_seconds_count", "test-checkouts") == waits + 2
+
+    second.close()
+    first.close()
+    assert _pool_sample("sqlalchemy_pool_checked_out_connections", "test-checkouts") == 0
+    assert _pool_sample("sqlalchemy_pool_overflow_connections", "test-checkouts") == 0
+    engine.dispose()
+
+
+def test_pool_checkout_timeout_is_counted() -> None:
+    """Test that a checkout giving up after pool_timeout is counted"""
+    from sqlalchemy.exc import TimeoutError
+    from sqlmodel import create_engine
+
+    from app.core.config import settings
+    from app.observability import InstrumentedQueuePool
+
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name="test-timeout",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    with engine.connect():
+        with pytest.raises(TimeoutError):
+            engine.connect()
+
+    assert _pool_sample("sqlalchemy_pool_checkout_timeouts_total", "test-timeout") == 1
+    assert _pool_sample("sqlalchemy_pool_checkout_wait_seconds_sum", "test-timeout") >= 0.05
+    engine.dispose()
+
+
+def test_async_pool_metrics(superuser_token_headers: dict[str, str]) -> None:
+    """Test that the async engine used by the routes reports its checkouts"""
+    waits = _pool_sample("sqlalchemy_pool_checkout_wait_seconds_count", "async")
+
+    response = client.get("/api/v1/users/me", headers=superuser_token_headers)
+
+    assert response.status_code == 200
+    assert _pool_sample("sqlalchemy_pool_checkout_wait_seconds_count", "async") > waits
+    assert _pool_sample("sqlalchemy_pool_checked_out_connections", "async") == 0
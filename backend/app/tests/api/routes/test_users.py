@@ -1,13 +1,20 @@
 import uuid
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app import crud
+from app import crud, user_import
 from app.core.config import settings
+from app.core.db import async_engine
 from app.core.security import verify_password
-from app.models import User, UserCreate
+from app.crud import MAX_PAGE_SIZE
+from app.models import OutboxEmail, User, UserCreate, UserImportJob, UserUpdate
+from app.tests.utils.user import user_authentication_headers
 from app.tests.utils.utils import random_email, random_lower_string
 
 
@@ -33,8 +40,62 @@ def test_get_users_normal_user_me(
     assert current_user["email"] == settings.EMAIL_TEST_USER
 
 
-def test_create_user_new_email(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_get_user_me_served_from_cache(
+    client: TestClient, async_db: AsyncSession
+) -> None:
+    email, password = random_email(), random_lower_string()
+    user = await crud.create_user(
+        session=async_db, user_create=UserCreate(email=email, password=password)
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+
+    statements: list[str] = []
+
+    def record(*args: object) -> None:
+        statements.append(str(args[2]))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+        t = client.post(f"{settings.API_V1_STR}/login/test-token", headers=headers)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert r.json()["id"] == t.json()["id"] == str(user.id)
+    assert statements == []
+
+
+async def test_get_user_me_after_changes(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
+) -> None:
+    email, password = random_email(), random_lower_string()
+    user = await crud.create_user(
+        session=async_db, user_create=UserCreate(email=email, password=password)
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+
+    client.patch(
+        f"{settings.API_V1_STR}/users/me", headers=headers, json={"full_name": "Me"}
+    )
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.json()["full_name"] == "Me"
+
+    await crud.update_user(
+        session=async_db, db_user=user, user_in=UserUpdate(is_active=False)
+    )
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 400
+
+    client.delete(
+        f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+    )
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 404
+
+
+async def test_create_user_new_email(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
     with (
         patch("app.utils.send_email", return_value=None),
@@ -51,18 +112,26 @@ def test_create_user_new_email(
         )
         assert 200 <= r.status_code < 300
         created_user = r.json()
-        user = crud.get_user_by_email(session=db, email=username)
+        user = await crud.get_user_by_email(session=async_db, email=username)
         assert user
         assert user.email == created_user["email"]
-
-
-def test_get_existing_user(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+        welcome = (
+            await async_db.exec(
+                select(OutboxEmail).where(OutboxEmail.email_to == username)
+            )
+        ).one()
+        assert welcome.html_content
+        assert "reset-password?token=" in welcome.html_content
+        assert password not in welcome.html_content
+
+
+async def test_get_existing_user(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     user_id = user.id
     r = client.get(
         f"{settings.API_V1_STR}/users/{user_id}",
@@ -70,16 +139,18 @@ def test_get_existing_user(
     )
     assert 200 <= r.status_code < 300
     api_user = r.json()
-    existing_user = crud.get_user_by_email(session=db, email=username)
+    existing_user = await crud.get_user_by_email(session=async_db, email=username)
     assert existing_user
     assert existing_user.email == api_user["email"]
 
 
-def test_get_existing_user_current_user(client: TestClient, db: Session) -> None:
+async def test_get_existing_user_current_user(
+    client: TestClient, async_db: AsyncSession
+) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     user_id = user.id
 
     login_data = {
@@ -97,7 +168,7 @@ def test_get_existing_user_current_user(client: TestClient, db: Session) -> None
     )
     assert 200 <= r.status_code < 300
     api_user = r.json()
-    existing_user = crud.get_user_by_email(session=db, email=username)
+    existing_user = await crud.get_user_by_email(session=async_db, email=username)
     assert existing_user
     assert existing_user.email == api_user["email"]
 
@@ -113,14 +184,14 @@ def test_get_existing_user_permissions_error(
     assert r.json() == {"detail": "The user doesn't have enough privileges"}
 
 
-def test_create_user_existing_username(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_create_user_existing_username(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
     username = random_email()
     # username = email
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    crud.create_user(session=db, user_create=user_in)
+    await crud.create_user(session=async_db, user_create=user_in)
     data = {"email": username, "password": password}
     r = client.post(
         f"{settings.API_V1_STR}/users/",
@@ -146,18 +217,112 @@ def test_create_user_by_normal_user(
     assert r.status_code == 403
 
 
-def test_retrieve_users(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_create_users_bulk(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
+) -> None:
+    existing = await crud.create_user(
+        session=async_db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    emails = [random_email() for _ in range(3)]
+    password = random_lower_string()
+    data = [
+        {"email": emails[0], "password": password},
+        {"email": existing.email, "password": password},
+        {"email": emails[1], "password": password},
+        {"email": emails[0], "password": password},
+        {"email": emails[2], "password": password},
+    ]
+    # Batches of two, the import spans three of them
+    with (
+        patch.object(settings, "USERS_BULK_BATCH_SIZE", 2),
+        patch.object(settings, "SMTP_HOST", "smtp.example.com"),
+        patch.object(settings, "EMAILS_FROM_EMAIL", "admin@example.com"),
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/users/bulk",
+            headers=superuser_token_headers,
+            json=data,
+        )
+    assert r.status_code == 202
+    assert r.json()["total"] == 5
+
+    # The TestClient runs background tasks before returning the response
+    r = client.get(
+        f"{settings.API_V1_STR}/users/bulk/{r.json()['id']}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    job = r.json()
+    assert job["status"] == "done"
+    assert job["finished_at"]
+    assert (job["total"], job["processed"], job["created"]) == (5, 5, 3)
+    assert [error["index"] for error in job["errors"]] == [1, 3]
+    assert job["errors"][0]["errors"][0]["type"] == "duplicate_email"
+    for email in emails:
+        user = await crud.get_user_by_email(session=async_db, email=email)
+        assert user
+        assert verify_password(password, user.hashed_password)
+        welcome = (
+            await async_db.exec(
+                select(OutboxEmail).where(OutboxEmail.email_to == email)
+            )
+        ).one()
+        assert welcome.html_content
+        assert "reset-password?token=" in welcome.html_content
+        assert password not in welcome.html_content
+
+
+async def test_orphaned_users_bulk_jobs_fail(async_db: AsyncSession) -> None:
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.USERS_BULK_STALE_SECONDS + 1)
+    orphaned = UserImportJob(total=1, created_at=stale, updated_at=stale)
+    running = UserImportJob(total=1, created_at=stale, updated_at=now)
+    async_db.add_all([orphaned, running])
+    await async_db.commit()
+
+    assert await user_import.fail_orphaned_jobs() >= 1
+    await async_db.refresh(orphaned)
+    await async_db.refresh(running)
+    assert orphaned.status == "failed" and orphaned.finished_at
+    assert running.status == "running"
+
+
+def test_create_users_bulk_by_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    data = [{"email": random_email(), "password": random_lower_string()}]
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert r.status_code == 403
+
+
+def test_read_users_bulk_not_found(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/bulk/{uuid.uuid4()}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 404
+    assert r.json() == {"detail": "Job not found"}
+
+
+async def test_retrieve_users(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    crud.create_user(session=db, user_create=user_in)
+    await crud.create_user(session=async_db, user_create=user_in)
 
     username2 = random_email()
     password2 = random_lower_string()
     user_in2 = UserCreate(email=username2, password=password2)
-    crud.create_user(session=db, user_create=user_in2)
+    await crud.create_user(session=async_db, user_create=user_in2)
 
     r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
     all_users = r.json()
@@ -168,6 +333,61 @@ def test_retrieve_users(
         assert "email" in item
 
 
+async def test_retrieve_users_with_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
+) -> None:
+    for _ in range(3):
+        user_in = UserCreate(email=random_email(), password=random_lower_string())
+        await crud.create_user(session=async_db, user_create=user_in)
+
+    offset_page = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 1000},
+    ).json()
+    seen: list[str] = []
+    params: dict[str, str | int] = {"limit": 2}
+    while True:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert r.status_code == 200
+        page = r.json()
+        seen += [user["id"] for user in page["data"]]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert seen == [user["id"] for user in offset_page["data"]]
+    assert offset_page["next_cursor"] is None
+
+
+def test_retrieve_users_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"cursor": "not a cursor"},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize(
+    "params", [{"limit": 0}, {"limit": -1}, {"limit": MAX_PAGE_SIZE + 1}, {"skip": -1}]
+)
+def test_retrieve_users_page_out_of_bounds(
+    client: TestClient, superuser_token_headers: dict[str, str], params: dict[str, int]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/", headers=superuser_token_headers, params=params
+    )
+    assert r.status_code == 422
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -245,13 +465,15 @@ def test_update_password_me_incorrect_password(
     assert updated_user["detail"] == "Incorrect password"
 
 
-def test_update_user_me_email_exists(
-    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+async def test_update_user_me_email_exists(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    async_db: AsyncSession,
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
 
     data = {"email": user.email}
     r = client.patch(
@@ -320,13 +542,16 @@ def test_register_user_already_exists_error(client: TestClient) -> None:
     assert r.json()["detail"] == "The user with this email already exists in the system"
 
 
-def test_update_user(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_update_user(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    async_db: AsyncSession,
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
 
     data = {"full_name": "Updated_full_name"}
     r = client.patch(
@@ -359,18 +584,18 @@ def test_update_user_not_exists(
     assert r.json()["detail"] == "The user with this id does not exist in the system"
 
 
-def test_update_user_email_exists(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_update_user_email_exists(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
 
     username2 = random_email()
     password2 = random_lower_string()
     user_in2 = UserCreate(email=username2, password=password2)
-    user2 = crud.create_user(session=db, user_create=user_in2)
+    user2 = await crud.create_user(session=async_db, user_create=user_in2)
 
     data = {"email": user2.email}
     r = client.patch(
@@ -382,11 +607,13 @@ def test_update_user_email_exists(
     assert r.json()["detail"] == "User with this email already exists"
 
 
-def test_delete_user_me(client: TestClient, db: Session) -> None:
+async def test_delete_user_me(
+    client: TestClient, db: Session, async_db: AsyncSession
+) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     user_id = user.id
 
     login_data = {
@@ -425,13 +652,16 @@ def test_delete_user_me_as_superuser(
     assert response["detail"] == "Super users are not allowed to delete themselves"
 
 
-def test_delete_user_super_user(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_delete_user_super_user(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    async_db: AsyncSession,
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     user_id = user.id
     r = client.delete(
         f"{settings.API_V1_STR}/users/{user_id}",
@@ -455,10 +685,12 @@ def test_delete_user_not_found(
     assert r.json()["detail"] == "User not found"
 
 
-def test_delete_user_current_super_user_error(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+async def test_delete_user_current_super_user_error(
+    client: TestClient, superuser_token_headers: dict[str, str], async_db: AsyncSession
 ) -> None:
-    super_user = crud.get_user_by_email(session=db, email=settings.FIRST_SUPERUSER)
+    super_user = await crud.get_user_by_email(
+        session=async_db, email=settings.FIRST_SUPERUSER
+    )
     assert super_user
     user_id = super_user.id
 
@@ -470,13 +702,15 @@ def test_delete_user_current_super_user_error(
     assert r.json()["detail"] == "Super users are not allowed to delete themselves"
 
 
-def test_delete_user_without_privileges(
-    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+async def test_delete_user_without_privileges(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    async_db: AsyncSession,
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
 
     r = client.delete(
         f"{settings.API_V1_STR}/users/{user.id}",
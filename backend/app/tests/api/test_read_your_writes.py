@@ -0,0 +1,47 @@
+import time
+from http.cookies import SimpleCookie
+
+import pytest
+from starlette.requests import HTTPConnection
+
+from app.api.read_your_writes import (
+    COOKIE_NAME,
+    ReadYourWritesMiddleware,
+    reads_from_primary,
+)
+
+
+def connection(cookie: str | None) -> HTTPConnection:
+    headers = [(b"cookie", f"{COOKIE_NAME}={cookie}".encode())] if cookie else []
+    return HTTPConnection({"type": "http", "headers": headers})
+
+
+def cookie_value(secure: bool = False) -> str:
+    cookie = SimpleCookie(ReadYourWritesMiddleware._cookie(secure=secure))
+    return cookie[COOKIE_NAME].value
+
+
+def test_cookie_keeps_reads_on_primary_until_deadline(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    value = cookie_value()
+    assert reads_from_primary(connection(value))
+    assert not reads_from_primary(connection(None))
+
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert not reads_from_primary(connection(value))
+
+
+def test_forged_cookie_ignored() -> None:
+    deadline, _, signature = cookie_value().rpartition(".")
+    later = f"{float(deadline) + 3600:.3f}"
+    assert not reads_from_primary(connection(f"{later}.{signature}"))
+    assert not reads_from_primary(connection(f"{deadline}."))
+    assert not reads_from_primary(connection("garbage"))
+
+
+def test_cookie_secure_over_https() -> None:
+    assert "Secure" in ReadYourWritesMiddleware._cookie(secure=True)
+    assert "Secure" not in ReadYourWritesMiddleware._cookie(secure=False)
@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from fastapi import APIRouter, Depends, FastAPI, Response
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel
+
+from app.api.routing import ModelResponseRoute
+from app.core.config import settings
+
+
+class Greeting(SQLModel):
+    message: str
+    name: str | None = None
+
+
+def set_header(response: Response) -> None:
+    response.headers["X-Greeting"] = "yes"
+
+
+def test_model_sent_without_validation(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with patch("fastapi.routing.serialize_response") as serialize_response:
+        r = client.get(f"{settings.API_V1_STR}/items/", headers=superuser_token_headers)
+    assert r.status_code == 200
+    assert set(r.json()) == {"data", "count", "next_cursor"}
+    serialize_response.assert_not_called()
+
+
+def test_routes_left_to_fastapi() -> None:
+    router = APIRouter(route_class=ModelResponseRoute)
+
+    @router.get("/model", status_code=201)
+    def model() -> Greeting:
+        return Greeting(message="hello")
+
+    @router.get("/dict", response_model=Greeting)
+    def as_dict() -> dict[str, str]:
+        return {"message": "hello", "extra": "dropped"}
+
+    @router.get("/exclude-none", response_model_exclude_none=True)
+    def exclude_none() -> Greeting:
+        return Greeting(message="hello")
+
+    @router.get("/header", dependencies=[Depends(set_header)])
+    def header() -> Greeting:
+        return Greeting(message="hello")
+
+    @router.get("/status")
+    def status(response: Response) -> Greeting:
+        response.status_code = 202
+        return Greeting(message="hello")
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    with patch("fastapi.routing.serialize_response") as serialize_response:
+        r = client.get("/model")
+    serialize_response.assert_not_called()
+    assert r.status_code == 201
+    assert r.json() == {"message": "hello", "name": None}
+    assert client.get("/dict").json() == {"message": "hello", "name": None}
+    assert client.get("/exclude-none").json() == {"message": "hello"}
+    assert client.get("/header").headers["X-Greeting"] == "yes"
+    assert client.get("/status").status_code == 202
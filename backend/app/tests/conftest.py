@@ -1,33 +1,74 @@
-from collections.abc import Generator
+import asyncio
 import os
+import socket
+from collections.abc import AsyncGenerator, Generator
+from unittest.mock import patch
 
 import pytest
+from aiosmtpd.controller import Controller
 from fastapi.testclient import TestClient
 from sqlmodel import Session, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
-from app.core.db import engine, init_db
+from app.core.db import async_engine, engine, init_db
+from app.core.smtp import smtp_pool
 from app.main import app
-from app.models import Item, User
+from app.models import Item, OutboxEmail, User, UserImportJob
+from app.tests.utils.smtp import Inbox
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
-
 # Configure test environment
 os.environ["ENVIRONMENT"] = "test"
 os.environ["ENABLE_TRACING"] = "0"
 
 
+async def _init_db() -> None:
+    async with AsyncSession(async_engine) as session:
+        await init_db(session)
+
+
 @pytest.fixture(scope="session", autouse=True)
 def db() -> Generator[Session, None, None]:
+    asyncio.run(_init_db())
     with Session(engine) as session:
-        init_db(session)
         yield session
         session.exec(delete(Item))
         session.exec(delete(User))
+        session.exec(delete(OutboxEmail))  # type: ignore[call-overload]
+        session.exec(delete(UserImportJob))  # type: ignore[call-overload]
         session.commit()
 
 
+@pytest.fixture
+async def async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+@pytest.fixture
+def inbox() -> Generator[Inbox, None, None]:
+    """A local SMTP server the app sends its emails to."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    with (
+        patch.object(settings, "SMTP_HOST", "127.0.0.1"),
+        patch.object(settings, "SMTP_PORT", port),
+        patch.object(settings, "SMTP_TLS", False),
+        patch.object(settings, "SMTP_USER", None),
+        patch.object(settings, "SMTP_PASSWORD", None),
+        patch.object(settings, "EMAILS_FROM_EMAIL", "noreply@example.com"),
+    ):
+        yield inbox
+    smtp_pool.close()
+    controller.stop()
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
@@ -40,7 +81,7 @@ def superuser_token_headers(client: TestClient) -> dict[str, str]:
 
 
 @pytest.fixture(scope="module")
-def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]:
-    return authentication_token_from_email(
-        client=client, email=settings.EMAIL_TEST_USER, db=db
+def normal_user_token_headers(client: TestClient) -> dict[str, str]:
+    return asyncio.run(
+        authentication_token_from_email(client=client, email=settings.EMAIL_TEST_USER)
     )
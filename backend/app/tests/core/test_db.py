@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.core.config import settings
+from app.core.db import ReplicaRouter, RoutingSession, async_engine
+from app.models import Item
+
+
+def _replicas(count: int) -> list[AsyncEngine]:
+    return [
+        create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI)) for _ in range(count)
+    ]
+
+
+def test_router_without_replicas_reads_from_primary() -> None:
+    router = ReplicaRouter(async_engine, [])
+    assert router.engine_for_read() is async_engine
+
+
+def test_router_round_robin() -> None:
+    first, second = _replicas(2)
+    router = ReplicaRouter(async_engine, [first, second])
+    picked = [router.engine_for_read() for _ in range(4)]
+    assert picked == [first, second, first, second]
+
+
+def test_router_least_connections(monkeypatch: pytest.MonkeyPatch) -> None:
+    busy, idle = _replicas(2)
+    router = ReplicaRouter(async_engine, [busy, idle], selection="least_connections")
+    monkeypatch.setattr(busy.pool, "checkedout", lambda: 3)
+    monkeypatch.setattr(idle.pool, "checkedout", lambda: 1)
+    assert router.engine_for_read() is idle
+    assert router.engine_for_read() is idle
+
+
+def test_router_reads_from_primary_when_asked() -> None:
+    (replica,) = _replicas(1)
+    router = ReplicaRouter(async_engine, [replica])
+    assert router.engine_for_read(primary=True) is async_engine
+    assert router.engine_for_read() is replica
+
+
+def test_routing_session_sends_writes_to_primary() -> None:
+    (replica,) = _replicas(1)
+    session = RoutingSession(info={"replica": replica.sync_engine})
+    assert session.get_bind(Item) is replica.sync_engine
+    assert session.get_bind(Item, clause=update(Item)) is async_engine.sync_engine
+    assert RoutingSession().get_bind(Item) is async_engine.sync_engine
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import signal
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from app.core import hashing, passwords
+from app.core.config import settings
+from app.core.passwords import verify_password
+
+
+def _sample(name: str, labels: dict[str, str] | None = None) -> float:
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+async def test_hash_and_verify_in_process_pool() -> None:
+    hashed = await hashing.get_password_hash_async("secret")
+    assert verify_password("secret", hashed)
+    assert await hashing.verify_password_async("secret", hashed)
+    assert not await hashing.verify_password_async("wrong", hashed)
+
+
+async def test_hashing_metrics() -> None:
+    verified = _sample(
+        "password_hashing_duration_seconds_count", {"operation": "verify"}
+    )
+    hashed = await hashing.get_password_hash_async("secret")
+    await hashing.verify_password_async("secret", hashed)
+    assert (
+        _sample("password_hashing_duration_seconds_count", {"operation": "verify"})
+        == verified + 1
+    )
+    assert _sample("password_hashing_queue_depth") == 0
+
+
+async def test_hashing_rejects_beyond_max_pending() -> None:
+    rejected = _sample("password_hashing_rejected_total", {"operation": "hash"})
+    with patch.object(settings, "PASSWORD_HASH_MAX_PENDING", 2):
+        results = await asyncio.gather(
+            *(hashing.get_password_hash_async("secret") for _ in range(3)),
+            return_exceptions=True,
+        )
+    assert sum(isinstance(r, hashing.PasswordHashingBusy) for r in results) == 1
+    assert sum(isinstance(r, str) for r in results) == 2
+    assert (
+        _sample("password_hashing_rejected_total", {"operation": "hash"})
+        == rejected + 1
+    )
+
+
+async def test_bulk_hashing_in_a_pool_of_its_own() -> None:
+    passwords = [f"secret{i}" for i in range(5)]
+    # Logins are turned away meanwhile, the bulk job is not
+    with (
+        patch.object(settings, "PASSWORD_HASH_MAX_PENDING", 0),
+        patch.object(settings, "USERS_BULK_HASH_WORKERS", 2),
+        hashing.create_bulk_executor() as executor,
+    ):
+        hashes = await hashing.get_password_hashes_async(passwords, executor)
+    assert all(map(verify_password, passwords, hashes))
+    assert hashing.available_cpus() >= 1
+
+
+async def test_shutdown_recreates_pool_on_next_use() -> None:
+    hashed = await hashing.get_password_hash_async("secret")
+    hashing.shutdown()
+    assert hashing._executor is None
+    assert await hashing.verify_password_async("secret", hashed)
+    assert hashing._executor is not None
+
+
+async def test_pool_replaced_when_a_process_dies() -> None:
+    hashed = await hashing.get_password_hash_async("secret")
+    executor = hashing._get_executor()
+    os.kill(next(iter(executor._processes)), signal.SIGKILL)
+    # Wait for the pool to notice, it fails every job from then on
+    for _ in range(100):
+        if executor._broken:
+            break
+        await asyncio.sleep(0.05)
+    assert executor._broken
+
+    assert await hashing.verify_password_async("secret", hashed)
+    assert hashing._executor is not executor
+
+
+def test_calibrate_stays_within_bounds() -> None:
+    assert passwords.calibrate(0.0, 4, 6) == 4
+    assert passwords.calibrate(60.0, 4, 6) == 6
+
+
+async def test_calibrate_uses_pinned_rounds() -> None:
+    with patch.object(settings, "PASSWORD_HASH_ROUNDS", 5):
+        assert await hashing.calibrate() == 5
+        assert hashing.rounds() == 5
+        assert _sample("password_hashing_rounds") == 5
+
+
+async def test_verify_and_update_follows_the_cost() -> None:
+    weak = passwords.get_password_hash("secret", rounds=4)
+    with patch.object(settings, "PASSWORD_HASH_ROUNDS", 6):
+        count = _sample("password_verify_duration_seconds_count", {"cost": "04"})
+        assert await hashing.verify_and_update_async("wrong", weak) == (False, None)
+        valid, upgraded = await hashing.verify_and_update_async("secret", weak)
+        assert valid and upgraded and upgraded.startswith("$2b$06$")
+        assert verify_password("secret", upgraded)
+        assert await hashing.verify_and_update_async("secret", upgraded) == (
+            True,
+            None,
+        )
+        assert (
+            _sample("password_verify_duration_seconds_count", {"cost": "04"})
+            == count + 2
+        )
+
+    # One round above the target is tolerated, further ones are brought down
+    with patch.object(settings, "PASSWORD_HASH_ROUNDS", 5):
+        assert await hashing.verify_and_update_async("secret", upgraded) == (
+            True,
+            None,
+        )
+    with patch.object(settings, "PASSWORD_HASH_ROUNDS", 4):
+        _, downgraded = await hashing.verify_and_update_async("secret", upgraded)
+        assert downgraded and downgraded.startswith("$2b$04$")
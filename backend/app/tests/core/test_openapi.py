@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.openapi import accepted_encodings
+from app.main import app
+
+OPENAPI_URL = f"{settings.API_V1_STR}/openapi.json"
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip", "identity"])
+def test_openapi_encodings(client: TestClient, encoding: str) -> None:
+    r = client.get(OPENAPI_URL, headers={"Accept-Encoding": encoding})
+    assert r.status_code == 200
+    assert r.headers.get("Content-Encoding", "identity") == encoding
+    assert r.headers["Vary"] == "Accept-Encoding"
+    # httpx decompresses the body
+    assert r.json() == app.openapi()
+
+
+def test_openapi_not_modified(client: TestClient) -> None:
+    r = client.get(OPENAPI_URL, headers={"Accept-Encoding": "gzip"})
+    etag = r.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+
+    r = client.get(
+        OPENAPI_URL, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+
+    # The gzip ETag revalidates the uncompressed document too
+    r = client.get(
+        OPENAPI_URL, headers={"Accept-Encoding": "identity", "If-None-Match": etag}
+    )
+    assert r.status_code == 304
+    assert r.headers["ETag"] != etag
+
+    r = client.get(OPENAPI_URL, headers={"If-None-Match": '"stale"'})
+    assert r.status_code == 200
+
+
+def test_accepted_encodings() -> None:
+    assert accepted_encodings("") == {"identity"}
+    assert accepted_encodings("gzip, deflate, br;q=0.5") == {
+        "br",
+        "deflate",
+        "gzip",
+        "identity",
+    }
+    assert accepted_encodings("*, br;q=0") == {"gzip", "identity", "*"}
+    assert accepted_encodings("gzip;q=0.0, identity;q=0") == set()
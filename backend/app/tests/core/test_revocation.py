@@ -0,0 +1,61 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import col, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.core import revocation
+from app.core.revocation import BloomFilter, RevocationFilter
+from app.models import RevokedToken
+from app.tests.utils.user import create_random_user
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [uuid.uuid4().bytes for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(uuid.uuid4().bytes in bloom for _ in range(10_000))
+    # 1% expected, leave room for chance
+    assert false_positives < 300
+
+
+async def test_refresh_reads_new_and_drops_expired(
+    async_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    user = await create_random_user(async_db)
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    expiring, lasting, later = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    for jti in (expiring, lasting):
+        await crud.revoke_token(
+            session=async_db, jti=jti, user_id=user.id, expires_at=expires_at
+        )
+
+    revocations = RevocationFilter(capacity=100, error_rate=0.001)
+    await revocations.refresh(async_db)
+    assert revocations.might_be_revoked(expiring)
+    assert revocations.might_be_revoked(lasting)
+    assert not revocations.might_be_revoked(later)
+
+    await crud.revoke_token(
+        session=async_db, jti=later, user_id=user.id, expires_at=expires_at
+    )
+    await revocations.refresh(async_db)
+    assert revocations.might_be_revoked(later)
+
+    await async_db.exec(  # type: ignore[call-overload]
+        update(RevokedToken)
+        .where(col(RevokedToken.jti) == expiring)
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    await async_db.commit()
+    await revocations.refresh(async_db)
+    # A Bloom filter cannot forget, only a rebuild drops expired tokens
+    assert revocations.might_be_revoked(expiring)
+    monkeypatch.setattr(revocation, "REBUILD_SECONDS", 0)
+    await revocations.refresh(async_db)
+    assert not revocations.might_be_revoked(expiring)
+    assert revocations.might_be_revoked(lasting)
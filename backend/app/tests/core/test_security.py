@@ -0,0 +1,106 @@
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from cryptography.hazmat.primitives.serialization import (
+    Encoding,
+    NoEncryption,
+    PrivateFormat,
+    PublicFormat,
+)
+
+from app.core import security
+from app.core.security import KeySet, VerifiedTokenCache
+
+
+def private_pem(key: rsa.RSAPrivateKey | ed25519.Ed25519PrivateKey) -> str:
+    return key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()).decode()
+
+
+def public_pem(key: rsa.RSAPrivateKey | ed25519.Ed25519PrivateKey) -> str:
+    return (
+        key.public_key()
+        .public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo)
+        .decode()
+    )
+
+
+def claims(seconds: int = 60) -> dict[str, object]:
+    return {"sub": "user", "exp": int(time.time()) + seconds}
+
+
+def test_eddsa_tokens_name_their_key() -> None:
+    keys = KeySet("EdDSA", "secret", private_pem(ed25519.Ed25519PrivateKey.generate()))
+    token = keys.sign(claims())
+    assert jwt.get_unverified_header(token) == {
+        "alg": "EdDSA",
+        "typ": "JWT",
+        "kid": keys.kid,
+    }
+    assert keys.verify(token)["sub"] == "user"
+    [jwk] = keys.jwks
+    assert jwk["kty"] == "OKP" and jwk["kid"] == keys.kid and "d" not in jwk
+
+
+def test_retired_keys_keep_verifying() -> None:
+    retired = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    old = KeySet("RS256", "secret", private_pem(retired))
+    old_token = old.sign(claims())
+
+    new = KeySet(
+        "RS256",
+        "secret",
+        private_pem(rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+        [public_pem(retired)],
+    )
+    assert new.kid != old.kid
+    assert [jwk["kid"] for jwk in new.jwks] == [new.kid, old.kid]
+    assert new.verify(old_token)["sub"] == "user"
+    # Tokens issued with SECRET_KEY before the switch carry no kid
+    assert new.verify(KeySet("HS256", "secret").sign(claims()))["sub"] == "user"
+
+    unknown = KeySet(
+        "EdDSA", "secret", private_pem(ed25519.Ed25519PrivateKey.generate())
+    )
+    with pytest.raises(jwt.InvalidTokenError):
+        new.verify(unknown.sign(claims()))
+
+
+def test_private_key_must_match_algorithm() -> None:
+    with pytest.raises(ValueError):
+        KeySet("RS256", "secret", private_pem(ed25519.Ed25519PrivateKey.generate()))
+
+
+def test_token_cache_expires_with_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = VerifiedTokenCache(maxsize=1)
+    now = time.time()
+    cache.set("a", {"sub": "a", "exp": now + 10})
+    assert cache.get("a") == {"sub": "a", "exp": now + 10}
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert cache.get("a") is None
+
+    cache.set("b", {"sub": "b", "exp": now + 20})
+    cache.set("c", {"sub": "c", "exp": now + 20})
+    assert cache.get("b") is None
+    cache.set("d", {"sub": "d"})
+    assert cache.get("d") is None
+
+
+def test_decode_access_token_verifies_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    verified: list[str] = []
+    verify = security.key_set.verify
+
+    def counting_verify(token: str) -> dict[str, object]:
+        verified.append(token)
+        return verify(token)
+
+    monkeypatch.setattr(security.key_set, "verify", counting_verify)
+    token = security.create_access_token("user", timedelta(minutes=1))
+    assert security.decode_access_token(token)["sub"] == "user"
+    assert security.decode_access_token(token)["sub"] == "user"
+    assert verified == [token]
+
+    with pytest.raises(jwt.InvalidTokenError):
+        security.decode_access_token(token[:-2])
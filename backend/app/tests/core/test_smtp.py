@@ -0,0 +1,86 @@
+import smtplib
+from unittest.mock import patch
+
+import pytest
+
+from app.core.smtp import SMTPConnectionPool, smtp_pool
+from app.tests.utils.smtp import Inbox
+from app.tests.utils.utils import random_email
+from app.utils import EmailData, EmailDeliveryError, send_email, send_emails
+
+
+def test_send_emails_reuses_sessions(inbox: Inbox) -> None:
+    recipients = [random_email() for _ in range(20)]
+    data = EmailData(html_content="<p>Hello</p>", subject="Hello")
+    errors = send_emails(((email_to, data) for email_to in recipients), concurrency=2)
+    assert errors == [None] * 20
+    assert sorted(inbox.recipients) == sorted(recipients)
+    assert 1 <= len(inbox.peers) <= 2
+
+
+def test_send_emails_reports_each_failure(inbox: Inbox) -> None:
+    inbox.reject = True
+    data = EmailData(html_content="<p>Hello</p>", subject="Hello")
+    [error] = send_emails([(random_email(), data)])
+    assert isinstance(error, EmailDeliveryError)
+    # Refused messages leave the session usable
+    inbox.reject = False
+    send_email(email_to=random_email(), subject="Hello", html_content="<p>Hello</p>")
+    assert len(inbox.peers) == 1
+
+
+def test_session_closed_after_max_messages_or_idle(inbox: Inbox) -> None:
+    pool = SMTPConnectionPool(size=1, idle_seconds=60, max_messages=2)
+    with patch("app.utils.smtp_pool", pool):
+        for _ in range(3):
+            send_email(
+                email_to=random_email(), subject="Hello", html_content="<p>Hello</p>"
+            )
+        assert len(inbox.peers) == 2
+        pool.idle_seconds = 0
+        send_email(
+            email_to=random_email(), subject="Hello", html_content="<p>Hello</p>"
+        )
+        assert len(inbox.peers) == 3
+    pool.close()
+
+
+def test_expired_sessions_quit_outside_the_lock(inbox: Inbox) -> None:
+    pool = SMTPConnectionPool(size=1, idle_seconds=60, max_messages=10)
+    locked_on_quit = []
+
+    def quit_session(smtp: smtplib.SMTP) -> None:
+        # QUIT may wait on the server, the other senders must not
+        locked_on_quit.append(pool._lock.locked())
+        smtp.quit()
+
+    with patch("app.utils.smtp_pool", pool), patch("app.core.smtp._quit", quit_session):
+        send_email(
+            email_to=random_email(), subject="Hello", html_content="<p>Hello</p>"
+        )
+        pool.idle_seconds = 0
+        send_email(
+            email_to=random_email(), subject="Hello", html_content="<p>Hello</p>"
+        )
+    assert locked_on_quit == [False]
+    assert len(inbox.recipients) == 2
+    pool.close()
+
+
+def test_send_email_reconnects_when_dropped(inbox: Inbox) -> None:
+    send_email(email_to=random_email(), subject="Hello", html_content="<p>Hello</p>")
+    # The server drops the session while it idles in the pool
+    smtp_pool._idle[-1].smtp.sock.close()  # type: ignore[union-attr]
+    send_email(email_to=random_email(), subject="Hello", html_content="<p>Hello</p>")
+    assert len(inbox.recipients) == 2
+
+
+@pytest.mark.usefixtures("inbox")
+def test_send_email_server_unreachable() -> None:
+    with (
+        patch("app.core.smtp.settings.SMTP_PORT", 1),
+        pytest.raises(EmailDeliveryError),
+    ):
+        send_email(
+            email_to=random_email(), subject="Hello", html_content="<p>Hello</p>"
+        )
@@ -0,0 +1,200 @@
+import time
+from collections.abc import Generator
+
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import Item, ItemCreate
+from app.tests.utils.item import create_random_item
+
+
+@pytest.fixture
+def statements() -> Generator[list[str]]:
+    executed: list[str] = []
+
+    def record(*args: object) -> None:
+        executed.append(str(args[2]))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+async def test_read_page_exact_count_in_one_round_trip(
+    async_db: AsyncSession, statements: list[str]
+) -> None:
+    item = await create_random_item(async_db)
+    filters = [col(Item.owner_id) == item.owner_id]
+    statements.clear()
+
+    items, total = await crud.read_page(
+        session=async_db, model=Item, filters=filters, scope=item.owner_id
+    )
+
+    assert [i.id for i in items] == [item.id]
+    assert total == 1
+    assert len(statements) == 1
+    assert "count(*)" in statements[0]
+
+
+async def test_read_page_reuses_exact_count_until_write(
+    async_db: AsyncSession, statements: list[str]
+) -> None:
+    item = await create_random_item(async_db)
+    filters = [col(Item.owner_id) == item.owner_id]
+    await crud.read_page(
+        session=async_db, model=Item, filters=filters, scope=item.owner_id
+    )
+
+    # Written behind the ORM's back, the cached count does not see it
+    await async_db.exec(  # type: ignore[call-overload]
+        text(
+            "INSERT INTO item (id, title, owner_id) "
+            "VALUES (gen_random_uuid(), 'raw', :owner)"
+        ).bindparams(owner=item.owner_id)
+    )
+    await async_db.commit()
+    statements.clear()
+    items, total = await crud.read_page(
+        session=async_db, model=Item, filters=filters, scope=item.owner_id
+    )
+    assert (len(items), total) == (2, 1)
+    assert not any("count(*)" in statement for statement in statements)
+
+    await crud.create_item(
+        session=async_db, item_in=ItemCreate(title="new"), owner_id=item.owner_id
+    )
+    _, total = await crud.read_page(
+        session=async_db, model=Item, filters=filters, scope=item.owner_id
+    )
+    assert total == 3
+
+
+async def test_read_page_without_count(
+    async_db: AsyncSession, statements: list[str]
+) -> None:
+    await create_random_item(async_db)
+    statements.clear()
+    items, total = await crud.read_page(session=async_db, model=Item, count="none")
+    assert items
+    assert total is None
+    assert not any("count(*)" in statement for statement in statements)
+
+
+async def test_read_page_estimated_count(async_db: AsyncSession) -> None:
+    item = await create_random_item(async_db)
+    _, total = await crud.read_page(session=async_db, model=Item, count="estimated")
+    assert total is not None and total >= 0
+    _, total = await crud.read_page(
+        session=async_db,
+        model=Item,
+        filters=[col(Item.owner_id) == item.owner_id],
+        count="estimated",
+    )
+    assert total is not None and total >= 0
+
+
+def test_count_cache_expires(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = crud.CountCache(ttl=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.set("item", None, 5)
+    assert cache.get("item", None) == 5
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get("item", None) is None
+
+
+def test_count_cache_invalidates_referencing_tables() -> None:
+    cache = crud.CountCache(ttl=10)
+    cache.set("item", "owner", 5)
+    cache.set("user", None, 2)
+    cache.invalidate("user")
+    assert cache.get("item", "owner") is None
+    assert cache.get("user", None) is None
+
+
+async def test_owner_scoped_page_can_use_owner_index(async_db: AsyncSession) -> None:
+    item = await create_random_item(async_db)
+    statement = (
+        select(Item)
+        .where(col(Item.owner_id) == item.owner_id)
+        .order_by(col(Item.id))
+        .limit(10)
+    )
+    sql = statement.compile(
+        dialect=async_engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    connection = await async_db.connection()
+    # The test table is tiny, keep the planner from preferring a scan
+    await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = (await connection.exec_driver_sql(f"EXPLAIN {sql}")).scalars().all()
+    await async_db.rollback()
+    assert any("ix_item_owner_id_id" in line for line in plan)
+
+
+async def test_create_items_inserts_small_batches(
+    async_db: AsyncSession, statements: list[str]
+) -> None:
+    item = await create_random_item(async_db)
+    items = [ItemCreate(title="one"), ItemCreate(title="two", description="2")]
+    statements.clear()
+
+    ids = await crud.create_items(session=async_db, items=items, owner_id=item.owner_id)
+
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT INTO item")
+    assert "RETURNING" in statements[0]
+    titles = [(await async_db.get(Item, id)).title for id in ids]  # type: ignore[union-attr]
+    assert titles == ["one", "two"]
+
+
+async def test_create_items_copies_large_batches(
+    async_db: AsyncSession, statements: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "ITEMS_BULK_COPY_MIN_ROWS", 2)
+    item = await create_random_item(async_db)
+    filters = [col(Item.owner_id) == item.owner_id]
+    await crud.read_page(
+        session=async_db, model=Item, filters=filters, scope=item.owner_id
+    )
+    items = [ItemCreate(title="one"), ItemCreate(title="two", description="2")]
+    statements.clear()
+
+    ids = await crud.create_items(session=async_db, items=items, owner_id=item.owner_id)
+
+    assert not any(statement.startswith("INSERT") for statement in statements)
+    copied = (await async_db.exec(select(Item).where(col(Item.id).in_(ids)))).all()
+    assert {(i.title, i.description) for i in copied} == {("one", None), ("two", "2")}
+    # COPY goes past the ORM events, the cached count is dropped all the same
+    _, total = await crud.read_page(
+        session=async_db, model=Item, filters=filters, scope=item.owner_id
+    )
+    assert total == 3
+
+
+async def test_update_and_delete_items_in_one_statement(
+    async_db: AsyncSession, statements: list[str]
+) -> None:
+    item = await create_random_item(async_db)
+    filters = [col(Item.owner_id) == item.owner_id]
+    statements.clear()
+
+    count = await crud.update_items(
+        session=async_db, filters=filters, values={"title": "updated"}
+    )
+    assert count == 1
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE item")
+
+    statements.clear()
+    count = await crud.delete_items(session=async_db, filters=filters)
+    assert count == 1
+    assert len(statements) == 1
+    assert statements[0].startswith("DELETE FROM item")
+    remaining = select(Item.id).where(col(Item.id) == item.id)
+    assert (await async_db.exec(remaining)).first() is None
@@ -1,91 +1,219 @@
+import asyncio
+import time
+from typing import Any
+from unittest.mock import patch
+
+import psycopg
+import pytest
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
+from app.core.config import settings
 from app.core.security import verify_password
-from app.models import User, UserCreate, UserUpdate
+from app.models import User, UserCreate, UserPublic, UserUpdate
+from app.tests.utils.user import create_random_user
 from app.tests.utils.utils import random_email, random_lower_string
 
 
-def test_create_user(db: Session) -> None:
+async def test_create_user(async_db: AsyncSession) -> None:
     email = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     assert user.email == email
     assert hasattr(user, "hashed_password")
 
 
-def test_authenticate_user(db: Session) -> None:
+async def test_authenticate_user(async_db: AsyncSession) -> None:
     email = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
-    authenticated_user = crud.authenticate(session=db, email=email, password=password)
+    user = await crud.create_user(session=async_db, user_create=user_in)
+    authenticated_user = await crud.authenticate(
+        session=async_db, email=email, password=password
+    )
     assert authenticated_user
     assert user.email == authenticated_user.email
 
 
-def test_not_authenticate_user(db: Session) -> None:
+async def test_authenticate_rehashes_at_current_cost(async_db: AsyncSession) -> None:
+    email, password = random_email(), random_lower_string()
+    with patch.object(settings, "PASSWORD_HASH_ROUNDS", 4):
+        user = await crud.create_user(
+            session=async_db, user_create=UserCreate(email=email, password=password)
+        )
+    assert user.hashed_password.startswith("$2b$04$")
+    with patch.object(settings, "PASSWORD_HASH_ROUNDS", 6):
+        authenticated = await crud.authenticate(
+            session=async_db, email=email, password=password
+        )
+    assert authenticated
+    await async_db.refresh(user)
+    assert user.hashed_password.startswith("$2b$06$")
+    assert verify_password(password, user.hashed_password)
+
+
+async def test_not_authenticate_user(async_db: AsyncSession) -> None:
     email = random_email()
     password = random_lower_string()
-    user = crud.authenticate(session=db, email=email, password=password)
+    user = await crud.authenticate(session=async_db, email=email, password=password)
     assert user is None
 
 
-def test_check_if_user_is_active(db: Session) -> None:
+async def test_check_if_user_is_active(async_db: AsyncSession) -> None:
     email = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     assert user.is_active is True
 
 
-def test_check_if_user_is_active_inactive(db: Session) -> None:
+async def test_check_if_user_is_active_inactive(async_db: AsyncSession) -> None:
     email = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password, disabled=True)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     assert user.is_active
 
 
-def test_check_if_user_is_superuser(db: Session) -> None:
+async def test_check_if_user_is_superuser(async_db: AsyncSession) -> None:
     email = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password, is_superuser=True)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     assert user.is_superuser is True
 
 
-def test_check_if_user_is_superuser_normal_user(db: Session) -> None:
+async def test_check_if_user_is_superuser_normal_user(async_db: AsyncSession) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     assert user.is_superuser is False
 
 
-def test_get_user(db: Session) -> None:
+async def test_get_user(db: Session, async_db: AsyncSession) -> None:
     password = random_lower_string()
     username = random_email()
     user_in = UserCreate(email=username, password=password, is_superuser=True)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     user_2 = db.get(User, user.id)
     assert user_2
     assert user.email == user_2.email
     assert jsonable_encoder(user) == jsonable_encoder(user_2)
 
 
-def test_update_user(db: Session) -> None:
+async def test_update_user(db: Session, async_db: AsyncSession) -> None:
     password = random_lower_string()
     email = random_email()
     user_in = UserCreate(email=email, password=password, is_superuser=True)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=async_db, user_create=user_in)
     new_password = random_lower_string()
     user_in_update = UserUpdate(password=new_password, is_superuser=True)
     if user.id is not None:
-        crud.update_user(session=db, db_user=user, user_in=user_in_update)
+        await crud.update_user(session=async_db, db_user=user, user_in=user_in_update)
     user_2 = db.get(User, user.id)
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+async def test_user_cache_invalidated_on_commit(async_db: AsyncSession) -> None:
+    user = await create_random_user(async_db)
+    crud.user_cache.set(user, crud.user_cache.generation)
+    assert crud.user_cache.get(str(user.id))
+
+    user.hashed_password = "changed"
+    async_db.add(user)
+    await async_db.flush()
+    # Other requests keep the entry until the change is visible to them
+    assert crud.user_cache.get(str(user.id))
+    await async_db.commit()
+    assert crud.user_cache.get(str(user.id)) is None
+
+
+async def test_user_cache_skips_lookups_racing_a_write(
+    async_db: AsyncSession,
+) -> None:
+    user = await create_random_user(async_db)
+    generation = crud.user_cache.generation
+    await crud.update_user(
+        session=async_db, db_user=user, user_in=UserUpdate(full_name="New")
+    )
+    # A lookup that read the row before the commit must not be cached
+    crud.user_cache.set(user, generation)
+    assert crud.user_cache.get(str(user.id)) is None
+
+
+def test_user_cache_expires_and_evicts(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = crud.UserCache(ttl=10, maxsize=2)
+    users = [User(email=random_email(), hashed_password="x") for _ in range(3)]
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    for user in users:
+        cache.set(user, cache.generation)
+    assert cache.get(str(users[0].id)) is None
+    assert cache.get(str(users[2].id)) == UserPublic.model_validate(users[2])
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get(str(users[2].id)) is None
+
+
+async def test_postgres_notify_channel(
+    async_db: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    channel = crud.PostgresNotifyChannel()
+    monkeypatch.setattr(crud.user_cache, "channel", channel)
+    received: asyncio.Queue[str | None] = asyncio.Queue()
+    listener = asyncio.create_task(channel.listen(received.put_nowait))
+    try:
+        # Connecting drops everything, notifications may have been missed
+        assert await asyncio.wait_for(received.get(), 5) is None
+        user = await create_random_user(async_db)
+        await crud.update_user(
+            session=async_db, db_user=user, user_in=UserUpdate(full_name="New")
+        )
+        assert await asyncio.wait_for(received.get(), 5) == str(user.id)
+    finally:
+        listener.cancel()
+
+
+async def test_postgres_notify_channel_reconnects(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    channel = crud.PostgresNotifyChannel()
+    connect = psycopg.AsyncConnection.connect
+    failures = [OSError("database away"), OSError("database away")]
+
+    async def flaky_connect(*args: Any, **kwargs: Any) -> psycopg.AsyncConnection[Any]:
+        if failures:
+            raise failures.pop()
+        return await connect(*args, **kwargs)
+
+    sleep = asyncio.sleep
+    delays: list[float] = []
+
+    async def record_sleep(delay: float) -> None:
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(psycopg.AsyncConnection, "connect", flaky_connect)
+    monkeypatch.setattr(asyncio, "sleep", record_sleep)
+    received: asyncio.Queue[str | None] = asyncio.Queue()
+    calls = 0
+
+    def invalidate(user_id: str | None) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("invalidation failed")
+        received.put_nowait(user_id)
+
+    listener = asyncio.create_task(channel.listen(invalidate))
+    try:
+        assert await asyncio.wait_for(received.get(), 5) is None
+    finally:
+        listener.cancel()
+    # Backing off while connecting fails, from scratch once connected
+    assert delays == [1, 2, 1]
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.email_dispatcher import dispatch, purge
+from app.models import OutboxEmail
+from app.tests.utils.smtp import Inbox
+from app.tests.utils.utils import random_email
+
+
+def outbox_email(db: Session, email_to: str) -> OutboxEmail:
+    db.expire_all()
+    return db.exec(select(OutboxEmail).where(OutboxEmail.email_to == email_to)).one()
+
+
+def test_route_enqueues_and_dispatcher_sends(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    inbox: Inbox,
+) -> None:
+    email_to = random_email()
+    with patch("app.utils.send_email") as send_email:
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": email_to},
+        )
+    assert r.status_code == 201
+    send_email.assert_not_called()
+    assert outbox_email(db, email_to).status == "pending"
+
+    while dispatch(engine):
+        pass
+    assert email_to in inbox.recipients
+    email = outbox_email(db, email_to)
+    assert email.status == "sent" and email.attempts == 1 and email.sent_at
+    assert email.html_content is None
+
+
+def test_test_email_refused_without_smtp(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    email_to = random_email()
+    with patch("app.core.config.settings.SMTP_HOST", None):
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": email_to},
+        )
+    assert r.status_code == 503
+    assert r.json() == {"detail": "Emails are not configured"}
+    assert (
+        db.exec(select(OutboxEmail).where(OutboxEmail.email_to == email_to)).first()
+        is None
+    )
+
+
+def test_failed_delivery_retried_then_dead(db: Session, inbox: Inbox) -> None:
+    email_to = random_email()
+    now = datetime.now(timezone.utc)
+    db.add(
+        OutboxEmail(
+            email_to=email_to,
+            subject="Subject",
+            html_content="<p>Hello</p>",
+            created_at=now,
+            next_attempt_at=now,
+        )
+    )
+    db.commit()
+    inbox.reject = True
+
+    dispatch(engine)
+    email = outbox_email(db, email_to)
+    assert email.status == "pending" and email.attempts == 1
+    assert email.last_error and email.next_attempt_at > now
+    # Backed off, not picked up again until it is due
+    dispatch(engine)
+    assert outbox_email(db, email_to).attempts == 1
+
+    with patch.object(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 2):
+        email = outbox_email(db, email_to)
+        email.next_attempt_at = now
+        db.add(email)
+        db.commit()
+        dispatch(engine)
+    email = outbox_email(db, email_to)
+    assert email.status == "dead" and email.attempts == 2
+    assert email.html_content is None
+    assert email_to not in inbox.recipients
+
+
+def test_purge_drops_emails_done_with_past_retention(db: Session) -> None:
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(hours=settings.EMAIL_OUTBOX_RETENTION_HOURS + 1)
+    emails = {
+        (status, created_at): random_email()
+        for status in ("pending", "sent", "dead")
+        for created_at in (old, now)
+    }
+    for (status, created_at), email_to in emails.items():
+        db.add(
+            OutboxEmail(
+                email_to=email_to,
+                subject="Subject",
+                html_content=None if status != "pending" else "<p>Hello</p>",
+                status=status,
+                created_at=created_at,
+                # Not due, left alone by the dispatches of other tests
+                next_attempt_at=now + timedelta(days=1),
+            )
+        )
+    db.commit()
+
+    assert purge(engine) == 2
+    db.expire_all()
+    kept = set(db.exec(select(OutboxEmail.email_to)).all())
+    for (status, created_at), email_to in emails.items():
+        assert (email_to in kept) == (status == "pending" or created_at == now)
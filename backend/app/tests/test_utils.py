@@ -0,0 +1,30 @@
+from jinja2 import Template
+
+from app.core.config import settings
+from app.utils import (
+    EMAIL_TEMPLATES_DIR,
+    email_templates,
+    generate_reset_password_email,
+    preload_email_templates,
+)
+
+
+def test_email_templates_compiled_once() -> None:
+    preload_email_templates()
+    template = email_templates.get_template("reset_password.html")
+    assert email_templates.get_template("reset_password.html") is template
+
+
+def test_reset_password_email_renders_template() -> None:
+    email_data = generate_reset_password_email(
+        email_to="user@example.com", email="user@example.com", token="token"
+    )
+    source = (EMAIL_TEMPLATES_DIR / "reset_password.html").read_text()
+    expected = Template(source).render(
+        project_name=settings.PROJECT_NAME,
+        username="user@example.com",
+        email="user@example.com",
+        valid_hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+        link=f"{settings.FRONTEND_HOST}/reset-password?token=token",
+    )
+    assert email_data.html_content == expected
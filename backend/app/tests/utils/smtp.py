@@ -0,0 +1,17 @@
+from typing import Any
+
+
+class Inbox:
+    """aiosmtpd handler keeping what it receives, or rejecting it."""
+
+    def __init__(self) -> None:
+        self.recipients: list[str] = []
+        self.peers: set[tuple[str, int]] = set()
+        self.reject = False
+
+    async def handle_DATA(self, _server: Any, session: Any, envelope: Any) -> str:
+        self.peers.add(session.peer)
+        if self.reject:
+            return "451 Try again later"
+        self.recipients.extend(envelope.rcpt_tos)
+        return "250 OK"
@@ -1,8 +1,9 @@
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
 from app.core.config import settings
+from app.core.db import async_engine
 from app.models import User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -19,16 +20,16 @@ def user_authentication_headers(
     return headers
 
 
-def create_random_user(db: Session) -> User:
+async def create_random_user(db: AsyncSession) -> User:
     email = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password)
-    user = crud.create_user(session=db, user_create=user_in)
+    user = await crud.create_user(session=db, user_create=user_in)
     return user
 
 
-def authentication_token_from_email(
-    *, client: TestClient, email: str, db: Session
+async def authentication_token_from_email(
+    *, client: TestClient, email: str
 ) -> dict[str, str]:
     """
     Return a valid token for the user with given email.
@@ -36,14 +37,17 @@ def authentication_token_from_email(
     If the user doesn't exist it is created first.
     """
     password = random_lower_string()
-    user = crud.get_user_by_email(session=db, email=email)
-    if not user:
-        user_in_create = UserCreate(email=email, password=password)
-        user = crud.create_user(session=db, user_create=user_in_create)
-    else:
-        user_in_update = UserUpdate(password=password)
-        if not user.id:
-            raise Exception("User id not set")
-        user = crud.update_user(session=db, db_user=user, user_in=user_in_update)
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        user = await crud.get_user_by_email(session=db, email=email)
+        if not user:
+            user_in_create = UserCreate(email=email, password=password)
+            user = await crud.create_user(session=db, user_create=user_in_create)
+        else:
+            user_in_update = UserUpdate(password=password)
+            if not user.id:
+                raise Exception("User id not set")
+            user = await crud.update_user(
+                session=db, db_user=user, user_in=user_in_update
+            )
 
     return user_authentication_headers(client=client, email=email, password=password)
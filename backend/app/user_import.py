@@ -0,0 +1,134 @@
+import logging
+import uuid
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlmodel import col, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.hashing import create_bulk_executor, get_password_hashes_async
+from app.models import UserCreate, UserImportJob
+from app.utils import generate_password_reset_token, generate_set_password_email
+
+logger = logging.getLogger(__name__)
+
+# Onboarding a tenant creates thousands of users at once. POST /users/bulk
+# records a UserImportJob and answers right away, the users are then
+# created here, in the background of that request: emails already taken are
+# found in one query, passwords hashed in a process pool of the job's own
+# and users inserted and committed USERS_BULK_BATCH_SIZE at a time, each
+# batch along with the progress of the job and its welcome emails in the
+# outbox. The emails carry a link to set a password, not the password, as
+# they wait in the outbox table until sent.
+
+DUPLICATE_EMAIL = {
+    "type": "duplicate_email",
+    "loc": ["email"],
+    "msg": "The user with this email already exists in the system.",
+}
+
+
+def _duplicate(index: int) -> dict[str, Any]:
+    return {"index": index, "errors": [DUPLICATE_EMAIL]}
+
+
+async def _import_batch(
+    session: AsyncSession,
+    job: UserImportJob,
+    batch: Sequence[tuple[int, UserCreate]],
+    taken: set[str],
+    executor: ProcessPoolExecutor,
+) -> None:
+    errors, fresh = [], []
+    for index, user_in in batch:
+        if user_in.email in taken:
+            errors.append(_duplicate(index))
+        else:
+            # Later entries with the same email are duplicates too
+            taken.add(user_in.email)
+            fresh.append((index, user_in))
+
+    hashes = await get_password_hashes_async(
+        [user.password for _, user in fresh], executor
+    )
+    created = await crud.add_users(
+        session=session,
+        users=[
+            (user_in, hashed)
+            for (_, user_in), hashed in zip(fresh, hashes, strict=True)
+        ],
+    )
+    for index, user_in in fresh:
+        if user_in.email not in created:
+            errors.append(_duplicate(index))
+        elif settings.emails_enabled:
+            email_data = generate_set_password_email(
+                email_to=user_in.email,
+                username=user_in.email,
+                token=generate_password_reset_token(email=user_in.email),
+            )
+            crud.enqueue_email(
+                session=session,
+                email_to=user_in.email,
+                subject=email_data.subject,
+                html_content=email_data.html_content,
+            )
+
+    job.processed += len(batch)
+    job.created += len(created)
+    job.errors = [*job.errors, *sorted(errors, key=lambda error: error["index"])]
+    job.updated_at = datetime.now(timezone.utc)
+    session.add(job)
+    await session.commit()
+
+
+async def run(job_id: uuid.UUID, users_in: Sequence[UserCreate]) -> None:
+    """Create ``users_in``, reporting on the job ``job_id``."""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        job = await session.get(UserImportJob, job_id)
+        assert job is not None
+        try:
+            taken = await crud.get_existing_emails(
+                session=session, emails=[user_in.email for user_in in users_in]
+            )
+            batch_size = settings.USERS_BULK_BATCH_SIZE
+            with create_bulk_executor() as executor:
+                for start in range(0, len(users_in), batch_size):
+                    batch = list(enumerate(users_in[start : start + batch_size], start))
+                    await _import_batch(session, job, batch, taken, executor)
+        except Exception:
+            # Batches committed so far are kept, the job tells how far it got
+            logger.exception(f"User import {job_id} failed")
+            await session.rollback()
+            job.status = "failed"
+        else:
+            job.status = "done"
+        job.finished_at = job.updated_at = datetime.now(timezone.utc)
+        session.add(job)
+        await session.commit()
+
+
+async def fail_orphaned_jobs() -> int:
+    """Mark failed the running jobs that made no progress for
+    USERS_BULK_STALE_SECONDS, their worker stopped. Returns how many."""
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.USERS_BULK_STALE_SECONDS)
+    statement = (
+        update(UserImportJob)
+        .where(
+            col(UserImportJob.status) == "running",
+            col(UserImportJob.updated_at) < stale,
+        )
+        .values(status="failed", finished_at=now, updated_at=now)
+    )
+    async with AsyncSession(async_engine) as session:
+        result = await session.exec(statement)  # type: ignore[call-overload]
+        await session.commit()
+    if result.rowcount:
+        logger.warning(f"Marked {result.rowcount} orphaned user imports failed")
+    return int(result.rowcount)
@@ -1,4 +1,9 @@
+import base64
 import logging
+import smtplib
+import uuid
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -6,27 +11,46 @@ from typing import Any
 
 import emails
 import jwt
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from jwt.exceptions import InvalidTokenError
 
 from app.core import security
 from app.core.config import settings
+from app.core.smtp import smtp_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class EmailDeliveryError(Exception):
+    """The SMTP server could not be reached or did not accept the email."""
+
+
 @dataclass
 class EmailData:
     html_content: str
     subject: str
 
 
+EMAIL_TEMPLATES_DIR = Path(__file__).parent / "email-templates" / "build"
+
+# Templates are compiled once per process and kept, the bytecode cache spares
+# the compilation to the next processes too. auto_reload checks the file's
+# modification time on every render, leave it to local development.
+email_templates = Environment(
+    loader=FileSystemLoader(EMAIL_TEMPLATES_DIR),
+    bytecode_cache=FileSystemBytecodeCache(settings.EMAIL_TEMPLATES_CACHE_DIR),
+    auto_reload=settings.EMAIL_TEMPLATES_AUTO_RELOAD,
+)
+
+
+def preload_email_templates() -> None:
+    for template_name in email_templates.list_templates():
+        email_templates.get_template(template_name)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    return Template(template_str).render(context)
+    return email_templates.get_template(template_name).render(context)
 
 
 def send_email(
@@ -40,18 +64,48 @@ def send_email(
         subject=subject,
         html=html_content,
         mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+        mail_to=email_to,
     )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
-    logger.info(f"send email result: {response}")
+    content = message.as_string()
+    # A pooled session the server has meanwhile dropped fails at once, the
+    # message is sent again over a new one
+    for retry in (True, False):
+        try:
+            with smtp_pool.connection() as smtp:
+                smtp.sendmail(settings.EMAILS_FROM_EMAIL or "", [email_to], content)
+        except smtplib.SMTPServerDisconnected as e:
+            if not retry:
+                raise EmailDeliveryError(e) from e
+        except (smtplib.SMTPException, OSError) as e:
+            raise EmailDeliveryError(e) from e
+        else:
+            logger.info(f"send email to {email_to}: sent")
+            return
+
+
+def send_emails(
+    messages: Iterable[tuple[str, EmailData]], *, concurrency: int | None = None
+) -> list[EmailDeliveryError | None]:
+    """Send each ``(email_to, email_data)``, the error of each one or None.
+
+    At most ``concurrency`` are sent at a time, SMTP_POOL_SIZE by default,
+    over the pooled sessions.
+    """
+
+    def send(message: tuple[str, EmailData]) -> EmailDeliveryError | None:
+        email_to, email_data = message
+        try:
+            send_email(
+                email_to=email_to,
+                subject=email_data.subject,
+                html_content=email_data.html_content,
+            )
+        except EmailDeliveryError as e:
+            return e
+        return None
+
+    with ThreadPoolExecutor(concurrency or settings.SMTP_POOL_SIZE) as executor:
+        return list(executor.map(send, messages))
 
 
 def generate_test_email(email_to: str) -> EmailData:
@@ -81,19 +135,18 @@ def generate_reset_password_email(email_to: str, email: str, token: str) -> Emai
     return EmailData(html_content=html_content, subject=subject)
 
 
-def generate_new_account_email(
-    email_to: str, username: str, password: str
-) -> EmailData:
+def generate_set_password_email(email_to: str, username: str, token: str) -> EmailData:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - New account for user {username}"
+    link = f"{settings.FRONTEND_HOST}/reset-password?token={token}"
     html_content = render_email_template(
-        template_name="new_account.html",
+        template_name="new_account_set_password.html",
         context={
             "project_name": settings.PROJECT_NAME,
             "username": username,
-            "password": password,
             "email": email_to,
-            "link": settings.FRONTEND_HOST,
+            "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+            "link": link,
         },
     )
     return EmailData(html_content=html_content, subject=subject)
@@ -119,3 +172,16 @@ def verify_password_reset_token(token: str) -> str | None:
         return str(decoded_token["sub"])
     except InvalidTokenError:
         return None
+
+
+def encode_cursor(id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(id.bytes).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> uuid.UUID | None:
+    try:
+        return uuid.UUID(
+            bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except ValueError:
+        return None
@@ -0,0 +1,88 @@
+"""
+Benchmark of creating items one by one versus in bulk.
+
+Creates ``--items`` items for a throwaway user three ways: one
+``crud.create_item`` per item, as ``POST /items/`` does, then through
+``crud.create_items`` in chunks of ``--chunk``, once with multi-row
+``INSERT ... RETURNING`` and once with ``COPY``. Needs the database from
+docker compose.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/bulk_items.py --items 10000 --chunk 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlmodel import col, delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.security import get_password_hash
+from app.models import ItemCreate, User
+
+OWNER_EMAIL = "bulk-items-benchmark@example.com"
+
+
+async def one_by_one(
+    session: AsyncSession, owner: User, items: list[ItemCreate]
+) -> None:
+    for item in items:
+        await crud.create_item(session=session, item_in=item, owner_id=owner.id)
+
+
+async def in_chunks(
+    session: AsyncSession, owner: User, items: list[ItemCreate], chunk: int
+) -> None:
+    for start in range(0, len(items), chunk):
+        await crud.create_items(
+            session=session, items=items[start : start + chunk], owner_id=owner.id
+        )
+
+
+def report(name: str, items: int, seconds: float) -> None:
+    print(f"{name:<12} {items / seconds:>12,.0f} items/s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--chunk", type=int, default=settings.ITEMS_BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    items = [
+        ItemCreate(title=f"Item {i}", description="A description of a few words")
+        for i in range(args.items)
+    ]
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        owner = (
+            await session.exec(select(User).where(User.email == OWNER_EMAIL))
+        ).first()
+        if not owner:
+            owner = User(email=OWNER_EMAIL, hashed_password=get_password_hash("bench"))
+            session.add(owner)
+            await session.commit()
+
+        start = time.perf_counter()
+        await one_by_one(session, owner, items)
+        report("one by one", args.items, time.perf_counter() - start)
+
+        # Chunks below the threshold are inserted, the others copied
+        for name, copy_min_rows in (("INSERT", args.chunk + 1), ("COPY", 1)):
+            settings.ITEMS_BULK_COPY_MIN_ROWS = copy_min_rows
+            start = time.perf_counter()
+            await in_chunks(session, owner, items, args.chunk)
+            report(name, args.items, time.perf_counter() - start)
+
+        # Items go with their owner through ON DELETE CASCADE
+        await session.exec(delete(User).where(col(User.email) == OWNER_EMAIL))  # type: ignore[call-overload]
+        await session.commit()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
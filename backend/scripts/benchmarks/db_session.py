@@ -0,0 +1,93 @@
+"""
+Load benchmark of the sync and async database session paths.
+
+Serves the same items page through ``SessionDep`` (sync ``def`` endpoint,
+runs on Starlette's 40 thread pool) and ``AsyncSessionDep`` (``async def``
+endpoint, bounded by the connection pool only) and fires ``--clients``
+concurrent requests at each. Needs the database from docker compose.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/db_session.py --clients 500 --requests 5000
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import select
+
+from app.api.deps import AsyncSessionDep, SessionDep
+from app.models import Item
+
+app = FastAPI()
+
+
+@app.get("/sync")
+def read_items_sync(session: SessionDep) -> Any:
+    return session.exec(select(Item).limit(20)).all()
+
+
+@app.get("/async")
+async def read_items_async(session: AsyncSessionDep) -> Any:
+    return (await session.exec(select(Item).limit(20))).all()
+
+
+async def run(
+    path: str, clients: int, requests: int, timeout: float
+) -> tuple[float, list[float], int]:
+    # Pool checkout timeouts surface as 500s and stuck requests are abandoned
+    # after ``timeout`` seconds, both count as errors
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(client.get(path), timeout)
+                except asyncio.TimeoutError:
+                    errors += 1
+                else:
+                    errors += response.status_code != 200
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, latencies, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    for path in ("/sync", "/async"):
+        rps, latencies, errors = asyncio.run(
+            run(path, args.clients, args.requests, args.timeout)
+        )
+        p50 = statistics.median(latencies) * 1000
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+        print(
+            f"{path:<7} {rps:>8.0f} req/s  p50 {p50:>7.1f} ms  "
+            f"p99 {p99:>7.1f} ms  errors {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
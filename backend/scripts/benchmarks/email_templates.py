@@ -0,0 +1,64 @@
+"""
+Benchmark of rendering password reset emails.
+
+Renders the reset password email once per iteration, reading and compiling
+the template file on every call as ``render_email_template`` used to, then
+through the shared ``email_templates`` environment.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/email_templates.py --emails 10000
+"""
+
+import argparse
+import time
+from typing import Any
+
+from jinja2 import Template
+
+from app.utils import (
+    EMAIL_TEMPLATES_DIR,
+    preload_email_templates,
+    render_email_template,
+)
+
+TEMPLATE_NAME = "reset_password.html"
+
+
+def render_uncached(*, template_name: str, context: dict[str, Any]) -> str:
+    template_str = (EMAIL_TEMPLATES_DIR / template_name).read_text()
+    return Template(template_str).render(context)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=10_000)
+    args = parser.parse_args()
+
+    preload_email_templates()
+    context = {
+        "project_name": "Benchmark",
+        "username": "user@example.com",
+        "email": "user@example.com",
+        "valid_hours": 48,
+        "link": "http://localhost:5173/reset-password?token=token",
+    }
+    assert render_uncached(
+        template_name=TEMPLATE_NAME, context=context
+    ) == render_email_template(template_name=TEMPLATE_NAME, context=context)
+
+    for name, render in (
+        ("uncached", render_uncached),
+        ("cached", render_email_template),
+    ):
+        start = time.perf_counter()
+        for i in range(args.emails):
+            render(template_name=TEMPLATE_NAME, context={**context, "link": str(i)})
+        seconds = time.perf_counter() - start
+        print(
+            f"{name:<10} {seconds:>8.2f} s {seconds / args.emails * 1e6:>8.1f} us/email"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for the Prometheus metrics middleware.
+
+Compares requests/sec on ``/api/v1/utils/health-check/`` for the bare app,
+the previous ``BaseHTTPMiddleware`` based implementation and the current
+pure ASGI ``PrometheusMiddleware``. Requests are driven in-process through
+``httpx.ASGITransport`` so the numbers reflect middleware overhead only.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/metrics_middleware.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.api.routes import utils
+from app.core.config import settings
+from app.observability import PrometheusMiddleware
+
+PATH = f"{settings.API_V1_STR}/utils/health-check/"
+
+
+class LegacyPrometheusMiddleware(BaseHTTPMiddleware):
+    """The pre-ASGI implementation, reusing the same metric helpers."""
+
+    def __init__(self, app: FastAPI, app_name: str = "benchmark-legacy") -> None:
+        super().__init__(app)
+        self.recorder = PrometheusMiddleware(app, app_name=app_name)
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        recorder = self.recorder
+        method = request.method
+        path, _ = recorder._get_path(request.scope)
+        recorder._update_request_metrics(method, path)
+        before_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        except Exception as e:
+            recorder._handle_exception(method, path, e)
+            raise
+        else:
+            recorder._record_request_duration(method, path, before_time)
+            return response
+        finally:
+            recorder._update_response_metrics(method, path, status_code)
+
+
+def build_app(middleware: type | None) -> FastAPI:
+    app = FastAPI()
+    app.include_router(utils.router, prefix=settings.API_V1_STR)
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for _ in range(min(requests, 100)):  # warm up
+            await client.get(PATH)
+
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                response = await client.get(PATH)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    variants: dict[str, type | None] = {
+        "no middleware": None,
+        "BaseHTTPMiddleware (before)": LegacyPrometheusMiddleware,
+        "pure ASGI (after)": PrometheusMiddleware,
+    }
+    for name, middleware in variants.items():
+        rps = asyncio.run(run(build_app(middleware), args.requests, args.concurrency))
+        print(f"{name:<30} {rps:>10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
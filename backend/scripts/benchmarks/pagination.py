@@ -0,0 +1,123 @@
+"""
+Benchmark of offset versus cursor pagination over a large item table.
+
+Seeds ``--items`` rows owned by a throwaway user, then times the page query
+``read_items`` issues for a superuser at increasing depths, once with
+``skip`` and once with the ``cursor`` of the preceding page. Offset pages
+get slower with depth, cursor pages stay flat. Needs the database from
+docker compose; seeding 10M rows takes a few minutes and ``--keep`` leaves
+them in place for the next run.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/pagination.py --items 10000000 --limit 100
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from collections.abc import Callable
+from functools import partial
+
+from sqlmodel import Session, col, delete, func, select, text
+
+from app.core.db import engine
+from app.core.security import get_password_hash
+from app.models import Item, User
+from app.utils import decode_cursor, encode_cursor
+
+OWNER_EMAIL = "pagination-benchmark@example.com"
+BATCH = 1_000_000
+
+
+def seed(session: Session, items: int) -> None:
+    owner = session.exec(select(User).where(User.email == OWNER_EMAIL)).first()
+    if not owner:
+        owner = User(email=OWNER_EMAIL, hashed_password=get_password_hash("bench"))
+        session.add(owner)
+        session.commit()
+    existing = session.exec(
+        select(func.count()).select_from(Item).where(Item.owner_id == owner.id)
+    ).one()
+    for start in range(existing, items, BATCH):
+        count = min(BATCH, items - start)
+        session.connection().execute(
+            text(
+                "INSERT INTO item (id, title, owner_id) "
+                "SELECT gen_random_uuid(), 'item ' || n, :owner "
+                "FROM generate_series(1, :count) AS n"
+            ),
+            {"owner": owner.id, "count": count},
+        )
+        session.commit()
+        print(f"seeded {start + count:,} items")
+    session.connection().execute(text("ANALYZE item"))
+
+
+def page_offset(session: Session, skip: int, limit: int) -> None:
+    statement = select(Item).order_by(col(Item.id)).offset(skip).limit(limit + 1)
+    session.exec(statement).all()
+
+
+def page_cursor(session: Session, cursor: str, limit: int) -> None:
+    after = decode_cursor(cursor)
+    statement = (
+        select(Item).order_by(col(Item.id)).where(col(Item.id) > after).limit(limit + 1)
+    )
+    session.exec(statement).all()
+
+
+def cursor_at(session: Session, depth: int) -> str:
+    # The cursor a client holds after walking ``depth`` rows
+    if depth == 0:
+        return encode_cursor(uuid.UUID(int=0))
+    last = session.exec(
+        select(Item.id).order_by(col(Item.id)).offset(depth - 1).limit(1)
+    ).one()
+    return encode_cursor(last)
+
+
+def timed(fn: Callable[[], None], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=10_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        seed(session, args.items)
+        last_page = args.items - args.limit
+        depths = [0, *(10**e for e in range(3, 10) if 10**e < last_page), last_page]
+
+        print(f"{'depth':>12} {'offset ms':>10} {'cursor ms':>10}")
+        for depth in depths:
+            cursor = cursor_at(session, depth)
+            offset_time = timed(
+                partial(page_offset, session, depth, args.limit), args.repeat
+            )
+            cursor_time = timed(
+                partial(page_cursor, session, cursor, args.limit), args.repeat
+            )
+            print(
+                f"{depth:>12,} {offset_time * 1000:>10.2f} {cursor_time * 1000:>10.2f}"
+            )
+
+        if not args.keep:
+            # Items go with their owner through ON DELETE CASCADE
+            session.exec(delete(User).where(col(User.email) == OWNER_EMAIL))  # type: ignore[call-overload]
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
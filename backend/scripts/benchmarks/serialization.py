@@ -0,0 +1,73 @@
+"""
+Benchmark of encoding a page of items.
+
+Times encoding an ``ItemsPublic`` page of ``--items`` items the way
+FastAPI does for a ``response_model``, validating the returned model again
+and rendering with stdlib ``json``, then the way ``ModelResponseRoute``
+does, one pydantic-core ``to_json`` pass.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/serialization.py --items 100
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic_core import to_json
+
+from app.models import Item, ItemsPublic
+
+
+def build_page(items: int) -> ItemsPublic:
+    owner_id = uuid.uuid4()
+    rows = [
+        Item(
+            id=uuid.uuid4(),
+            title=f"Item {i}",
+            description="A description of a few words",
+            owner_id=owner_id,
+        )
+        for i in range(items)
+    ]
+    return ItemsPublic(data=rows, count=items, next_cursor="cursor")
+
+
+async def fastapi_path(page: ItemsPublic, response_class: type[JSONResponse]) -> bytes:
+    field = create_model_field(name="Response_read_items", type_=ItemsPublic)
+    content = await serialize_response(
+        field=field, response_content=page, is_coroutine=True
+    )
+    return response_class(content).body
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = build_page(args.items)
+    assert await fastapi_path(page, ORJSONResponse) == to_json(page)
+
+    for name, response_class in (("json", JSONResponse), ("orjson", ORJSONResponse)):
+        start = time.perf_counter()
+        for _ in range(args.number):
+            await fastapi_path(page, response_class)
+        seconds = time.perf_counter() - start
+        print(f"validate + {name:<8} {seconds / args.number * 1e6:>10.1f} us/page")
+
+    start = time.perf_counter()
+    for _ in range(args.number):
+        to_json(page)
+    seconds = time.perf_counter() - start
+    print(f"{'to_json':<17} {seconds / args.number * 1e6:>10.1f} us/page")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
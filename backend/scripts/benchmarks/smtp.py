@@ -0,0 +1,86 @@
+"""
+Benchmark of sending emails to a local SMTP server.
+
+Starts an aiosmtpd server that accepts everything and sends the same email
+to ``--emails`` recipients, once with a new SMTP session per email as
+``send_email`` used to through ``emails.Message.send``, then with
+``send_emails`` over the pooled sessions, of which there are at most
+SMTP_POOL_SIZE whatever ``--concurrency``. The local server has no TLS, a
+real relay adds a TLS handshake to every new session.
+
+Usage (from ./backend):
+
+    python scripts/benchmarks/smtp.py --emails 1000 --concurrency 4
+"""
+
+import argparse
+import logging
+import socket
+import time
+from typing import Any
+
+import emails
+from aiosmtpd.controller import Controller
+
+from app.core.config import settings
+from app.core.smtp import smtp_pool
+from app.utils import EmailData, send_emails
+
+
+class Sink:
+    async def handle_DATA(self, _server: Any, _session: Any, _envelope: Any) -> str:
+        return "250 OK"
+
+
+def send_unpooled(recipients: list[str], data: EmailData) -> None:
+    for email_to in recipients:
+        message = emails.Message(
+            subject=data.subject,
+            html=data.html_content,
+            mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+        )
+        smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
+        response = message.send(to=email_to, smtp=smtp_options)
+        assert response.success, response.error
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    # One line per email from app.utils and aiosmtpd would be timed too
+    logging.disable(logging.INFO)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    controller = Controller(Sink(), hostname="127.0.0.1", port=port)
+    controller.start()
+    settings.SMTP_HOST, settings.SMTP_PORT = "127.0.0.1", port
+    settings.SMTP_TLS, settings.SMTP_USER = False, None
+    settings.EMAILS_FROM_EMAIL = "noreply@example.com"
+
+    recipients = [f"user{i}@example.com" for i in range(args.emails)]
+    data = EmailData(html_content="<p>Hello</p>", subject="Benchmark")
+    try:
+        start = time.perf_counter()
+        send_unpooled(recipients, data)
+        seconds = time.perf_counter() - start
+        print(f"{'unpooled':<10} {args.emails / seconds:>10.0f} emails/s")
+
+        start = time.perf_counter()
+        errors = send_emails(
+            ((email_to, data) for email_to in recipients),
+            concurrency=args.concurrency,
+        )
+        seconds = time.perf_counter() - start
+        assert not any(errors), errors
+        print(f"{'pooled':<10} {args.emails / seconds:>10.0f} emails/s")
+    finally:
+        smtp_pool.close()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Report foreign keys and filter columns that no index supports.
+
+Compares the foreign keys and ``index=True`` columns of ``SQLModel.metadata``,
+plus any ``--filter`` columns, with the indexes present in the database. A
+column list is supported when it matches the leading columns of an index,
+primary key or unique constraint. Each finding carries the table's
+``pg_stat_user_tables`` counters so sequential scans over large tables stand
+out, and a ``CREATE INDEX`` statement to start from. With ``--check`` the
+exit status is 1 when anything is reported, for use in CI.
+
+Usage (from ./backend):
+
+    python scripts/index_advisor.py --filter item.title --check
+"""
+
+import argparse
+import sys
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import Engine, inspect, text
+from sqlmodel import SQLModel
+
+import app.models  # noqa: F401 register the tables on SQLModel.metadata
+from app.core.db import engine
+
+
+@dataclass
+class Finding:
+    table: str
+    columns: tuple[str, ...]
+    reason: str
+
+
+def wanted_indexes(filters: list[str]) -> list[Finding]:
+    wanted = []
+    for table in SQLModel.metadata.sorted_tables:
+        for fk in table.foreign_key_constraints:
+            referred = ", ".join(element.column.name for element in fk.elements)
+            target = f"{fk.referred_table.name}({referred})"
+            wanted.append(
+                Finding(table.name, tuple(fk.column_keys), f"foreign key -> {target}")
+            )
+        for column in table.columns:
+            if column.index:
+                wanted.append(Finding(table.name, (column.name,), "index=True"))
+    for spec in filters:
+        table_name, _, columns = spec.partition(".")
+        wanted.append(Finding(table_name, tuple(columns.split(",")), "--filter"))
+    return wanted
+
+
+def supported_prefixes(engine: Engine, table: str) -> list[tuple[str, ...]]:
+    inspector = inspect(engine)
+    column_lists: list[Sequence[str | None]] = [
+        inspector.get_pk_constraint(table)["constrained_columns"]
+    ]
+    column_lists += [i["column_names"] for i in inspector.get_indexes(table)]
+    column_lists += [u["column_names"] for u in inspector.get_unique_constraints(table)]
+    return [tuple(c for c in columns if c is not None) for columns in column_lists]
+
+
+def is_supported(columns: tuple[str, ...], indexed: list[tuple[str, ...]]) -> bool:
+    return any(set(index[: len(columns)]) == set(columns) for index in indexed)
+
+
+def table_stats(engine: Engine) -> dict[str, dict[str, int]]:
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text(
+                "SELECT relname, n_live_tup, seq_scan, seq_tup_read, "
+                "coalesce(idx_scan, 0) AS idx_scan FROM pg_stat_user_tables"
+            )
+        ).mappings()
+        return {row["relname"]: dict(row) for row in rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        metavar="TABLE.COLUMN[,COLUMN]",
+        help="columns the application filters on, may be repeated",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="exit with 1 when anything is reported"
+    )
+    args = parser.parse_args()
+
+    stats = table_stats(engine)
+    indexed: dict[str, list[tuple[str, ...]]] = {}
+    missing = []
+    for finding in wanted_indexes(args.filter):
+        if finding.table not in indexed:
+            indexed[finding.table] = supported_prefixes(engine, finding.table)
+        if not is_supported(finding.columns, indexed[finding.table]):
+            missing.append(finding)
+
+    for finding in missing:
+        table = stats.get(finding.table, {})
+        columns = ", ".join(finding.columns)
+        print(
+            f"{finding.table}({columns}): {finding.reason}, "
+            f"rows={table.get('n_live_tup', 0):,} "
+            f"seq_scan={table.get('seq_scan', 0):,} "
+            f"seq_tup_read={table.get('seq_tup_read', 0):,} "
+            f"idx_scan={table.get('idx_scan', 0):,}"
+        )
+        name = f"ix_{finding.table}_{'_'.join(finding.columns)}"
+        print(f'    CREATE INDEX CONCURRENTLY {name} ON "{finding.table}" ({columns});')
+    if not missing:
+        print("Every foreign key and filter column is backed by an index.")
+    if args.check and missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
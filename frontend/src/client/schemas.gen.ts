@@ -55,6 +55,25 @@ export const Body_login_login_access_tokenSchema = {
   title: "Body_login-login_access_token",
 } as const
 
+export const BulkErrorSchema = {
+  properties: {
+    index: {
+      type: "integer",
+      title: "Index",
+    },
+    errors: {
+      items: {
+        type: "object",
+      },
+      type: "array",
+      title: "Errors",
+    },
+  },
+  type: "object",
+  required: ["index", "errors"],
+  title: "BulkError",
+} as const
+
 export const HTTPValidationErrorSchema = {
   properties: {
     detail: {
@@ -163,6 +182,111 @@ export const ItemUpdateSchema = {
   title: "ItemUpdate",
 } as const
 
+export const ItemsAffectedSchema = {
+  properties: {
+    count: {
+      type: "integer",
+      title: "Count",
+    },
+  },
+  type: "object",
+  required: ["count"],
+  title: "ItemsAffected",
+} as const
+
+export const ItemsBulkUpdateSchema = {
+  properties: {
+    filter: {
+      $ref: "#/components/schemas/ItemsFilter",
+    },
+    update: {
+      $ref: "#/components/schemas/ItemUpdate",
+    },
+  },
+  type: "object",
+  required: ["filter", "update"],
+  title: "ItemsBulkUpdate",
+} as const
+
+export const ItemsCreatedSchema = {
+  properties: {
+    ids: {
+      items: {
+        anyOf: [
+          {
+            type: "string",
+            format: "uuid",
+          },
+          {
+            type: "null",
+          },
+        ],
+      },
+      type: "array",
+      title: "Ids",
+    },
+    count: {
+      type: "integer",
+      title: "Count",
+    },
+    errors: {
+      items: {
+        $ref: "#/components/schemas/BulkError",
+      },
+      type: "array",
+      title: "Errors",
+    },
+  },
+  type: "object",
+  required: ["ids", "count", "errors"],
+  title: "ItemsCreated",
+} as const
+
+export const ItemsFilterSchema = {
+  properties: {
+    ids: {
+      anyOf: [
+        {
+          items: {
+            type: "string",
+            format: "uuid",
+          },
+          type: "array",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Ids",
+    },
+    title: {
+      anyOf: [
+        {
+          type: "string",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Title",
+    },
+    owner_id: {
+      anyOf: [
+        {
+          type: "string",
+          format: "uuid",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Owner Id",
+    },
+  },
+  type: "object",
+  title: "ItemsFilter",
+} as const
+
 export const ItemsPublicSchema = {
   properties: {
     data: {
@@ -173,15 +297,48 @@ export const ItemsPublicSchema = {
       title: "Data",
     },
     count: {
-      type: "integer",
+      anyOf: [
+        {
+          type: "integer",
+        },
+        {
+          type: "null",
+        },
+      ],
       title: "Count",
     },
+    next_cursor: {
+      anyOf: [
+        {
+          type: "string",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Next Cursor",
+    },
   },
   type: "object",
   required: ["data", "count"],
   title: "ItemsPublic",
 } as const
 
+export const JWKSetSchema = {
+  properties: {
+    keys: {
+      items: {
+        type: "object",
+      },
+      type: "array",
+      title: "Keys",
+    },
+  },
+  type: "object",
+  required: ["keys"],
+  title: "JWKSet",
+} as const
+
 export const MessageSchema = {
   properties: {
     message: {
@@ -223,12 +380,35 @@ export const TokenSchema = {
       title: "Token Type",
       default: "bearer",
     },
+    refresh_token: {
+      anyOf: [
+        {
+          type: "string",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Refresh Token",
+    },
   },
   type: "object",
   required: ["access_token"],
   title: "Token",
 } as const
 
+export const TokenRefreshSchema = {
+  properties: {
+    refresh_token: {
+      type: "string",
+      title: "Refresh Token",
+    },
+  },
+  type: "object",
+  required: ["refresh_token"],
+  title: "TokenRefresh",
+} as const
+
 export const UpdatePasswordSchema = {
   properties: {
     current_password: {
@@ -291,6 +471,75 @@ export const UserCreateSchema = {
   title: "UserCreate",
 } as const
 
+export const UserImportJobPublicSchema = {
+  properties: {
+    status: {
+      type: "string",
+      maxLength: 16,
+      title: "Status",
+      default: "running",
+    },
+    total: {
+      type: "integer",
+      title: "Total",
+    },
+    processed: {
+      type: "integer",
+      title: "Processed",
+      default: 0,
+    },
+    created: {
+      type: "integer",
+      title: "Created",
+      default: 0,
+    },
+    id: {
+      type: "string",
+      format: "uuid",
+      title: "Id",
+    },
+    errors: {
+      items: {
+        $ref: "#/components/schemas/BulkError",
+      },
+      type: "array",
+      title: "Errors",
+    },
+    created_at: {
+      type: "string",
+      format: "date-time",
+      title: "Created At",
+    },
+    updated_at: {
+      type: "string",
+      format: "date-time",
+      title: "Updated At",
+    },
+    finished_at: {
+      anyOf: [
+        {
+          type: "string",
+          format: "date-time",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Finished At",
+    },
+  },
+  type: "object",
+  required: [
+    "total",
+    "id",
+    "errors",
+    "created_at",
+    "updated_at",
+    "finished_at",
+  ],
+  title: "UserImportJobPublic",
+} as const
+
 export const UserPublicSchema = {
   properties: {
     email: {
@@ -461,9 +710,27 @@ export const UsersPublicSchema = {
       title: "Data",
     },
     count: {
-      type: "integer",
+      anyOf: [
+        {
+          type: "integer",
+        },
+        {
+          type: "null",
+        },
+      ],
       title: "Count",
     },
+    next_cursor: {
+      anyOf: [
+        {
+          type: "string",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Next Cursor",
+    },
   },
   type: "object",
   required: ["data", "count"],
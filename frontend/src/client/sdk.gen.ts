@@ -3,15 +3,23 @@
 import type { CancelablePromise } from './core/CancelablePromise';
 import { OpenAPI } from './core/OpenAPI';
 import { request as __request } from './core/request';
-import type { ItemsReadItemsData, ItemsReadItemsResponse, ItemsCreateItemData, ItemsCreateItemResponse, ItemsReadItemData, ItemsReadItemResponse, ItemsUpdateItemData, ItemsUpdateItemResponse, ItemsDeleteItemData, ItemsDeleteItemResponse, LoginLoginAccessTokenData, LoginLoginAccessTokenResponse, LoginTestTokenResponse, LoginRecoverPasswordData, LoginRecoverPasswordResponse, LoginResetPasswordData, LoginResetPasswordResponse, LoginRecoverPasswordHtmlContentData, LoginRecoverPasswordHtmlContentResponse, PrivateCreateUserData, PrivateCreateUserResponse, UsersReadUsersData, UsersReadUsersResponse, UsersCreateUserData, UsersCreateUserResponse, UsersReadUserMeResponse, UsersDeleteUserMeResponse, UsersUpdateUserMeData, UsersUpdateUserMeResponse, UsersUpdatePasswordMeData, UsersUpdatePasswordMeResponse, UsersRegisterUserData, UsersRegisterUserResponse, UsersReadUserByIdData, UsersReadUserByIdResponse, UsersUpdateUserData, UsersUpdateUserResponse, UsersDeleteUserData, UsersDeleteUserResponse, UtilsTestEmailData, UtilsTestEmailResponse, UtilsHealthCheckResponse } from './types.gen';
+import type { ItemsReadItemsData, ItemsReadItemsResponse, ItemsCreateItemData, ItemsCreateItemResponse, ItemsExportItemsData, ItemsExportItemsResponse, ItemsReadItemData, ItemsReadItemResponse, ItemsUpdateItemData, ItemsUpdateItemResponse, ItemsDeleteItemData, ItemsDeleteItemResponse, ItemsCreateItemsBulkData, ItemsCreateItemsBulkResponse, ItemsDeleteItemsBulkData, ItemsDeleteItemsBulkResponse, ItemsUpdateItemsBulkData, ItemsUpdateItemsBulkResponse, LoginLoginAccessTokenData, LoginLoginAccessTokenResponse, LoginRefreshAccessTokenData, LoginRefreshAccessTokenResponse, LoginTestTokenResponse, LoginLogoutData, LoginLogoutResponse, LoginReadJwksResponse, LoginRecoverPasswordData, LoginRecoverPasswordResponse, LoginResetPasswordData, LoginResetPasswordResponse, LoginRecoverPasswordHtmlContentData, LoginRecoverPasswordHtmlContentResponse, PrivateCreateUserData, PrivateCreateUserResponse, UsersReadUsersData, UsersReadUsersResponse, UsersCreateUserData, UsersCreateUserResponse, UsersCreateUsersBulkData, UsersCreateUsersBulkResponse, UsersReadUsersBulkData, UsersReadUsersBulkResponse, UsersReadUserMeResponse, UsersDeleteUserMeResponse, UsersUpdateUserMeData, UsersUpdateUserMeResponse, UsersUpdatePasswordMeData, UsersUpdatePasswordMeResponse, UsersRegisterUserData, UsersRegisterUserResponse, UsersReadUserByIdData, UsersReadUserByIdResponse, UsersUpdateUserData, UsersUpdateUserResponse, UsersDeleteUserData, UsersDeleteUserResponse, UtilsTestEmailData, UtilsTestEmailResponse, UtilsHealthCheckResponse } from './types.gen';
 
 export class ItemsService {
     /**
      * Read Items
      * Retrieve items.
+     *
+     * Pass the `next_cursor` of a page as `cursor` to get the following page,
+     * `skip` is ignored then. Unlike `skip`, a cursor costs the same at any depth.
+     *
+     * `count` picks how the total is computed: `exact` (cached for a few
+     * seconds), `estimated` from planner statistics, or `none` to skip it.
      * @param data The data for the request.
      * @param data.skip
      * @param data.limit
+     * @param data.cursor
+     * @param data.count
      * @returns ItemsPublic Successful Response
      * @throws ApiError
      */
@@ -21,7 +29,9 @@ export class ItemsService {
             url: '/api/v1/items/',
             query: {
                 skip: data.skip,
-                limit: data.limit
+                limit: data.limit,
+                cursor: data.cursor,
+                count: data.count
             },
             errors: {
                 422: 'Validation Error'
@@ -49,6 +59,30 @@ export class ItemsService {
         });
     }
     
+    /**
+     * Export Items
+     * Export items as NDJSON, one JSON object per line, or CSV with a header.
+     *
+     * Items are streamed in id order while they are read, from a server-side
+     * cursor, however many there are.
+     * @param data The data for the request.
+     * @param data.format
+     * @returns unknown Every item, one per line
+     * @throws ApiError
+     */
+    public static exportItems(data: ItemsExportItemsData = {}): CancelablePromise<ItemsExportItemsResponse> {
+        return __request(OpenAPI, {
+            method: 'GET',
+            url: '/api/v1/items/export',
+            query: {
+                format: data.format
+            },
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
     /**
      * Read Item
      * Get item by ID.
@@ -115,6 +149,72 @@ export class ItemsService {
         });
     }
     
+    /**
+     * Create Items Bulk
+     * Create items from a JSON array, or from NDJSON, one item per line, sent
+     * with Content-Type `application/x-ndjson`.
+     *
+     * Items are validated and inserted as they are read, in chunks of a
+     * transaction each. `ids` follows the order of the request, with null for
+     * the items listed in `errors`.
+     * @param data The data for the request.
+     * @param data.requestBody
+     * @returns ItemsCreated Successful Response
+     * @throws ApiError
+     */
+    public static createItemsBulk(data: ItemsCreateItemsBulkData): CancelablePromise<ItemsCreateItemsBulkResponse> {
+        return __request(OpenAPI, {
+            method: 'POST',
+            url: '/api/v1/items/bulk',
+            body: data.requestBody,
+            mediaType: 'application/json'
+        });
+    }
+    
+    /**
+     * Delete Items Bulk
+     * Delete the items matching the filter, by `ids` or by field, in one statement.
+     *
+     * Items of other users are left out unless the caller is a superuser.
+     * @param data The data for the request.
+     * @param data.requestBody
+     * @returns ItemsAffected Successful Response
+     * @throws ApiError
+     */
+    public static deleteItemsBulk(data: ItemsDeleteItemsBulkData): CancelablePromise<ItemsDeleteItemsBulkResponse> {
+        return __request(OpenAPI, {
+            method: 'DELETE',
+            url: '/api/v1/items/bulk',
+            body: data.requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
+    /**
+     * Update Items Bulk
+     * Update the items matching `filter`, by `ids` or by field, in one statement.
+     *
+     * Items of other users are left out unless the caller is a superuser.
+     * @param data The data for the request.
+     * @param data.requestBody
+     * @returns ItemsAffected Successful Response
+     * @throws ApiError
+     */
+    public static updateItemsBulk(data: ItemsUpdateItemsBulkData): CancelablePromise<ItemsUpdateItemsBulkResponse> {
+        return __request(OpenAPI, {
+            method: 'PATCH',
+            url: '/api/v1/items/bulk',
+            body: data.requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
 }
 
 export class LoginService {
@@ -138,6 +238,26 @@ export class LoginService {
         });
     }
     
+    /**
+     * Refresh Access Token
+     * Exchange a refresh token for a new access token and refresh token
+     * @param data The data for the request.
+     * @param data.requestBody
+     * @returns Token Successful Response
+     * @throws ApiError
+     */
+    public static refreshAccessToken(data: LoginRefreshAccessTokenData): CancelablePromise<LoginRefreshAccessTokenResponse> {
+        return __request(OpenAPI, {
+            method: 'POST',
+            url: '/api/v1/login/refresh',
+            body: data.requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
     /**
      * Test Token
      * Test access token
@@ -151,6 +271,39 @@ export class LoginService {
         });
     }
     
+    /**
+     * Logout
+     * Revoke the access token of the request, and the refresh token if given
+     * @param data The data for the request.
+     * @param data.requestBody
+     * @returns Message Successful Response
+     * @throws ApiError
+     */
+    public static logout(data: LoginLogoutData = {}): CancelablePromise<LoginLogoutResponse> {
+        return __request(OpenAPI, {
+            method: 'POST',
+            url: '/api/v1/login/logout',
+            body: data.requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
+    /**
+     * Read Jwks
+     * Public keys that verify access tokens, empty when they are signed with HS256
+     * @returns JWKSet Successful Response
+     * @throws ApiError
+     */
+    public static readJwks(): CancelablePromise<LoginReadJwksResponse> {
+        return __request(OpenAPI, {
+            method: 'GET',
+            url: '/api/v1/.well-known/jwks.json'
+        });
+    }
+    
     /**
      * Recover Password
      * Password Recovery
@@ -242,9 +395,17 @@ export class UsersService {
     /**
      * Read Users
      * Retrieve users.
+     *
+     * Pass the `next_cursor` of a page as `cursor` to get the following page,
+     * `skip` is ignored then. Unlike `skip`, a cursor costs the same at any depth.
+     *
+     * `count` picks how the total is computed: `exact` (cached for a few
+     * seconds), `estimated` from planner statistics, or `none` to skip it.
      * @param data The data for the request.
      * @param data.skip
      * @param data.limit
+     * @param data.cursor
+     * @param data.count
      * @returns UsersPublic Successful Response
      * @throws ApiError
      */
@@ -254,7 +415,9 @@ export class UsersService {
             url: '/api/v1/users/',
             query: {
                 skip: data.skip,
-                limit: data.limit
+                limit: data.limit,
+                cursor: data.cursor,
+                count: data.count
             },
             errors: {
                 422: 'Validation Error'
@@ -282,6 +445,52 @@ export class UsersService {
         });
     }
     
+    /**
+     * Create Users Bulk
+     * Create users in bulk, in the background.
+     *
+     * Returns the import job right away, follow it at `GET /users/bulk/{job_id}`.
+     * Users whose email is taken, or listed earlier in the request, are skipped
+     * and reported in the `errors` of the job. Welcome emails hold a link to
+     * set a password, never the password itself.
+     * @param data The data for the request.
+     * @param data.requestBody
+     * @returns UserImportJobPublic Successful Response
+     * @throws ApiError
+     */
+    public static createUsersBulk(data: UsersCreateUsersBulkData): CancelablePromise<UsersCreateUsersBulkResponse> {
+        return __request(OpenAPI, {
+            method: 'POST',
+            url: '/api/v1/users/bulk',
+            body: data.requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
+    /**
+     * Read Users Bulk
+     * Get the progress of a bulk import of users.
+     * @param data The data for the request.
+     * @param data.jobId
+     * @returns UserImportJobPublic Successful Response
+     * @throws ApiError
+     */
+    public static readUsersBulk(data: UsersReadUsersBulkData): CancelablePromise<UsersReadUsersBulkResponse> {
+        return __request(OpenAPI, {
+            method: 'GET',
+            url: '/api/v1/users/bulk/{job_id}',
+            path: {
+                job_id: data.jobId
+            },
+            errors: {
+                422: 'Validation Error'
+            }
+        });
+    }
+    
     /**
      * Read User Me
      * Get current user.
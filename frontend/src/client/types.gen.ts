@@ -9,6 +9,13 @@ export type Body_login_login_access_token = {
     client_secret?: (string | null);
 };
 
+export type BulkError = {
+    index: number;
+    errors: Array<{
+        [key: string]: unknown;
+    }>;
+};
+
 export type HTTPValidationError = {
     detail?: Array<ValidationError>;
 };
@@ -25,9 +32,31 @@ export type ItemPublic = {
     owner_id: string;
 };
 
+export type ItemsAffected = {
+    count: number;
+};
+
+export type ItemsBulkUpdate = {
+    filter: ItemsFilter;
+    update: ItemUpdate;
+};
+
+export type ItemsCreated = {
+    ids: Array<(string | null)>;
+    count: number;
+    errors: Array<BulkError>;
+};
+
+export type ItemsFilter = {
+    ids?: (Array<(string)> | null);
+    title?: (string | null);
+    owner_id?: (string | null);
+};
+
 export type ItemsPublic = {
     data: Array<ItemPublic>;
-    count: number;
+    count: (number | null);
+    next_cursor?: (string | null);
 };
 
 export type ItemUpdate = {
@@ -35,6 +64,12 @@ export type ItemUpdate = {
     description?: (string | null);
 };
 
+export type JWKSet = {
+    keys: Array<{
+        [key: string]: unknown;
+    }>;
+};
+
 export type Message = {
     message: string;
 };
@@ -54,6 +89,11 @@ export type PrivateUserCreate = {
 export type Token = {
     access_token: string;
     token_type?: string;
+    refresh_token?: (string | null);
+};
+
+export type TokenRefresh = {
+    refresh_token: string;
 };
 
 export type UpdatePassword = {
@@ -69,6 +109,18 @@ export type UserCreate = {
     password: string;
 };
 
+export type UserImportJobPublic = {
+    status?: string;
+    total: number;
+    processed?: number;
+    created?: number;
+    id: string;
+    errors: Array<BulkError>;
+    created_at: string;
+    updated_at: string;
+    finished_at: (string | null);
+};
+
 export type UserPublic = {
     email: string;
     is_active?: boolean;
@@ -85,7 +137,8 @@ export type UserRegister = {
 
 export type UsersPublic = {
     data: Array<UserPublic>;
-    count: number;
+    count: (number | null);
+    next_cursor?: (string | null);
 };
 
 export type UserUpdate = {
@@ -108,6 +161,8 @@ export type ValidationError = {
 };
 
 export type ItemsReadItemsData = {
+    count?: 'exact' | 'estimated' | 'none';
+    cursor?: (string | null);
     limit?: number;
     skip?: number;
 };
@@ -120,6 +175,12 @@ export type ItemsCreateItemData = {
 
 export type ItemsCreateItemResponse = (ItemPublic);
 
+export type ItemsExportItemsData = {
+    format?: 'ndjson' | 'csv';
+};
+
+export type ItemsExportItemsResponse = (unknown);
+
 export type ItemsReadItemData = {
     id: string;
 };
@@ -139,14 +200,46 @@ export type ItemsDeleteItemData = {
 
 export type ItemsDeleteItemResponse = (Message);
 
+export type ItemsCreateItemsBulkData = {
+    requestBody: Array<ItemCreate>;
+};
+
+export type ItemsCreateItemsBulkResponse = (ItemsCreated);
+
+export type ItemsDeleteItemsBulkData = {
+    requestBody: ItemsFilter;
+};
+
+export type ItemsDeleteItemsBulkResponse = (ItemsAffected);
+
+export type ItemsUpdateItemsBulkData = {
+    requestBody: ItemsBulkUpdate;
+};
+
+export type ItemsUpdateItemsBulkResponse = (ItemsAffected);
+
 export type LoginLoginAccessTokenData = {
     formData: Body_login_login_access_token;
 };
 
 export type LoginLoginAccessTokenResponse = (Token);
 
+export type LoginRefreshAccessTokenData = {
+    requestBody: TokenRefresh;
+};
+
+export type LoginRefreshAccessTokenResponse = (Token);
+
 export type LoginTestTokenResponse = (UserPublic);
 
+export type LoginLogoutData = {
+    requestBody?: (TokenRefresh | null);
+};
+
+export type LoginLogoutResponse = (Message);
+
+export type LoginReadJwksResponse = (JWKSet);
+
 export type LoginRecoverPasswordData = {
     email: string;
 };
@@ -172,6 +265,8 @@ export type PrivateCreateUserData = {
 export type PrivateCreateUserResponse = (UserPublic);
 
 export type UsersReadUsersData = {
+    count?: 'exact' | 'estimated' | 'none';
+    cursor?: (string | null);
     limit?: number;
     skip?: number;
 };
@@ -184,6 +279,18 @@ export type UsersCreateUserData = {
 
 export type UsersCreateUserResponse = (UserPublic);
 
+export type UsersCreateUsersBulkData = {
+    requestBody: Array<UserCreate>;
+};
+
+export type UsersCreateUsersBulkResponse = (UserImportJobPublic);
+
+export type UsersReadUsersBulkData = {
+    jobId: string;
+};
+
+export type UsersReadUsersBulkResponse = (UserImportJobPublic);
+
 export type UsersReadUserMeResponse = (UserPublic);
 
 export type UsersDeleteUserMeResponse = (Message);
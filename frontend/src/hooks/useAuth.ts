@@ -46,6 +46,7 @@ const useAuth = () => {
       formData: data,
     })
     localStorage.setItem("access_token", response.access_token)
+    localStorage.setItem("refresh_token", response.refresh_token ?? "")
   }
 
   const loginMutation = useMutation({
@@ -58,8 +59,14 @@ const useAuth = () => {
     },
   })
 
-  const logout = () => {
+  const logout = async () => {
+    // Revoke the token server side, it stays valid until it expires otherwise
+    const refreshToken = localStorage.getItem("refresh_token")
+    await LoginService.logout({
+      requestBody: refreshToken ? { refresh_token: refreshToken } : null,
+    }).catch(() => {})
     localStorage.removeItem("access_token")
+    localStorage.removeItem("refresh_token")
     navigate({ to: "/login" })
   }
 
@@ -5,10 +5,50 @@ import "./globals.css"
 import { routeTree } from "./routeTree.gen"
 
 import { StrictMode } from "react"
-import { OpenAPI } from "./client"
+import { LoginService, OpenAPI } from "./client"
 
 OpenAPI.BASE = import.meta.env.VITE_API_URL
-OpenAPI.TOKEN = async () => {
+// Sends the read-your-writes cookie back, reads right after a write then
+// see it despite replica lag
+OpenAPI.WITH_CREDENTIALS = true
+
+const REFRESH_URL = "/api/v1/login/refresh"
+let refreshing: Promise<void> | null = null
+
+const expiresSoon = (token: string) => {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/")
+    return JSON.parse(atob(payload)).exp * 1000 - Date.now() < 30_000
+  } catch {
+    return false
+  }
+}
+
+const refreshTokens = async (refreshToken: string) => {
+  try {
+    const response = await LoginService.refreshAccessToken({
+      requestBody: { refresh_token: refreshToken },
+    })
+    localStorage.setItem("access_token", response.access_token)
+    localStorage.setItem("refresh_token", response.refresh_token ?? "")
+  } catch {
+    // Let the request fail with the old token, which logs the user out
+  }
+}
+
+// Access tokens are short-lived, swap them shortly before they expire
+OpenAPI.TOKEN = async (options) => {
+  const token = localStorage.getItem("access_token") || ""
+  const refreshToken = localStorage.getItem("refresh_token")
+  if (options.url === REFRESH_URL || !refreshToken || !expiresSoon(token)) {
+    return token
+  }
+  if (!refreshing) {
+    refreshing = refreshTokens(refreshToken).finally(() => {
+      refreshing = null
+    })
+  }
+  await refreshing
   return localStorage.getItem("access_token") || ""
 }
 